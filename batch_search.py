@@ -0,0 +1,65 @@
+"""
+Run many queries against the saved tf-idf (or BM25) model and write ranked results as JSON lines
+
+usage: python batch_search.py queries.txt results.jsonl [-k 10] [--chunk-size 1000] [--model tf-idf|bm25]
+
+queries.txt has one query per line. Each line of output is a json object
+{"query": ..., "results": [{"file": ..., "score": ...}, ...]}. The model must be
+built first by running main.py.
+"""
+
+from irstructures.document import Document
+from irstructures.snapshot import Snapshot
+import irstructures.models.vector_space as vector_space
+import argparse, json, time
+
+def run_batch(queries_path, output_path, pickle_dir="./pickle_files", k=10, chunk_size=1000, model="tf-idf"):
+    """Rank documents for every query in a file and write results as JSON lines
+
+    Parameters
+    ----------
+    queries_path: str
+        path to file with one query per line
+    output_path: str
+        path of JSON lines file to write
+    pickle_dir: str
+        folder containing index.snap written by main.py
+    k: int
+        number of top results for each query
+    chunk_size: int
+        number of queries scored in one matrix product
+    model: str
+        ranking model, 'tf-idf' or 'bm25'
+    """
+
+    snapshot = Snapshot(pickle_dir + "/index.snap")
+    Document.set_analyzer(snapshot.analyzer)
+    corpus, vsmodel = snapshot.corpus, snapshot.vsmodel
+    if model == "bm25":
+        if snapshot.bm25 is None:
+            raise Exception("snapshot has no BM25 model, rebuild it with main.py")
+        vsmodel = snapshot.bm25
+
+    with open(queries_path, encoding="utf8") as queries_file:
+        queries = [ line.strip() for line in queries_file if line.strip() ]
+
+    start = time.time()
+    results = vector_space.parse_queries(queries, corpus, vsmodel, k, chunk_size)
+    end = time.time()
+    print(len(queries), "queries ranked in", end-start, 's')
+
+    with open(output_path, "w", encoding="utf8") as output_file:
+        for query, output in zip(queries, results):
+            record = {'query': query, 'results': [ {'file': file, 'score': score} for file, score in output ]}
+            output_file.write(json.dumps(record) + "\n")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rank documents for every query in a file")
+    parser.add_argument("queries", help="file with one query per line")
+    parser.add_argument("output", help="JSON lines file to write results to")
+    parser.add_argument("-k", type=int, default=10, help="number of results for each query")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="number of queries scored at once")
+    parser.add_argument("--pickle-dir", default="./pickle_files", help="folder containing saved model")
+    parser.add_argument("--model", default="tf-idf", choices=["tf-idf", "bm25"], help="ranking model")
+    args = parser.parse_args()
+    run_batch(args.queries, args.output, args.pickle_dir, args.k, args.chunk_size, args.model)
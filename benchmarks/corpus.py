@@ -0,0 +1,111 @@
+"""
+Generate synthetic corpora whose word frequencies follow zipf's law
+
+usage: python -m benchmarks.corpus corpus_folder [--docs 10000] [--vocab 50000] [--length 200] [--zipf 1.1] [--topics 0] [--seed 0]
+
+Words are random lowercase strings. Word of rank r is drawn with probability
+proportional to 1/r^s and length of each document is drawn uniformly from
+[length/2, 3*length/2], so a few words are very frequent and most are rare,
+as in natural text. With --topics, documents are also split into topics
+which favour different words, so that similar documents exist. The same
+arguments always give the same corpus.
+"""
+
+import numpy as np
+import argparse, os, random, string
+
+def generate_vocabulary(vocab_size, seed=0):
+    """Returns distinct random words, most frequent first
+
+    Parameters
+    ----------
+    vocab_size: int
+        number of words
+    seed: int
+        seed of random number generator
+
+    Returns
+    -------
+    list
+        list of vocab_size words
+    """
+
+    rand = random.Random(seed)
+    words = []
+    seen = set()
+    while len(words) < vocab_size:
+        # short words are more common, like in natural text
+        word = ''.join(rand.choice(string.ascii_lowercase) for _ in range(rand.randint(3, 6 + len(words)*6//vocab_size)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+def generate_corpus(folderpath, n_docs=10000, vocab_size=50000, doc_length=200, zipf_s=1.1, seed=0, docs_per_folder=1000, n_topics=0, topic_share=0.5):
+    """Write a synthetic corpus of .txt files with zipf distributed words
+
+    Parameters
+    ----------
+    folderpath: str
+        folder in which documents are written (created if it does not exist)
+    n_docs: int
+        number of documents
+    vocab_size: int
+        number of distinct words
+    doc_length: int
+        average number of words in a document
+    zipf_s: float
+        exponent of zipf's law, larger values give a more skewed distribution
+    seed: int
+        seed of random number generator
+    docs_per_folder: int
+        documents are split into sub folders of this size
+    n_topics: int
+        if not 0, every document has one of n_topics topics and topic_share of
+        its words follow the zipf distribution of its topic (a shuffled
+        ranking of the vocabulary), so documents of a topic are similar
+    topic_share: float
+        fraction of words of a document drawn from its topic
+
+    Returns
+    -------
+    list
+        vocabulary of the corpus, most frequent word first
+    """
+
+    words = np.array(generate_vocabulary(vocab_size, seed), dtype=object)
+    probs = 1 / np.arange(1, vocab_size+1) ** zipf_s
+    probs /= probs.sum()
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(max(1, doc_length//2), doc_length*3//2 + 1, size=n_docs)
+    # all words are drawn at once, drawing each document separately recomputes the distribution
+    tokens = rng.choice(vocab_size, size=int(lengths.sum()), p=probs)
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    if n_topics > 0:
+        # separate generator, so that corpora without topics do not change
+        topic_rng = np.random.default_rng(seed + 1)
+        rankings = np.array([ topic_rng.permutation(vocab_size) for _ in range(n_topics) ])
+        topics = np.repeat(topic_rng.integers(n_topics, size=n_docs), lengths)
+        from_topic = topic_rng.random(len(tokens)) < topic_share
+        tokens[from_topic] = rankings[topics[from_topic], tokens[from_topic]]
+    for doc_id in range(n_docs):
+        folder = os.path.join(folderpath, f"part{doc_id//docs_per_folder:04d}")
+        if doc_id % docs_per_folder == 0:
+            os.makedirs(folder, exist_ok=True)
+        text = ' '.join(words[tokens[offsets[doc_id]:offsets[doc_id+1]]])
+        with open(os.path.join(folder, f"doc{doc_id}.txt"), "w", encoding="utf8") as file:
+            file.write(text)
+    return list(words)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic corpus with zipf distributed words")
+    parser.add_argument("folder", help="folder in which documents are written")
+    parser.add_argument("--docs", type=int, default=10000, help="number of documents")
+    parser.add_argument("--vocab", type=int, default=50000, help="number of distinct words")
+    parser.add_argument("--length", type=int, default=200, help="average number of words in a document")
+    parser.add_argument("--zipf", type=float, default=1.1, help="exponent of zipf's law")
+    parser.add_argument("--topics", type=int, default=0, help="number of topics, documents of a topic share frequent words")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_corpus(args.folder, args.docs, args.vocab, args.length, args.zipf, args.seed, n_topics=args.topics)
+    print(args.docs, "documents written to", args.folder)
@@ -0,0 +1,139 @@
+"""
+Size of the positional index and latency of phrase and proximity queries
+
+usage: python -m benchmarks.positional [--corpus corpus] [--docs 5000] [--queries 200] [--slop 5] [--output results.json]
+
+The corpus is read as main.py reads it and both a docID-only index
+(InvertedIndex.write) and a positional index (positional.write_positional_index)
+are written, so that their sizes can be compared. Phrases of 2 to 4 words
+are sampled from documents and run as
+
+    and          words AND'ed, without positions
+    phrase       exact phrase
+    near         all words within --slop words of each other
+
+through boolean_retrieval.parse_query. Latency percentiles are in milliseconds.
+"""
+
+from irstructures.document import read_corpus
+from irstructures.docstore import DocumentStore
+from irstructures.invertedindex import InvertedIndex, DiskInvertedIndex
+from irstructures.positional import write_positional_index
+import irstructures.models.boolean_retrieval as boolean_retrieval
+from .corpus import generate_corpus
+from .suite import latency_stats
+import argparse, contextlib, io, json, os, random, shutil, tempfile, time
+
+def sample_phrases(corpus, n_queries=200, seed=0):
+    """Returns phrases of 2 to 4 consecutive words of randomly chosen documents"""
+
+    rand = random.Random(seed)
+    phrases = []
+    while len(phrases) < n_queries:
+        with open(corpus[rand.randrange(len(corpus))].filepath, encoding="utf8", errors="ignore") as file:
+            words = file.read().split()
+        length = rand.randint(2, 4)
+        if len(words) > length:
+            start = rand.randrange(len(words) - length)
+            phrases.append(' '.join(words[start:start+length]))
+    return phrases
+
+def run(corpus_path, work_dir, n_queries=200, slop=5, n_jobs=1, seed=0):
+    """Build both indexes of a corpus and time queries
+
+    Parameters
+    ----------
+    corpus_path: str
+        folder containing documents
+    work_dir: str
+        folder in which index files are written
+    n_queries: int
+        number of phrases
+    slop: int
+        distance allowed between words of near queries
+    n_jobs: int
+        number of processes used by read_corpus
+    seed: int
+        seed used to sample phrases
+
+    Returns
+    -------
+    dict
+        sizes, build times and latencies
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        documents = read_corpus(corpus_path, n_jobs=n_jobs)
+    corpus = DocumentStore.from_corpus(documents)
+    del documents
+    index = InvertedIndex(corpus)
+    plain_path = os.path.join(work_dir, "docids.idx")
+    positions_path = os.path.join(work_dir, "positions.idx")
+
+    start = time.perf_counter()
+    index.write(plain_path)
+    plain_seconds = time.perf_counter()-start
+    start = time.perf_counter()
+    stats = write_positional_index(positions_path, corpus)
+    positions_seconds = time.perf_counter()-start
+
+    results = {
+        'docids_bytes': os.path.getsize(plain_path),
+        'positional_bytes': os.path.getsize(positions_path),
+        'docids_write_seconds': plain_seconds,
+        'positional_build_seconds': positions_seconds,
+        'postings': stats['n_postings'],
+        'positions': stats['n_positions'],
+    }
+    results['size_ratio'] = results['positional_bytes'] / results['docids_bytes']
+
+    phrases = sample_phrases(corpus, n_queries, seed)
+    positions = DiskInvertedIndex(positions_path)
+    queries = {
+        'and': [ ' AND '.join(phrase.split()) for phrase in phrases ],
+        'phrase': [ f'"{phrase}"' for phrase in phrases ],
+        'near': [ f'"{phrase}"~{slop}' for phrase in phrases ],
+    }
+    for name, query_list in queries.items():
+        latencies = []
+        matches = 0
+        for query in query_list:
+            start = time.perf_counter()
+            output = boolean_retrieval.parse_query(query, corpus, index, positions)
+            latencies.append(time.perf_counter()-start)
+            matches += len(output)
+        results[name] = latency_stats(latencies)
+        results[name]['mean_matches'] = matches / len(query_list)
+    positions.close()
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure size of positional index and latency of phrase queries")
+    parser.add_argument("--corpus", default=None, help="folder containing documents, a synthetic corpus is generated if not given")
+    parser.add_argument("--docs", type=int, default=5000, help="number of documents of synthetic corpus")
+    parser.add_argument("--queries", type=int, default=200, help="number of phrases")
+    parser.add_argument("--slop", type=int, default=5, help="distance allowed between words of near queries")
+    parser.add_argument("--jobs", type=int, default=1, help="number of processes used to read corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="json file to write results to")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="ir_bench_")
+    corpus_path = args.corpus
+    if corpus_path is None:
+        corpus_path = os.path.join(work_dir, "corpus")
+        generate_corpus(corpus_path, args.docs, seed=args.seed)
+    try:
+        results = run(corpus_path, work_dir, args.queries, args.slop, args.jobs, args.seed)
+    finally:
+        shutil.rmtree(work_dir)
+
+    for key, value in results.items():
+        if isinstance(value, dict):
+            value = ", ".join(f"{k} {v:.4g}" if isinstance(v, float) else f"{k} {v}" for k, v in value.items())
+        elif isinstance(value, float):
+            value = f"{value:.4g}"
+        print(f"{key:>24}: {value}")
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=4)
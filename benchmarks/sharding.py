@@ -0,0 +1,127 @@
+"""
+Latency of the sharded index against a single snapshot of the same corpus
+
+usage: python -m benchmarks.sharding [--corpus corpus] [--docs 20000] [--shards 4] [--queries 200] [--output results.json]
+
+The corpus is read as main.py reads it and written both as one snapshot
+and as --shards shards (shards.write_shards). Every query is ranked over all
+documents (without boolean retrieval, the slowest case) by
+
+    single       Tf_Idf.search on the snapshot, in this process
+    sharded      ShardedIndex.search, scatter-gather over one process per shard
+
+and top k results of both are compared: max_score_diff should be 0 and
+identical_results should equal the number of queries. Latency percentiles are
+in milliseconds.
+"""
+
+from irstructures.document import Document, read_corpus
+from irstructures.docstore import DocumentStore
+from irstructures.snapshot import Snapshot, write_snapshot
+from irstructures.shards import write_shards, ShardedIndex
+from .corpus import generate_corpus
+from .suite import latency_stats, sample_queries
+import argparse, contextlib, io, json, os, shutil, tempfile, time
+
+def run(corpus_path, work_dir, n_shards=4, n_queries=200, k=10, model='tf-idf', n_jobs=1, seed=0):
+    """Build a snapshot and a sharded index of a corpus and time queries on both
+
+    Parameters
+    ----------
+    corpus_path: str
+        folder containing documents
+    work_dir: str
+        folder in which index files are written
+    n_shards: int
+        number of shards
+    n_queries: int
+        number of queries
+    k: int
+        number of results of each query
+    model: str
+        ranking model, 'tf-idf' or 'bm25'
+    n_jobs: int
+        number of processes used by read_corpus
+    seed: int
+        seed used to sample queries
+
+    Returns
+    -------
+    dict
+        build times, latencies and differences between results
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        documents = read_corpus(corpus_path, n_jobs=n_jobs)
+    corpus = DocumentStore.from_corpus(documents)
+    del documents
+    snapshot_path = os.path.join(work_dir, "index.snap")
+    shards_path = os.path.join(work_dir, "shards")
+
+    results = {'documents': len(corpus), 'shards': n_shards}
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        write_snapshot(snapshot_path, corpus)
+        results['single_build_seconds'] = time.perf_counter()-start
+        start = time.perf_counter()
+        write_shards(shards_path, corpus, n_shards)
+        results['sharded_build_seconds'] = time.perf_counter()-start
+
+    queries = sample_queries(corpus, n_queries, seed=seed)
+    snapshot = Snapshot(snapshot_path)
+    vsmodel = snapshot.bm25 if model == 'bm25' else snapshot.vsmodel
+    all_docs = range(len(snapshot.corpus))
+    single, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        single.append(vsmodel.search(Document(raw_data=query), snapshot.corpus, vsmodel.matrix, all_docs, k))
+        latencies.append(time.perf_counter()-start)
+    results['single'] = latency_stats(latencies)
+
+    sharded, latencies = [], []
+    with ShardedIndex(shards_path) as index:
+        for query in queries:
+            start = time.perf_counter()
+            sharded.append(index.search(query, k, model, use_boolean=False))
+            latencies.append(time.perf_counter()-start)
+    results['sharded'] = latency_stats(latencies)
+    results['speedup_p50'] = results['single']['p50_ms'] / results['sharded']['p50_ms']
+
+    results['identical_results'] = sum(a == b for a, b in zip(single, sharded))
+    results['max_score_diff'] = max([ abs(x[0]-y[0]) for a, b in zip(single, sharded) for x, y in zip(a, b) ], default=0.0)
+    vsmodel = None
+    snapshot.close()
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare latency of the sharded index with a single snapshot")
+    parser.add_argument("--corpus", default=None, help="folder containing documents, a synthetic corpus is generated if not given")
+    parser.add_argument("--docs", type=int, default=20000, help="number of documents of synthetic corpus")
+    parser.add_argument("--shards", type=int, default=4, help="number of shards")
+    parser.add_argument("--queries", type=int, default=200, help="number of queries")
+    parser.add_argument("-k", type=int, default=10, help="number of results of each query")
+    parser.add_argument("--model", default="tf-idf", choices=["tf-idf", "bm25"], help="ranking model")
+    parser.add_argument("--jobs", type=int, default=1, help="number of processes used to read corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="json file to write results to")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="ir_bench_")
+    corpus_path = args.corpus
+    if corpus_path is None:
+        corpus_path = os.path.join(work_dir, "corpus")
+        generate_corpus(corpus_path, args.docs, seed=args.seed)
+    try:
+        results = run(corpus_path, work_dir, args.shards, args.queries, args.k, args.model, args.jobs, args.seed)
+    finally:
+        shutil.rmtree(work_dir)
+
+    for key, value in results.items():
+        if isinstance(value, dict):
+            value = ", ".join(f"{k} {v:.4g}" if isinstance(v, float) else f"{k} {v}" for k, v in value.items())
+        elif isinstance(value, float):
+            value = f"{value:.4g}"
+        print(f"{key:>24}: {value}")
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=4)
@@ -0,0 +1,128 @@
+"""
+Recall and latency of approximate "more like this" search against exact cosine
+
+usage: python -m benchmarks.similar [--corpus corpus] [--docs 20000] [--topics 100] [--queries 200] [--method svd] [--components 128] [--output results.json]
+
+The corpus is read as main.py reads it (a synthetic corpus with --topics
+topics is generated if not given, see benchmarks.corpus) and its tf-idf
+model is reduced and clustered by SimilarDocuments.fit. For every sampled
+document the exact top k (cosine with every document, SimilarDocuments.exact)
+is compared with SimilarDocuments.search at every n_probe and rerank:
+
+    recall          fraction of the exact top k found, averaged over documents
+    scored          fraction of documents scored in reduced space
+
+Latency percentiles are in milliseconds.
+"""
+
+from irstructures.document import read_corpus
+from irstructures.docstore import DocumentStore
+from irstructures.models.vector_space import Tf_Idf
+from irstructures.models.similar import SimilarDocuments
+from .corpus import generate_corpus
+from .suite import latency_stats
+import argparse, contextlib, io, json, os, random, shutil, tempfile, time
+import numpy as np
+
+def run(corpus_path, n_queries=200, k=10, method='svd', n_components=128, n_probes=(1, 2, 4, 8, 16), reranks=(0, 10, 30), n_jobs=1, seed=0):
+    """Fit SimilarDocuments on a corpus and measure recall@k and latency against exact search
+
+    Parameters
+    ----------
+    corpus_path: str
+        folder containing documents
+    n_queries: int
+        number of documents whose similar documents are searched
+    k: int
+        number of similar documents
+    method: str
+        'svd' or 'projection'
+    n_components: int
+        dimensions of reduced vectors
+    n_probes: tuple
+        values of n_probe to measure
+    reranks: tuple
+        values of rerank to measure
+    n_jobs: int
+        number of processes used by read_corpus
+    seed: int
+        seed used to sample documents
+
+    Returns
+    -------
+    dict
+        build times, recall and latencies
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        documents = read_corpus(corpus_path, n_jobs=n_jobs)
+        corpus = DocumentStore.from_corpus(documents)
+        del documents
+        vsmodel = Tf_Idf()
+        vsmodel.get_matrix(corpus)
+        similar = SimilarDocuments(n_components, method, seed=seed)
+        start = time.perf_counter()
+        similar.fit(vsmodel)
+        fit_seconds = time.perf_counter()-start
+
+    results = {'documents': len(corpus), 'method': method, 'components': similar.vectors.shape[1],
+               'lists': len(similar.centroids), 'fit_seconds': fit_seconds}
+    doc_ids = random.Random(seed).sample(range(len(corpus)), min(n_queries, len(corpus)))
+
+    latencies = []
+    exact = []
+    for doc_id in doc_ids:
+        start = time.perf_counter()
+        exact.append({ i for score, i in similar.exact(doc_id, k) })
+        latencies.append(time.perf_counter()-start)
+    results['exact'] = latency_stats(latencies)
+
+    for n_probe in n_probes:
+        for rerank in reranks:
+            latencies = []
+            recall = []
+            for doc_id, expected in zip(doc_ids, exact):
+                start = time.perf_counter()
+                output = similar.search(doc_id, k, n_probe, rerank)
+                latencies.append(time.perf_counter()-start)
+                if len(expected) > 0:
+                    recall.append(len(expected & { i for score, i in output }) / len(expected))
+            name = f'probe_{n_probe}_rerank_{rerank}'
+            results[name] = latency_stats(latencies)
+            results[name]['recall'] = float(np.mean(recall))
+            results[name]['scored'] = float(np.mean([ len(similar.candidates(doc_id, n_probe)) for doc_id in doc_ids ])) / len(corpus)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure recall and latency of approximate more like this search")
+    parser.add_argument("--corpus", default=None, help="folder containing documents, a synthetic corpus is generated if not given")
+    parser.add_argument("--docs", type=int, default=20000, help="number of documents of synthetic corpus")
+    parser.add_argument("--topics", type=int, default=100, help="number of topics of synthetic corpus")
+    parser.add_argument("--queries", type=int, default=200, help="number of documents whose similar documents are searched")
+    parser.add_argument("-k", type=int, default=10, help="number of similar documents")
+    parser.add_argument("--method", default="svd", choices=SimilarDocuments.methods, help="dimensionality reduction")
+    parser.add_argument("--components", type=int, default=128, help="dimensions of reduced vectors")
+    parser.add_argument("--jobs", type=int, default=1, help="number of processes used to read corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="json file to write results to")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="ir_bench_")
+    corpus_path = args.corpus
+    if corpus_path is None:
+        corpus_path = os.path.join(work_dir, "corpus")
+        generate_corpus(corpus_path, args.docs, seed=args.seed, n_topics=args.topics)
+    try:
+        results = run(corpus_path, args.queries, args.k, args.method, args.components, n_jobs=args.jobs, seed=args.seed)
+    finally:
+        shutil.rmtree(work_dir)
+
+    for key, value in results.items():
+        if isinstance(value, dict):
+            value = ", ".join(f"{k} {v:.4g}" if isinstance(v, float) else f"{k} {v}" for k, v in value.items())
+        elif isinstance(value, float):
+            value = f"{value:.4g}"
+        print(f"{key:>24}: {value}")
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=4)
@@ -0,0 +1,151 @@
+"""
+Measure time to first query when loading pickles/npz files and when opening a snapshot
+
+usage: python -m benchmarks.startup corpus [--work-dir startup_files] [--repeat 5] [--output startup.json]
+
+Both formats are built from the given corpus folder. Each load is timed in a
+new python process, so that import time is counted too: the pickle loader
+imports pandas and nltk up front (as main.py did before snapshots), loads
+corpus.npz, inv_index.bin and tfidf.pickle and then runs a query. The
+snapshot loader opens index.snap and runs the same query, nltk is imported
+when the query is tokenized. Median of each timing is printed and written as
+json to the output file.
+"""
+
+from irstructures.document import read_corpus
+from irstructures.docstore import DocumentStore
+from irstructures.invertedindex import InvertedIndex
+from irstructures.snapshot import write_snapshot
+import irstructures.models.vector_space as vector_space
+import argparse, contextlib, io, json, os, pickle, statistics, subprocess, sys, time
+
+# code run in child processes, argv[1] is the folder with built files and argv[2] the query
+PICKLE_LOADER = """
+import time
+start = time.time()
+import sys, pickle, pandas, nltk.corpus, nltk.stem.porter, nltk.tokenize
+from irstructures.docstore import DocumentStore
+from irstructures.invertedindex import DiskInvertedIndex
+import irstructures.models.vector_space as vector_space
+import irstructures.models.boolean_retrieval as boolean_retrieval
+imported = time.time()
+corpus = DocumentStore.load(sys.argv[1] + "/corpus.npz")
+index = DiskInvertedIndex(sys.argv[1] + "/inv_index.bin")
+with open(sys.argv[1] + "/tfidf.pickle", "rb") as tfidf_file:
+    vsmodel = pickle.load(tfidf_file)
+opened = time.time()
+"""
+
+SNAPSHOT_LOADER = """
+import time
+start = time.time()
+import sys
+from irstructures.document import Document
+from irstructures.snapshot import Snapshot
+import irstructures.models.vector_space as vector_space
+import irstructures.models.boolean_retrieval as boolean_retrieval
+imported = time.time()
+snapshot = Snapshot(sys.argv[1] + "/index.snap")
+Document.set_analyzer(snapshot.analyzer)
+corpus, vsmodel, index = snapshot.corpus, snapshot.vsmodel, snapshot.index
+opened = time.time()
+"""
+
+FIRST_QUERY = """
+boolean_output = boolean_retrieval.parse_query(sys.argv[2], corpus, index)
+output = vector_space.parse_query(sys.argv[2], corpus, vsmodel, vsmodel.matrix, boolean_output, 10)
+done = time.time()
+import json
+print(json.dumps({'import': imported-start, 'open': opened-imported, 'first_query': done-opened, 'total': done-start}))
+"""
+
+def build_files(corpus_path, work_dir):
+    """Build both the pickle/npz files and the snapshot of a corpus
+
+    Parameters
+    ----------
+    corpus_path: str
+        folder containing documents
+    work_dir: str
+        folder in which files are written
+
+    Returns
+    -------
+    dict
+        size in bytes of the files of each format
+    """
+
+    os.makedirs(work_dir, exist_ok=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        corpus = DocumentStore.from_corpus(read_corpus(corpus_path, n_jobs=os.cpu_count()))
+        corpus.save(os.path.join(work_dir, "corpus.npz"))
+        vsmodel = vector_space.Tf_Idf()
+        vsmodel.get_matrix(corpus)
+        with open(os.path.join(work_dir, "tfidf.pickle"), "wb") as tfidf_file:
+            pickle.dump(vsmodel, tfidf_file)
+        index = InvertedIndex(corpus)
+        index.set_impacts(vsmodel)
+        index.write(os.path.join(work_dir, "inv_index.bin"))
+        write_snapshot(os.path.join(work_dir, "index.snap"), corpus)
+
+    def size(*names):
+        return sum(os.path.getsize(os.path.join(work_dir, name)) for name in names)
+
+    return {'pickle': size("corpus.npz", "inv_index.bin", "tfidf.pickle"), 'snapshot': size("index.snap")}
+
+def time_startup(loader, work_dir, query, repeat=5):
+    """Run a loader in new processes and return median of its timings
+
+    Parameters
+    ----------
+    loader: str
+        PICKLE_LOADER or SNAPSHOT_LOADER
+    work_dir: str
+        folder containing files written by build_files
+    query: str
+        query run after loading
+    repeat: int
+        number of processes to run
+
+    Returns
+    -------
+    dict
+        median seconds taken to import modules, open files, run the first query,
+        their total and wall time of the process (including interpreter startup)
+    """
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    runs = []
+    for _ in range(repeat):
+        start = time.time()
+        result = subprocess.run([sys.executable, "-c", loader + FIRST_QUERY, work_dir, query],
+                                env=env, capture_output=True, text=True, check=True)
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        timings['process'] = time.time() - start
+        runs.append(timings)
+    return { name: statistics.median(run[name] for run in runs) for name in runs[0] }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure time to first query of pickle files and of a snapshot")
+    parser.add_argument("corpus", help="folder containing documents")
+    parser.add_argument("--work-dir", default="./startup_files", help="folder in which built files are written")
+    parser.add_argument("--query", default="information retrieval", help="query run after loading")
+    parser.add_argument("--repeat", type=int, default=5, help="number of processes run for each format")
+    parser.add_argument("--output", default=None, help="json file to write results to")
+    args = parser.parse_args()
+
+    start = time.time()
+    sizes = build_files(args.corpus, args.work_dir)
+    print("files built in", time.time()-start, 's')
+
+    results = {'sizes': sizes}
+    for name, loader in (('pickle', PICKLE_LOADER), ('snapshot', SNAPSHOT_LOADER)):
+        results[name] = time_startup(loader, args.work_dir, args.query, args.repeat)
+        print(f"{name:>8}: " + ", ".join(f"{key} {value:.3f}s" for key, value in results[name].items())
+              + f", {sizes[name]/2**20:.1f} MiB")
+    print("time to first query is", round(results['pickle']['process']/results['snapshot']['process'], 1), "times faster with snapshot")
+
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=4)
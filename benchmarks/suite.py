@@ -0,0 +1,290 @@
+"""
+Benchmarks of the indexing and query paths
+
+usage: python -m benchmarks.suite [--corpus corpus] [--docs 5000] [--queries 200] [--output results.json] [--baseline old.json]
+
+If no corpus folder is given a synthetic one is generated (see
+benchmarks.corpus) in a temporary folder. Stages are run in the same order
+as main.py builds the model:
+
+    read_corpus       tokenizing and stemming all documents
+    document_store    packing word frequencies into a DocumentStore
+    inverted_index    InvertedIndex construction
+    tf_idf            Tf_Idf.get_matrix
+    bm25              BM25.get_matrix
+    boolean_and/or    boolean_retrieval.AND/OR on posting lists of query words
+    boolean_query     boolean_retrieval.parse_query
+    search            vector_space.parse_query over all documents
+    bm25_search       bm25.parse_query over all documents
+
+Build stages report seconds taken, query stages report latency percentiles
+(in milliseconds) of single operations. Peak resident memory of the process
+after each stage is reported too. Results are written as json along with
+the git commit and versions used, so runs of different commits can be
+compared by passing an earlier output as --baseline.
+"""
+
+from irstructures.document import Document, read_corpus
+from irstructures.docstore import DocumentStore
+from irstructures.invertedindex import InvertedIndex
+import irstructures.models.boolean_retrieval as boolean_retrieval
+import irstructures.models.vector_space as vector_space
+import irstructures.models.bm25 as bm25
+from .corpus import generate_corpus
+import numpy as np
+import argparse, contextlib, io, json, os, platform, random, shutil, subprocess, sys, tempfile, time
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, peak memory is not reported there
+    resource = None
+
+def peak_rss():
+    """Returns peak resident memory of this process in MiB (None if it can not be measured)"""
+
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return usage / 2**20 if sys.platform == 'darwin' else usage / 2**10
+
+def latency_stats(seconds):
+    """Summarize latencies of single operations
+
+    Parameters
+    ----------
+    seconds: list
+        time taken by each operation
+
+    Returns
+    -------
+    dict
+        count, mean, p50, p95, p99 and max of latencies in milliseconds
+    """
+
+    ms = np.array(seconds) * 1000
+    if len(ms) == 0:
+        return {'count': 0}
+    return {
+        'count': len(ms),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+    }
+
+def sample_queries(corpus, n_queries=200, query_length=3, seed=0):
+    """Make queries from words of randomly chosen documents
+
+    Parameters
+    ----------
+    corpus: list or DocumentStore
+        documents with a filepath
+    n_queries: int
+        number of queries
+    query_length: int
+        number of words in each query
+    seed: int
+        seed of random number generator
+
+    Returns
+    -------
+    list
+        list of query strings
+    """
+
+    rand = random.Random(seed)
+    queries = []
+    while len(queries) < n_queries:
+        with open(corpus[rand.randrange(len(corpus))].filepath, encoding="utf8", errors="ignore") as file:
+            words = file.read().split()
+        if len(words) >= query_length:
+            queries.append(' '.join(rand.sample(words, query_length)))
+    return queries
+
+def environment():
+    """Returns git commit, versions and machine details of this run"""
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'time': time.time(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+def run_suite(corpus_path, n_queries=200, query_length=3, k=10, n_jobs=1, seed=0):
+    """Run all benchmarks on a corpus
+
+    Parameters
+    ----------
+    corpus_path: str
+        folder containing documents
+    n_queries: int
+        number of queries used for query stages
+    query_length: int
+        number of words in each query
+    k: int
+        number of results of ranked search
+    n_jobs: int
+        number of processes used by read_corpus
+    seed: int
+        seed used to sample queries
+
+    Returns
+    -------
+    dict
+        results of each stage
+    """
+
+    results = dict()
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        documents = read_corpus(corpus_path, n_jobs=n_jobs)
+    results['read_corpus'] = {'seconds': time.perf_counter()-start, 'documents': len(documents), 'peak_rss_mb': peak_rss()}
+
+    start = time.perf_counter()
+    corpus = DocumentStore.from_corpus(documents)
+    del documents
+    results['document_store'] = {'seconds': time.perf_counter()-start, 'peak_rss_mb': peak_rss()}
+
+    start = time.perf_counter()
+    index = InvertedIndex(corpus)
+    results['inverted_index'] = {'seconds': time.perf_counter()-start, 'words': len(index),
+                                 'postings': int(len(corpus.ids)), 'peak_rss_mb': peak_rss()}
+
+    start = time.perf_counter()
+    vsmodel = vector_space.Tf_Idf()
+    with contextlib.redirect_stdout(io.StringIO()):
+        matrix = vsmodel.get_matrix(corpus)
+    results['tf_idf'] = {'seconds': time.perf_counter()-start, 'peak_rss_mb': peak_rss()}
+
+    start = time.perf_counter()
+    bm25_model = bm25.BM25()
+    with contextlib.redirect_stdout(io.StringIO()):
+        bm25_matrix = bm25_model.get_matrix(corpus)
+    results['bm25'] = {'seconds': time.perf_counter()-start, 'peak_rss_mb': peak_rss()}
+
+    queries = sample_queries(corpus, n_queries, query_length, seed)
+    query_words = [ [ word for word in Document.get_word_freq(query) if word in index ] for query in queries ]
+    pairs = [ (index[words[i]], index[words[i+1]]) for words in query_words for i in range(len(words)-1) ]
+    for name, operator in (('boolean_and', boolean_retrieval.AND), ('boolean_or', boolean_retrieval.OR)):
+        latencies = []
+        for list1, list2 in pairs:
+            start = time.perf_counter()
+            operator(list1, list2)
+            latencies.append(time.perf_counter()-start)
+        results[name] = latency_stats(latencies)
+        results[name]['mean_postings'] = float(np.mean([ len(a)+len(b) for a, b in pairs ])) if pairs else 0.0
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        boolean_retrieval.parse_query(query, corpus, index)
+        latencies.append(time.perf_counter()-start)
+    results['boolean_query'] = latency_stats(latencies)
+
+    all_docs = range(len(corpus))
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        vector_space.parse_query(query, corpus, vsmodel, matrix, all_docs, k)
+        latencies.append(time.perf_counter()-start)
+    results['search'] = latency_stats(latencies)
+    results['search']['peak_rss_mb'] = peak_rss()
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        bm25.parse_query(query, corpus, bm25_model, bm25_matrix, all_docs, k)
+        latencies.append(time.perf_counter()-start)
+    results['bm25_search'] = latency_stats(latencies)
+    return results
+
+def flatten(results, prefix=""):
+    """Returns nested dict of results as a flat dict with keys like 'search.p50_ms'"""
+
+    flat = dict()
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + key + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+def compare(baseline, results):
+    """Compare timings of two runs
+
+    Parameters
+    ----------
+    baseline: dict
+        results of earlier run (as written by this module)
+    results: dict
+        results of current run
+
+    Returns
+    -------
+    list
+        (metric, baseline value, current value, current/baseline) for each
+        time and memory metric present in both runs
+    """
+
+    old = flatten(baseline['results'])
+    new = flatten(results['results'])
+    rows = []
+    for metric, value in new.items():
+        if metric in old and (metric.endswith('_ms') or metric.endswith('seconds') or metric.endswith('_mb')):
+            rows.append((metric, old[metric], value, value/old[metric] if old[metric] else float('inf')))
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark indexing and query paths")
+    parser.add_argument("--corpus", default=None, help="folder containing documents, a synthetic corpus is generated if not given")
+    parser.add_argument("--docs", type=int, default=5000, help="number of documents of synthetic corpus")
+    parser.add_argument("--vocab", type=int, default=50000, help="number of distinct words of synthetic corpus")
+    parser.add_argument("--length", type=int, default=200, help="average number of words in a document of synthetic corpus")
+    parser.add_argument("--zipf", type=float, default=1.1, help="exponent of zipf's law of synthetic corpus")
+    parser.add_argument("--queries", type=int, default=200, help="number of queries")
+    parser.add_argument("--query-length", type=int, default=3, help="number of words in each query")
+    parser.add_argument("-k", type=int, default=10, help="number of results of ranked search")
+    parser.add_argument("--jobs", type=int, default=1, help="number of processes used to read corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="json file to write results to")
+    parser.add_argument("--baseline", default=None, help="json file written by an earlier run to compare with")
+    args = parser.parse_args()
+
+    corpus_path = args.corpus
+    if corpus_path is None:
+        corpus_path = tempfile.mkdtemp(prefix="ir_bench_")
+        generate_corpus(corpus_path, args.docs, args.vocab, args.length, args.zipf, args.seed)
+    try:
+        results = run_suite(corpus_path, args.queries, args.query_length, args.k, args.jobs, args.seed)
+    finally:
+        if args.corpus is None:
+            shutil.rmtree(corpus_path)
+
+    params = {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')}
+    output = {'environment': environment(), 'params': params, 'results': results}
+    for stage, values in results.items():
+        print(f"{stage:>15}: " + ", ".join(f"{key} {value:.4g}" if isinstance(value, float) else f"{key} {value}"
+                                           for key, value in values.items()))
+
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        print(f"\ncompared with {args.baseline} (commit {baseline['environment'].get('commit')}):")
+        for metric, old, new, ratio in compare(baseline, output):
+            print(f"{metric:>30}: {old:.4g} -> {new:.4g} ({ratio:.2f}x)")
+
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(output, output_file, indent=4)
@@ -0,0 +1,132 @@
+"""
+Memory and lookup latency of the front coded term dictionary
+
+usage: python -m benchmarks.termdict [--corpus corpus | --words words.txt] [--vocab 200000] [--queries 1000] [--output results.json]
+
+Words are the vocabulary of --corpus (read as main.py reads it), the lines
+of --words (eg: /usr/share/dict/words) or --vocab synthetic words. They are
+held as
+
+    dict             python dict of str to term id
+    string_table     utf8 blob and offsets (snapshot.SortedVocab, version 1 index files)
+    front_coded_b    termdict.TermDictionary with blocks of b words
+
+and timed on
+    exact            lookup of words sampled from the vocabulary
+    prefix           all words starting with the first 3 characters of a sampled word (match, at most 1024)
+    infix            '*' + 3 characters from the middle of a sampled word + '*' (k-gram index)
+
+Sizes are in bytes, latency percentiles in milliseconds (per query).
+"""
+
+from irstructures.document import read_corpus
+from irstructures.docstore import DocumentStore, encode_strings
+from irstructures.snapshot import StringTable, SortedVocab
+from irstructures.termdict import TermDictionary
+from .corpus import generate_vocabulary
+from .suite import latency_stats
+import argparse, contextlib, io, json, random, sys, time
+import numpy as np
+
+def dict_size(vocab):
+    """Returns memory held by a dict of str to int, including its keys and values"""
+
+    return sys.getsizeof(vocab) + sum(sys.getsizeof(word) + sys.getsizeof(i) for word, i in vocab.items())
+
+def time_queries(lookup, queries):
+    """Returns latency stats of calling lookup on every query"""
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        lookup(query)
+        latencies.append(time.perf_counter()-start)
+    return latency_stats(latencies)
+
+def run(words, n_queries=1000, block_sizes=(4, 16, 64), seed=0):
+    """Build every dictionary of words and time lookups on them
+
+    Parameters
+    ----------
+    words: list
+        distinct words
+    n_queries: int
+        number of queries of each kind
+    block_sizes: tuple
+        block sizes of front coded dictionaries
+    seed: int
+        seed used to sample queries
+
+    Returns
+    -------
+    dict
+        sizes, build times and latencies
+    """
+
+    # utf8 byte order, the order of term ids
+    words = sorted(set(words), key=lambda word: word.encode('utf8'))
+    rand = random.Random(seed)
+    sampled = [ rand.choice(words) for _ in range(n_queries) ]
+    exact = sampled[:n_queries//2] + [ word + 'q' for word in sampled[n_queries//2:] ]
+    prefixes = [ word[:3] + '*' for word in sampled ]
+    infixes = [ '*' + word[len(word)//2-1:len(word)//2+2] + '*' for word in sampled ]
+
+    vocab = { word: i for i, word in enumerate(words) }
+    blob, offsets = encode_strings(words)
+    table = SortedVocab(StringTable(blob, offsets))
+    results = {
+        'words': len(words),
+        'utf8_bytes': int(offsets[-1]),
+        'dict_bytes': dict_size(vocab),
+        'string_table_bytes': int(offsets[-1]) + offsets.nbytes,
+    }
+    results['dict'] = time_queries(vocab.get, exact)
+    results['string_table'] = time_queries(table.find, exact)
+
+    for block_size in block_sizes:
+        name = f'front_coded_{block_size}'
+        start = time.perf_counter()
+        terms = TermDictionary.from_terms(words, block_size)
+        results[name + '_build_seconds'] = time.perf_counter()-start
+        results[name + '_bytes'] = terms.nbytes()
+        results[name] = time_queries(terms.find, exact)
+        results[name + '_prefix'] = time_queries(lambda pattern: terms.match(pattern, 1024), prefixes)
+        results[name + '_mean_prefix_matches'] = float(np.mean([ len(terms.match(pattern, 1024)) for pattern in prefixes ]))
+        if block_size == 16:
+            start = time.perf_counter()
+            terms.kgram_index()
+            results['kgram_build_seconds'] = time.perf_counter()-start
+            results[name + '_infix'] = time_queries(terms.match, infixes)
+    results['dict_to_front_coded_16'] = results['dict_bytes'] / results['front_coded_16_bytes']
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure memory and lookup latency of the term dictionary")
+    parser.add_argument("--corpus", default=None, help="folder containing documents, its vocabulary is used")
+    parser.add_argument("--words", default=None, help="file with one word in each line")
+    parser.add_argument("--vocab", type=int, default=200000, help="number of synthetic words, if neither corpus nor words are given")
+    parser.add_argument("--queries", type=int, default=1000, help="number of queries of each kind")
+    parser.add_argument("--jobs", type=int, default=1, help="number of processes used to read corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="json file to write results to")
+    args = parser.parse_args()
+
+    if args.corpus is not None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            words = list(DocumentStore.from_corpus(read_corpus(args.corpus, n_jobs=args.jobs)).terms)
+    elif args.words is not None:
+        with open(args.words, encoding="utf8", errors="ignore") as words_file:
+            words = [ line.strip().lower() for line in words_file if line.strip() ]
+    else:
+        words = generate_vocabulary(args.vocab, seed=args.seed)
+    results = run(words, args.queries, seed=args.seed)
+
+    for key, value in results.items():
+        if isinstance(value, dict):
+            value = ", ".join(f"{k} {v:.4g}" if isinstance(v, float) else f"{k} {v}" for k, v in value.items())
+        elif isinstance(value, float):
+            value = f"{value:.4g}"
+        print(f"{key:>32}: {value}")
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=4)
@@ -0,0 +1,131 @@
+"""
+Size, latency and fidelity of the tiered (champion list) index against exact tf-idf ranking
+
+usage: python -m benchmarks.tiered [--corpus corpus] [--docs 20000] [--queries 200] [--output results.json]
+
+The corpus is read as main.py reads it and its tf-idf model is built. Every
+query ranks all documents (without boolean retrieval) with Tf_Idf.search
+(exact) and with TieredIndex.search for every champion list size r and
+static pruning threshold prune:
+
+    tier1_bytes     size of champion lists (rows and impacts)
+    tier2_bytes     size of the full, or pruned, index
+    fallback        fraction of queries which needed tier 2
+    overlap         fraction of the exact top k returned, averaged over queries
+    identical       fraction of queries whose top k (documents and order) is the exact one
+
+Latency percentiles are in milliseconds.
+"""
+
+from irstructures.document import Document, read_corpus
+from irstructures.docstore import DocumentStore
+from irstructures.models.vector_space import Tf_Idf
+from irstructures.models.tiered import TieredIndex
+from irstructures import instrument
+from .corpus import generate_corpus
+from .suite import latency_stats, sample_queries
+import argparse, contextlib, io, json, os, shutil, tempfile, time
+import numpy as np
+
+def time_search(model, queries, corpus, k):
+    """Returns (results, latency stats) of ranking all documents for every query"""
+
+    all_docs = range(len(corpus))
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(model.search(Document(raw_data=query), corpus, model.matrix, all_docs, k))
+        latencies.append(time.perf_counter()-start)
+    return results, latency_stats(latencies)
+
+def run(corpus_path, n_queries=200, k=10, sizes=(10, 50, 100, 500), prunes=(0.0, 0.3, 0.5), n_jobs=1, seed=0):
+    """Build tiered indexes of a corpus and compare their results with exact ranking
+
+    Parameters
+    ----------
+    corpus_path: str
+        folder containing documents
+    n_queries: int
+        number of queries
+    k: int
+        number of results of each query
+    sizes: tuple
+        values of r (no. of postings in each champion list) to measure
+    prunes: tuple
+        values of prune (static pruning threshold) to measure
+    n_jobs: int
+        number of processes used by read_corpus
+    seed: int
+        seed used to sample queries
+
+    Returns
+    -------
+    dict
+        sizes, latencies and fidelity of every setting
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        documents = read_corpus(corpus_path, n_jobs=n_jobs)
+        corpus = DocumentStore.from_corpus(documents)
+        del documents
+        vsmodel = Tf_Idf()
+        vsmodel.get_matrix(corpus)
+    queries = sample_queries(corpus, n_queries, seed=seed)
+
+    exact, stats = time_search(vsmodel, queries, corpus, k)
+    results = {'documents': len(corpus), 'postings': int(vsmodel.matrix.nnz), 'exact': stats}
+    for prune in prunes:
+        for r in sizes:
+            tiered = TieredIndex(r, prune)
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                tiered.fit(vsmodel)
+                fit_seconds = time.perf_counter()-start
+            output, stats = time_search(tiered, queries, corpus, k)
+            # fallbacks are counted in a second run, so that timing is not instrumented
+            instrument.reset()
+            instrument.enable()
+            time_search(tiered, queries, corpus, k)
+            instrument.disable()
+            fallback = instrument.counters.get('fallback', 0)
+            instrument.reset()
+
+            name = f'r_{r}_prune_{prune}'
+            results[name] = dict(tiered.nbytes(), fit_seconds=fit_seconds, fallback=fallback / len(queries))
+            results[name]['overlap'] = float(np.mean([ len({ i for s, i in a } & { i for s, i in b }) / max(len(b), 1) for a, b in zip(output, exact) ]))
+            results[name]['identical'] = float(np.mean([ [ i for s, i in a ] == [ i for s, i in b ] for a, b in zip(output, exact) ]))
+            results[name].update(stats)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure size, latency and fidelity of tiered indexes")
+    parser.add_argument("--corpus", default=None, help="folder containing documents, a synthetic corpus is generated if not given")
+    parser.add_argument("--docs", type=int, default=20000, help="number of documents of synthetic corpus")
+    parser.add_argument("--queries", type=int, default=200, help="number of queries")
+    parser.add_argument("-k", type=int, default=10, help="number of results of each query")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 100, 500], help="champion list sizes (r)")
+    parser.add_argument("--prunes", type=float, nargs="+", default=[0.0, 0.3, 0.5], help="static pruning thresholds")
+    parser.add_argument("--jobs", type=int, default=1, help="number of processes used to read corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="json file to write results to")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="ir_bench_")
+    corpus_path = args.corpus
+    if corpus_path is None:
+        corpus_path = os.path.join(work_dir, "corpus")
+        generate_corpus(corpus_path, args.docs, seed=args.seed)
+    try:
+        results = run(corpus_path, args.queries, args.k, args.sizes, args.prunes, args.jobs, args.seed)
+    finally:
+        shutil.rmtree(work_dir)
+
+    for key, value in results.items():
+        if isinstance(value, dict):
+            value = ", ".join(f"{k} {v:.4g}" if isinstance(v, float) else f"{k} {v}" for k, v in value.items())
+        elif isinstance(value, float):
+            value = f"{value:.4g}"
+        print(f"{key:>24}: {value}")
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=4)
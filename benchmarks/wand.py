@@ -0,0 +1,126 @@
+"""
+Postings skipped, latency and exactness of WAND top k retrieval against exhaustive tf-idf ranking
+
+usage: python -m benchmarks.wand [--corpus corpus] [--docs 20000] [--queries 200] [--lengths 1 2 3 5] [--output results.json]
+
+The corpus is read as main.py reads it and written as a snapshot, whose
+index has the impacts used by WAND. For every query length, queries rank all
+documents (without boolean retrieval) with Tf_Idf.search (exhaustive) and with
+Wand.search:
+
+    postings        no. of postings of the query words, averaged over queries
+    skipped         fraction of those postings which were not scored
+    identical       fraction of queries whose top k (documents and order) is the exhaustive one
+
+Latency percentiles are in milliseconds.
+"""
+
+from irstructures.document import Document, read_corpus
+from irstructures.docstore import DocumentStore
+from irstructures.snapshot import Snapshot, write_snapshot
+from irstructures.models.wand import Wand
+from .corpus import generate_corpus
+from .suite import latency_stats, sample_queries
+import argparse, contextlib, io, json, os, shutil, tempfile, time
+import numpy as np
+
+def time_search(model, queries, corpus, k):
+    """Returns (results, latency stats) of ranking all documents for every query"""
+
+    all_docs = range(len(corpus))
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(model.search(Document(raw_data=query), corpus, model.matrix, all_docs, k))
+        latencies.append(time.perf_counter()-start)
+    return results, latency_stats(latencies)
+
+def run(corpus_path, work_dir, n_queries=200, k=10, lengths=(1, 2, 3, 5), n_jobs=1, seed=0):
+    """Build a snapshot of a corpus and compare WAND with exhaustive ranking for several query lengths
+
+    Parameters
+    ----------
+    corpus_path: str
+        folder containing documents
+    work_dir: str
+        folder in which the snapshot is written
+    n_queries: int
+        number of queries of each length
+    k: int
+        number of results of each query
+    lengths: tuple
+        number of words in queries
+    n_jobs: int
+        number of processes used by read_corpus
+    seed: int
+        seed used to sample queries
+
+    Returns
+    -------
+    dict
+        postings skipped, exactness and latencies for every query length
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        documents = read_corpus(corpus_path, n_jobs=n_jobs)
+        corpus = DocumentStore.from_corpus(documents)
+        del documents
+        write_snapshot(os.path.join(work_dir, "index.snap"), corpus)
+    snapshot = Snapshot(os.path.join(work_dir, "index.snap"))
+    corpus, vsmodel = snapshot.corpus, snapshot.vsmodel
+    wand = Wand(vsmodel, snapshot.index)
+
+    results = {'documents': len(corpus), 'postings': int(vsmodel.matrix.nnz)}
+    for length in lengths:
+        queries = sample_queries(corpus, n_queries, length, seed=seed)
+        exact, exact_stats = time_search(vsmodel, queries, corpus, k)
+        output, stats = [], []
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            output.append(wand.search(Document(raw_data=query), corpus, wand.matrix, range(len(corpus)), k))
+            latencies.append(time.perf_counter()-start)
+            stats.append(wand.stats)
+
+        postings = sum(s['postings'] for s in stats)
+        name = f'length_{length}'
+        results[name] = {'exhaustive_p50_ms': exact_stats['p50_ms'], 'wand_p50_ms': latency_stats(latencies)['p50_ms'],
+                         'postings': postings / len(queries),
+                         'skipped': sum(s['skipped'] for s in stats) / max(postings, 1)}
+        results[name]['identical'] = float(np.mean([ [ i for s, i in a ] == [ i for s, i in b ] for a, b in zip(output, exact) ]))
+        results[name]['max_score_diff'] = max([ abs(x[0]-y[0]) for a, b in zip(output, exact) for x, y in zip(a, b) ], default=0.0)
+    corpus = vsmodel = wand = None
+    snapshot.close()
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure postings skipped and exactness of WAND top k retrieval")
+    parser.add_argument("--corpus", default=None, help="folder containing documents, a synthetic corpus is generated if not given")
+    parser.add_argument("--docs", type=int, default=20000, help="number of documents of synthetic corpus")
+    parser.add_argument("--queries", type=int, default=200, help="number of queries of each length")
+    parser.add_argument("-k", type=int, default=10, help="number of results of each query")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[1, 2, 3, 5], help="number of words in queries")
+    parser.add_argument("--jobs", type=int, default=1, help="number of processes used to read corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="json file to write results to")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="ir_bench_")
+    corpus_path = args.corpus
+    if corpus_path is None:
+        corpus_path = os.path.join(work_dir, "corpus")
+        generate_corpus(corpus_path, args.docs, seed=args.seed)
+    try:
+        results = run(corpus_path, work_dir, args.queries, args.k, args.lengths, args.jobs, args.seed)
+    finally:
+        shutil.rmtree(work_dir)
+
+    for key, value in results.items():
+        if isinstance(value, dict):
+            value = ", ".join(f"{k} {v:.4g}" if isinstance(v, float) else f"{k} {v}" for k, v in value.items())
+        elif isinstance(value, float):
+            value = f"{value:.4g}"
+        print(f"{key:>24}: {value}")
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=4)
@@ -0,0 +1,129 @@
+"""
+This module implements a text analyzer which does not depend on nltk
+
+Text is lowercased, split into tokens with one precompiled regex (the same
+pattern as nltk's wordpunct_tokenize: runs of word characters or runs of
+punctuation), stop words are removed with a set lookup and remaining words
+are stemmed with the bundled Porter stemmer (see irstructures.porter)
+through a StemCache. Tokens are counted first, so stop word lookups and
+stemming are done once per distinct token of a document. Terms are the same as those of the nltk pipeline with
+use_regex=True.
+
+Stop words are nltk's english list along with the punctuation marks used by
+Document. Newer nltk lists also have contractions like "he'll", which can
+not occur as tokens here since apostrophes split words.
+"""
+
+from collections import Counter
+import re
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]+")
+
+# nltk's english stop words
+ENGLISH_STOP_WORDS = [
+    'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you', "you're", "you've",
+    "you'll", "you'd", 'your', 'yours', 'yourself', 'yourselves', 'he', 'him', 'his', 'himself',
+    'she', "she's", 'her', 'hers', 'herself', 'it', "it's", 'its', 'itself', 'they', 'them',
+    'their', 'theirs', 'themselves', 'what', 'which', 'who', 'whom', 'this', 'that', "that'll",
+    'these', 'those', 'am', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has',
+    'had', 'having', 'do', 'does', 'did', 'doing', 'a', 'an', 'the', 'and', 'but', 'if', 'or',
+    'because', 'as', 'until', 'while', 'of', 'at', 'by', 'for', 'with', 'about', 'against',
+    'between', 'into', 'through', 'during', 'before', 'after', 'above', 'below', 'to', 'from',
+    'up', 'down', 'in', 'out', 'on', 'off', 'over', 'under', 'again', 'further', 'then', 'once',
+    'here', 'there', 'when', 'where', 'why', 'how', 'all', 'any', 'both', 'each', 'few', 'more',
+    'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than',
+    'too', 'very', 's', 't', 'can', 'will', 'just', 'don', "don't", 'should', "should've", 'now',
+    'd', 'll', 'm', 'o', 're', 've', 'y', 'ain', 'aren', "aren't", 'couldn', "couldn't", 'didn',
+    "didn't", 'doesn', "doesn't", 'hadn', "hadn't", 'hasn', "hasn't", 'haven', "haven't", 'isn',
+    "isn't", 'ma', 'mightn', "mightn't", 'mustn', "mustn't", 'needn', "needn't", 'shan', "shan't",
+    'shouldn', "shouldn't", 'wasn', "wasn't", 'weren', "weren't", 'won', "won't", 'wouldn', "wouldn't",
+]
+
+# punctuation and parts of contractions, used by Document too
+# ("ses" has always been in this list in place of "s" and "es", it is kept so that terms do not change)
+EXTRA_STOP_WORDS = ['.', ',', '"', "'", '?', '!', ':', ';', '(', ')', '[', ']', '{', '}', '`', '``',
+                    "'s", "''", "m", "re", "ses"]
+
+STOP_WORDS = frozenset(ENGLISH_STOP_WORDS + EXTRA_STOP_WORDS)
+
+def tokenize(text):
+    """Lowercase text and split it into words and runs of punctuation
+
+    Parameters
+    ----------
+    text: str
+        text to be tokenized
+
+    Returns
+    -------
+    list
+        list of tokens in order of occurence
+    """
+
+    return TOKEN_PATTERN.findall(text.lower())
+
+def count_tokens(text, stop_words=STOP_WORDS):
+    """Tokenize text and count frequency of each token which is not a stop word
+
+    Tokens are counted before stop words are removed and words are stemmed,
+    so both are done once per distinct token of the text instead of once per token.
+
+    Parameters
+    ----------
+    text: str
+        text to be analyzed
+    stop_words: set
+        words to be removed
+
+    Returns
+    -------
+    dict
+        dictionary with each token and it's corresponding frequency (in order of first occurence)
+    """
+
+    return { token: freq for token, freq in Counter(tokenize(text)).items() if token not in stop_words }
+
+def stem_counts(token_freq, stem_cache):
+    """Stem counted tokens, adding up frequencies of tokens with the same stem
+
+    Parameters
+    ----------
+    token_freq: dict
+        dictionary with each token and it's frequency, as returned by count_tokens
+    stem_cache: StemCache
+        cache used to stem words
+
+    Returns
+    -------
+    dict
+        dictionary with each stemmed word and it's corresponding frequency
+    """
+
+    word_freq = dict()
+    get = word_freq.get
+    for word, freq in zip(stem_cache.stem_words(token_freq), token_freq.values()):
+        word_freq[word] = get(word, 0) + freq
+    return word_freq
+
+def get_word_freq(text, stem_cache=None, stop_words=STOP_WORDS):
+    """Tokenize text, remove stop words and count frequency of each (stemmed) word
+
+    Parameters
+    ----------
+    text: str
+        text to be analyzed
+    stem_cache: StemCache
+        cache used to stem words, words are not stemmed if None
+    stop_words: set
+        words to be removed
+
+    Returns
+    -------
+    dict
+        dictionary with each word and it's corresponding frequency
+    """
+
+    token_freq = count_tokens(text, stop_words)
+    if stem_cache is None:
+        return token_freq
+    return stem_counts(token_freq, stem_cache)
@@ -0,0 +1,107 @@
+"""
+This module implements variable byte (varint) encoding used to compress posting lists
+
+Each number is split into groups of 7 bits, least significant group first.
+The high bit of a byte is set only on the last byte of a number. Encoding and
+decoding are done with numpy, without a python loop over the numbers.
+"""
+
+import numpy as np
+
+def vbyte_encode(numbers):
+    """Encode non negative integers using variable byte encoding
+
+    Parameters
+    ----------
+    numbers: numpy.array
+        array of non negative integers (less than 2**63, so that they are decoded as int64)
+
+    Returns
+    -------
+    bytes
+        encoded bytes
+
+    Raises
+    ------
+    ValueError
+        if a number is negative or not less than 2**63
+    """
+
+    numbers = np.asarray(numbers, dtype=np.uint64)
+    largest = int(numbers.max()) if len(numbers) > 0 else 0
+    if largest >= 1 << 63:
+        raise ValueError(f"vbyte_encode can encode numbers from 0 to 2**63-1, not {largest}")
+    nbytes = np.ones(len(numbers), dtype=np.int64)
+    # one more byte for every 7 bits of the largest number
+    i = 1
+    while largest >= 1 << (7*i):
+        nbytes += numbers >= (1 << (7*i))
+        i += 1
+
+    # position of each output byte inside its number
+    starts = np.cumsum(nbytes) - nbytes
+    byte_pos = np.arange(nbytes.sum()) - np.repeat(starts, nbytes)
+    values = np.repeat(numbers, nbytes)
+    out = (values >> (7*byte_pos).astype(np.uint64)) & np.uint64(127)
+    # mark last byte of every number
+    out[starts + nbytes - 1] |= np.uint64(128)
+    return out.astype(np.uint8).tobytes()
+
+def vbyte_decode(data):
+    """Decode bytes encoded with vbyte_encode
+
+    Parameters
+    ----------
+    data: bytes
+        encoded bytes (any object supporting buffer protocol, eg: mmap slice)
+
+    Returns
+    -------
+    numpy.array
+        decoded integers as int64 array
+    """
+
+    data = np.frombuffer(data, dtype=np.uint8)
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(data & 128)
+    starts = np.empty(len(ends), dtype=np.int64)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    counts = ends - starts + 1
+    byte_pos = np.arange(len(data)) - np.repeat(starts, counts)
+    values = (data & 127).astype(np.int64) << (7*byte_pos)
+    return np.add.reduceat(values, starts)
+
+def delta_encode(doc_ids):
+    """Returns gaps between consecutive doc_id's of a sorted list (first doc_id is kept as is)
+
+    Parameters
+    ----------
+    doc_ids: numpy.array
+        sorted array of doc_id's
+
+    Returns
+    -------
+    numpy.array
+        array of gaps
+    """
+
+    doc_ids = np.asarray(doc_ids, dtype=np.int64)
+    return np.diff(doc_ids, prepend=0)
+
+def delta_decode(gaps):
+    """Returns the sorted list of doc_id's from gaps given by delta_encode
+
+    Parameters
+    ----------
+    gaps: numpy.array
+        array of gaps
+
+    Returns
+    -------
+    numpy.array
+        sorted array of doc_id's
+    """
+
+    return np.cumsum(gaps)
@@ -0,0 +1,318 @@
+"""
+This module implements a compact, columnar store of documents
+
+Instead of keeping one Document object (with its own dictionary of words) per
+file, word frequencies of all documents are kept in flat numpy arrays:
+term ids and frequencies of document i are ids[offsets[i]:offsets[i+1]] and
+freqs[offsets[i]:offsets[i+1]]. Words and file paths are kept in separate
+string tables. DocumentView gives Document like access to a single document.
+"""
+
+import numpy as np
+
+def encode_strings(strings):
+    """Pack a list of strings into a utf8 blob and offsets
+
+    Parameters
+    ----------
+    strings: list
+        list of strings
+
+    Returns
+    -------
+    tuple
+        (numpy array of bytes, numpy array of offsets of each string in blob)
+    """
+
+    encoded = [ string.encode('utf8') for string in strings ]
+    offsets = np.zeros(len(encoded)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum([ len(string) for string in encoded ])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+def decode_strings(blob, offsets):
+    """Unpack strings packed by encode_strings
+
+    Parameters
+    ----------
+    blob: numpy.array
+        array of bytes
+    offsets: numpy.array
+        offsets of each string in blob
+
+    Returns
+    -------
+    list
+        list of strings
+    """
+
+    data = blob.tobytes()
+    offsets = offsets.tolist()
+    return [ data[offsets[i]:offsets[i+1]].decode('utf8') for i in range(len(offsets)-1) ]
+
+
+class DocumentView:
+    """
+    Lightweight Document like view of one document in a DocumentStore
+
+    Attributes
+    ----------
+    store: DocumentStore
+        store holding the document
+    doc_id: int
+        unique document id (position in store)
+    """
+
+    __slots__ = ('store', 'doc_id')
+
+    def __init__(self, store, doc_id):
+        self.store = store
+        self.doc_id = doc_id
+
+    @property
+    def filepath(self):
+        return self.store.paths[self.doc_id]
+
+    @property
+    def word_freq(self):
+        """dictionary with each word and it's corresponding frequency"""
+
+        ids, freqs = self.store.term_freqs(self.doc_id)
+        terms = self.store.terms
+        return { terms[i]: freq for i, freq in zip(ids.tolist(), freqs.tolist()) }
+
+    @property
+    def raw_data(self):
+        # text of documents is not kept in the store
+        return ""
+
+    def __str__(self):
+        return self.raw_data
+
+
+class DocumentStore:
+    """
+    Class used to hold word frequencies and paths of all documents in flat arrays
+
+    Can be used wherever a list of Document objects (corpus) is used:
+    len(store), store[doc_id] and iteration give DocumentView objects.
+
+    Attributes
+    ----------
+    terms: list
+        word of each term id
+    term_ids: dict
+        words as keys and their term id as values
+    offsets: numpy.array
+        start of each document in ids and freqs, length is no. of documents + 1
+    ids: numpy.array
+        term ids of all documents, one after another
+    freqs: numpy.array
+        frequency of each term id in ids
+    paths: list
+        path of each document, indexed by doc_id
+
+    Methods
+    -------
+    from_corpus(cls, corpus)
+        Create store from a list of Document objects
+    from_index(cls, index, paths)
+        Create store from the postings of an inverted index
+    sort_terms(self)
+        Returns a copy of store with term ids in sorted order of words
+    subset(self, start, end)
+        Returns store of a range of documents
+    term_freqs(self, doc_id)
+        Returns term ids and frequencies of a document
+    save(self, filepath)
+        Saves store to disk
+    load(cls, filepath)
+        Loads store saved with save
+    """
+
+    def __init__(self, terms, offsets, ids, freqs, paths, term_ids=None):
+        self.terms = terms
+        # term_ids can be given as any mapping (eg: a sorted vocabulary which is searched in place)
+        if term_ids is None:
+            term_ids = { term: i for i, term in enumerate(terms) }
+        self.term_ids = term_ids
+        self.offsets = offsets
+        self.ids = ids
+        self.freqs = freqs
+        self.paths = paths
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """Create store from a list of Document objects
+
+        Documents are stored in given order, so doc_id of corpus[i] in the store is i.
+
+        Parameters
+        ----------
+        corpus: list
+            list of Document objects
+
+        Returns
+        -------
+        DocumentStore
+            store holding the corpus
+        """
+
+        term_ids = dict()
+        offsets = np.zeros(len(corpus)+1, dtype=np.int64)
+        ids = []
+        freqs = []
+        for i, document in enumerate(corpus):
+            for word, freq in document.word_freq.items():
+                ids.append(term_ids.setdefault(word, len(term_ids)))
+                freqs.append(freq)
+            offsets[i+1] = len(ids)
+        return cls(list(term_ids), offsets, np.array(ids, dtype=np.uint32),
+                   np.array(freqs, dtype=np.uint32), [ document.filepath for document in corpus ])
+
+    @classmethod
+    def from_index(cls, index, paths):
+        """Create store from the postings of an inverted index
+
+        Postings are read one word at a time and regrouped by document, so an
+        index built with streaming.build_index gives a store without reading the
+        corpus into memory. Term ids are in order of words of the index (sorted
+        for a DiskInvertedIndex).
+
+        Parameters
+        ----------
+        index: DiskInvertedIndex
+            index whose postings(word) gives doc_id's and term frequencies of word
+        paths: iterable
+            path of each document, in order of doc_id (eg: streaming.read_doc_paths)
+
+        Returns
+        -------
+        DocumentStore
+            store holding word frequencies of the documents of the index
+        """
+
+        paths = list(paths)
+        terms = list(index)
+        all_doc_ids = []
+        all_freqs = []
+        for word in terms:
+            doc_ids, freqs = index.postings(word)
+            all_doc_ids.append(np.asarray(doc_ids, dtype=np.int64))
+            all_freqs.append(np.asarray(freqs, dtype=np.uint32))
+        lengths = [ len(doc_ids) for doc_ids in all_doc_ids ]
+        ids = np.repeat(np.arange(len(terms), dtype=np.uint32), lengths)
+        doc_ids = np.concatenate(all_doc_ids) if len(terms) > 0 else np.zeros(0, dtype=np.int64)
+        freqs = np.concatenate(all_freqs) if len(terms) > 0 else np.zeros(0, dtype=np.uint32)
+        # stable sort keeps term ids of each document in increasing order
+        order = np.argsort(doc_ids, kind='stable')
+        offsets = np.zeros(len(paths)+1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(doc_ids, minlength=len(paths)))
+        return cls(terms, offsets, ids[order], freqs[order], paths)
+
+    def sort_terms(self):
+        """Returns a copy of store with term ids in sorted order of words
+
+        Term ids of each document are sorted too. Words can then be looked up
+        with a binary search instead of a dictionary (see irstructures.snapshot).
+
+        Returns
+        -------
+        DocumentStore
+            store with terms[i] < terms[i+1]
+        """
+
+        order = sorted(range(len(self.terms)), key=self.terms.__getitem__)
+        new_ids = np.empty(len(order), dtype=np.uint32)
+        new_ids[order] = np.arange(len(order), dtype=np.uint32)
+        ids = new_ids[self.ids]
+        doc_ids = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+        perm = np.lexsort((ids, doc_ids))
+        return DocumentStore([ self.terms[i] for i in order ], self.offsets, ids[perm], self.freqs[perm], self.paths)
+
+    def subset(self, start, end):
+        """Returns store of a range of documents
+
+        Terms (and term ids) are shared with self, so the new store has all
+        words of self even if they do not occur in its documents.
+
+        Parameters
+        ----------
+        start: int
+            doc_id of first document
+        end: int
+            doc_id after the last document
+
+        Returns
+        -------
+        DocumentStore
+            store where doc_id i is doc_id start+i of self
+        """
+
+        lo, hi = self.offsets[start], self.offsets[end]
+        return DocumentStore(self.terms, self.offsets[start:end+1] - lo, self.ids[lo:hi], self.freqs[lo:hi],
+                             [ self.paths[i] for i in range(start, end) ], term_ids=self.term_ids)
+
+    def term_freqs(self, doc_id):
+        """Returns term ids and frequencies of a document
+
+        Parameters
+        ----------
+        doc_id: int
+            id of document
+
+        Returns
+        -------
+        tuple
+            (numpy array of term ids, numpy array of frequencies)
+        """
+
+        start, end = self.offsets[doc_id], self.offsets[doc_id+1]
+        return self.ids[start:end], self.freqs[start:end]
+
+    def save(self, filepath):
+        """Saves store to disk as a numpy .npz file
+
+        Parameters
+        ----------
+        filepath: str
+            path of the file to write
+        """
+
+        terms_blob, terms_offsets = encode_strings(self.terms)
+        paths_blob, paths_offsets = encode_strings(self.paths)
+        with open(filepath, 'wb') as file:
+            np.savez(file, offsets=self.offsets, ids=self.ids, freqs=self.freqs,
+                     terms_blob=terms_blob, terms_offsets=terms_offsets,
+                     paths_blob=paths_blob, paths_offsets=paths_offsets)
+
+    @classmethod
+    def load(cls, filepath):
+        """Loads store saved with save
+
+        Parameters
+        ----------
+        filepath: str
+            path of file written by save
+
+        Returns
+        -------
+        DocumentStore
+            loaded store
+        """
+
+        with np.load(filepath, allow_pickle=False) as data:
+            terms = decode_strings(data['terms_blob'], data['terms_offsets'])
+            paths = decode_strings(data['paths_blob'], data['paths_offsets'])
+            return cls(terms, data['offsets'], data['ids'], data['freqs'], paths)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, doc_id):
+        if doc_id < 0 or doc_id >= len(self):
+            raise IndexError(doc_id)
+        return DocumentView(self, doc_id)
+
+    def __iter__(self):
+        for doc_id in range(len(self)):
+            yield DocumentView(self, doc_id)
@@ -1,10 +1,14 @@
-from nltk.tokenize import wordpunct_tokenize, word_tokenize
-from nltk.stem.porter import PorterStemmer
-from nltk.corpus import stopwords
 import os
 import codecs
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from .stemcache import StemCache
+from .porter import PorterStemmer
+from .analyzer import tokenize, count_tokens, stem_counts, STOP_WORDS, EXTRA_STOP_WORDS
+from . import instrument
 
-# TODO: remove dependancy on nltk and use stemmer:porter file and tokenizer:regex for wordpunct_tokenize
+# analyzers which can be used to tokenize documents and queries, see Document.set_analyzer
+ANALYZERS = ('nltk', 'builtin')
 
 class Document:
     """
@@ -21,12 +25,58 @@ class Document:
     """
 
     document_count = 0
-    stemmer = PorterStemmer()
-    stop_words = set(stopwords.words('english'))
-    stop_words.update( ['.', ',', '"', "'", '?', '!', ':', ';', '(', ')', 
-                        '[', ']', '{', '}', '`', '``', "'s", "''", "m", "re", "s"
-                        'es'])
-    
+    # one of ANALYZERS, an index must be queried with the analyzer it was built with
+    analyzer = 'nltk'
+    # importing nltk takes more than a second, so stemmer and stop words
+    # are created when text is first tokenized (see load_nltk)
+    stemmer = None
+    # shared by all documents and queries, see StemCache
+    stem_cache = StemCache(None)
+    stop_words = None
+    extra_stop_words = EXTRA_STOP_WORDS
+    nltk_lock = threading.Lock()
+
+    @staticmethod
+    def set_analyzer(name):
+        """Select analyzer used to tokenize documents and queries
+
+        'nltk' uses nltk's tokenizers, stop words and stemmer. 'builtin' uses
+        irstructures.analyzer and irstructures.porter, which give the same
+        terms as 'nltk' with use_regex=True, without importing nltk.
+
+        Parameters
+        ----------
+        name: str
+            one of ANALYZERS
+        """
+
+        if name not in ANALYZERS:
+            raise ValueError(f"unknown analyzer '{name}', expected one of {ANALYZERS}")
+        Document.analyzer = name
+        if name == 'builtin' and Document.stem_cache.stemmer is None:
+            Document.stemmer = PorterStemmer()
+            Document.stem_cache.stemmer = Document.stemmer
+
+    @staticmethod
+    def load_nltk():
+        """Import nltk and create stemmer and stop words, if not done already
+
+        Safe to call from any thread, so it can be run in background while
+        waiting for the first query.
+        """
+
+        if Document.stop_words is not None:
+            return
+        with Document.nltk_lock:
+            if Document.stop_words is not None:
+                return
+            from nltk.stem import porter
+            from nltk.corpus import stopwords
+            Document.stemmer = porter.PorterStemmer()
+            Document.stem_cache.stemmer = Document.stemmer
+            stop_words = set(stopwords.words('english'))
+            stop_words.update(Document.extra_stop_words)
+            Document.stop_words = stop_words
 
     def __init__(self, filepath=None, doc_id=None, raw_data="", use_regex=False, stemming=True):
 
@@ -42,44 +92,292 @@ class Document:
         if filepath is not None:
             with codecs.open(filepath, 'r', encoding="utf8",errors='ignore') as file:
                 self.raw_data = file.read()
-        
+
+        self.word_freq = Document.get_word_freq(self.raw_data, use_regex, stemming)
+    
+    @staticmethod
+    def get_word_freq(raw_data, use_regex=False, stemming=True):
+        """Tokenize text and count frequency of each (stemmed) word
+
+        Parameters
+        ----------
+        raw_data: str
+            text to be tokenized
+        use_regex: bool
+            use wordpunct_tokenize instead of word_tokenize (builtin analyzer always tokenizes with regex)
+        stemming: bool
+            run porter stemmer on words
+
+        Returns
+        -------
+        dict
+            dictionary with each word and it's corresponding frequency
+        """
+
+        if Document.analyzer == 'builtin':
+            with instrument.stage('tokenize'):
+                token_freq = count_tokens(raw_data)
+            if instrument.is_enabled():
+                instrument.count('tokens', sum(token_freq.values()))
+            if stemming is False:
+                return token_freq
+            with instrument.stage('stem'):
+                return stem_counts(token_freq, Document.stem_cache)
+
+        with instrument.stage('tokenize'):
+            words = Document.tokenize_words(raw_data, use_regex)
+        return Document.count_words(words, stemming)
+
+    @staticmethod
+    def get_words(raw_data, use_regex=False, stemming=True):
+        """Tokenize text and return (stemmed) words in order of occurence
+
+        Used where order of words matters, like phrases of boolean queries.
+
+        Parameters
+        ----------
+        raw_data: str
+            text to be tokenized
+        use_regex: bool
+            use wordpunct_tokenize instead of word_tokenize (builtin analyzer always tokenizes with regex)
+        stemming: bool
+            run porter stemmer on words
+
+        Returns
+        -------
+        list
+            list of words without stop words
+        """
+
+        with instrument.stage('tokenize'):
+            words = Document.tokenize_words(raw_data, use_regex)
+        if stemming is True:
+            with instrument.stage('stem'):
+                words = Document.stem_cache.stem_words(words)
+        return words
+
+    @staticmethod
+    def tokenize_words(raw_data, use_regex=False):
+        """Lowercase and tokenize text with the selected analyzer and remove stop words
+
+        Parameters
+        ----------
+        raw_data: str
+            text to be tokenized
+        use_regex: bool
+            use wordpunct_tokenize instead of word_tokenize (builtin analyzer always tokenizes with regex)
+
+        Returns
+        -------
+        list
+            list of tokens which are not stop words, in order of occurence
+        """
+
+        tokens = Document.tokenize_all(raw_data, use_regex)
+        # nltk stop words are loaded by tokenize_all
+        stop_words = STOP_WORDS if Document.analyzer == 'builtin' else Document.stop_words
+        return [word for word in tokens if word not in stop_words]
+
+    @staticmethod
+    def tokenize_all(raw_data, use_regex=False):
+        """Lowercase and tokenize text with the selected analyzer, keeping stop words
+
+        Parameters
+        ----------
+        raw_data: str
+            text to be tokenized
+        use_regex: bool
+            use wordpunct_tokenize instead of word_tokenize (builtin analyzer always tokenizes with regex)
+
+        Returns
+        -------
+        list
+            list of all tokens in order of occurence
+        """
+
+        if Document.analyzer == 'builtin':
+            return tokenize(raw_data)
+
+        Document.load_nltk()
+        from nltk.tokenize import wordpunct_tokenize, word_tokenize
+
         # reduce caps and TODO:remove accents
-        self.data = self.raw_data.lower()
+        data = raw_data.lower()
         
         # tokenize words
         if use_regex is True:
-            self.words = wordpunct_tokenize(self.data)
-        else:
-            self.words = word_tokenize(self.data)
-        
-        # remove stop words
-        self.words = [word for word in self.words if word not in Document.stop_words]
+            return wordpunct_tokenize(data)
+        return word_tokenize(data)
+
+    @staticmethod
+    def get_positions(raw_data, use_regex=False, stemming=True):
+        """Tokenize text and return (stemmed) words along with their positions
+
+        Positions are counted over all tokens, including stop words, so that
+        phrases match only words which were that far apart in the text.
+
+        Parameters
+        ----------
+        raw_data: str
+            text to be tokenized
+        use_regex: bool
+            use wordpunct_tokenize instead of word_tokenize (builtin analyzer always tokenizes with regex)
+        stemming: bool
+            run porter stemmer on words
+
+        Returns
+        -------
+        tuple
+            (list of words without stop words, list of position of each word)
+        """
+
+        tokens = Document.tokenize_all(raw_data, use_regex)
+        stop_words = STOP_WORDS if Document.analyzer == 'builtin' else Document.stop_words
+        positions = [ i for i, word in enumerate(tokens) if word not in stop_words ]
+        words = [ tokens[i] for i in positions ]
+        if stemming is True:
+            words = Document.stem_cache.stem_words(words)
+        return words, positions
+
+    @staticmethod
+    def count_words(words, stemming=True):
+        """Stem tokens and count frequency of each word
+
+        Parameters
+        ----------
+        words: list
+            tokens without stop words
+        stemming: bool
+            run porter stemmer on words
+
+        Returns
+        -------
+        dict
+            dictionary with each word and it's corresponding frequency
+        """
+
+        instrument.count('tokens', len(words))
 
         # run porter stemmer
         if stemming is True:
-            self.words = [Document.stemmer.stem(word) for word in self.words]
+            with instrument.stage('stem'):
+                words = [Document.stem_cache.stem(word) for word in words]
 
         # create a dictionary to store words and their frequencies
-        self.word_freq = dict()
-        for word in self.words:
-            self.word_freq[word] = (self.word_freq[word]+1) if word in self.word_freq else 1
+        word_freq = dict()
+        for word in words:
+            word_freq[word] = (word_freq[word]+1) if word in word_freq else 1
+        return word_freq
 
-        del self.data
-        del self.words
-    
+
+    @classmethod
+    def from_word_freq(cls, filepath, word_freq, doc_id=None):
+        """Create a Document from already computed word frequencies, without reading or tokenizing
+
+        raw_data of such a document is empty.
+
+        Parameters
+        ----------
+        filepath: str
+            path to file on disk (can be relative)
+        word_freq: dict
+            dictionary with each word and it's corresponding frequency
+        doc_id: int
+            unique document id, next document count is used if None
+
+        Returns
+        -------
+        Document
+            document with given word frequencies
+        """
+
+        document = cls.__new__(cls)
+        document.filepath = filepath
+        document.raw_data = ""
+        document.doc_id = Document.document_count if doc_id is None else doc_id
+        Document.document_count += 1
+        document.word_freq = word_freq
+        return document
 
     def __str__(self):
         return self.raw_data
 
 
+def iter_files(folderpath):
+    """Generator over paths of all text files in given folder (and its sub folders)
+
+    Parameters
+    ----------
+    folderpath: str
+        path to corpus/folder containing documents on disk
+
+    Yields
+    ------
+    str
+        path to a text file
+    """
+
+    # r=root, d=directories, f=files
+    for r, d, f in os.walk(folderpath):
+        for filename in f:
+            if '.txt' in filename:
+                yield os.path.join(r,filename)
+
+
+def init_worker(stems, analyzer='nltk'):
+    """Initializer of read_corpus worker processes, warms up their stem cache
+
+    Parameters
+    ----------
+    stems: list
+        (word, stem) pairs from stem cache of the main process
+    analyzer: str
+        analyzer selected in the main process (see Document.set_analyzer)
+    """
+
+    Document.set_analyzer(analyzer)
+    Document.stem_cache.update(stems)
+    Document.stem_cache.track_added = True
+
+
+def read_word_freqs(filepaths):
+    """Tokenize a batch of files and return only their word frequencies
+
+    Used by worker processes of read_corpus, so that raw text of documents
+    is not sent back to the main process.
+
+    Parameters
+    ----------
+    filepaths: list
+        list of paths to files on disk
+
+    Returns
+    -------
+    tuple
+        (list of word_freq dictionaries in the same order as filepaths, list of (word, stem) pairs newly stemmed)
+    """
+
+    word_freqs = [ Document(filepath).word_freq for filepath in filepaths ]
+    return word_freqs, Document.stem_cache.pop_added()
+
+
 # use this function to read complete corpus
-def read_corpus(folderpath):
+def read_corpus(folderpath, n_jobs=1, chunk_size=64):
     """simple function to read documents from given folder
 
+    If n_jobs > 1, files are split into batches of chunk_size files which are
+    tokenized in parallel by a pool of processes. Batches are collected in
+    order, so doc_id's are the same as when reading serially. Either way only
+    word frequencies of documents are kept (raw_data is empty).
+
     Parameters
     ----------
     folderpath: str
         path to corpus/folder containing documents on disk
+    n_jobs: int
+        number of processes used to tokenize documents (None to use all cpus)
+    chunk_size: int
+        number of files sent to a process at once
     
     Returns
     -------
@@ -91,18 +389,26 @@ def read_corpus(folderpath):
         raise Exception(f"Given folder path: '{folderpath}' does not exist")
         return
 
-    files = []
+    files = list(iter_files(folderpath))
     document_list = []
-    # r=root, d=directories, f=files
-    for r, d, f in os.walk(folderpath):
-        for filename in f:
-            # if len(files)>=25:break
-            if '.txt' in filename:
-                files.append(os.path.join(r,filename))
     
-    for file in files:
-        document_list.append(Document(file))
-        print(f"file read: {file}")
+    if n_jobs == 1:
+        for file in files:
+            document = Document(file)
+            document.raw_data = ""
+            document_list.append(document)
+            if len(document_list) % chunk_size == 0 or len(document_list) == len(files):
+                print(f"files read: {len(document_list)}/{len(files)}")
+        return document_list
+
+    batches = [ files[i:i+chunk_size] for i in range(0, len(files), chunk_size) ]
+    stems = list(Document.stem_cache.cache.items())
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=init_worker, initargs=(stems, Document.analyzer)) as executor:
+        for batch, (word_freqs, added) in zip(batches, executor.map(read_word_freqs, batches)):
+            Document.stem_cache.update(added)
+            for file, word_freq in zip(batch, word_freqs):
+                document_list.append(Document.from_word_freq(file, word_freq))
+            print(f"files read: {len(document_list)}/{len(files)}")
 
     return document_list
 
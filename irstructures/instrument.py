@@ -0,0 +1,354 @@
+"""
+This module implements timing of the stages of a query
+
+Code on the query path marks its stages with
+
+    with instrument.stage('merge'):
+        ...
+
+and counts work done with instrument.count('postings', n). Stages used are
+tokenize, stem (Document.get_word_freq), parse, wildcard, postings, merge,
+positions (boolean retrieval), query_vector, score and sort (Tf_Idf.search),
+tier1 (TieredIndex.search) and candidates (SimilarDocuments.search).
+
+While instrumentation is disabled (the default) stage returns a shared no-op
+context manager and count returns at once, so the cost is a flag check.
+When enabled, time of every stage is added to a histogram (see dump), and
+to the Trace of the query being run, if any:
+
+    with instrument.trace(query) as trace:
+        output = ...
+    print(trace)
+
+trace enables instrumentation for its duration, so single queries can be
+traced without enabling it for everything. The trace being filled is kept
+in a context variable, so queries traced at the same time by different
+threads (or asyncio tasks) each get only their own stages, and stages of
+other threads are not timed because of them. cProfile and tracemalloc can be
+started and stopped at any time with start_profiling and stop_profiling.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+import io
+
+# True while stages of all queries are being timed
+enabled = False
+# Trace of the query being run by the current thread or task (None if it is not traced)
+current = ContextVar('current', default=None)
+# stage names as keys and Histogram of their times as values
+histograms = dict()
+# counter names as keys and their total as values
+counters = dict()
+# (cProfile.Profile, tracemalloc was started) while profiling
+profiler = None
+
+class Histogram:
+    """
+    Class used to hold distribution of times with bounded memory
+
+    Times are counted in buckets whose bounds are powers of two of
+    microseconds, so percentiles are exact up to a factor of 2.
+
+    Attributes
+    ----------
+    buckets: list
+        buckets[i] is the number of times in [2^(i-1), 2^i) microseconds
+    count: int
+        number of times added
+    total: float
+        sum of times added, in seconds
+    max: float
+        largest time added, in seconds
+    """
+
+    n_buckets = 40
+
+    def __init__(self):
+        self.buckets = [0] * Histogram.n_buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        micros = int(seconds * 1e6)
+        self.buckets[min(micros.bit_length(), Histogram.n_buckets-1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Returns upper bound (in seconds) of the q'th percentile (0 <= q <= 100)"""
+
+        if self.count == 0:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n > 0:
+                return min((1 << i) / 1e6, self.max)
+        return self.max
+
+    def as_dict(self):
+        """Returns count, mean, p50, p95, p99 and max in milliseconds"""
+
+        return {
+            'count': self.count,
+            'mean_ms': 1000*self.total/self.count if self.count > 0 else 0.0,
+            'p50_ms': 1000*self.percentile(50),
+            'p95_ms': 1000*self.percentile(95),
+            'p99_ms': 1000*self.percentile(99),
+            'max_ms': 1000*self.max,
+        }
+
+
+class Trace:
+    """
+    Class used to hold the breakdown of time taken by one query
+
+    Attributes
+    ----------
+    name: str
+        name of the traced query
+    stages: dict
+        stage names as keys and total seconds spent in them as values (in order of first use)
+    counters: dict
+        counter names as keys and their total as values
+    total: float
+        seconds taken by the whole query
+    """
+
+    def __init__(self, name=""):
+        self.name = name
+        self.stages = dict()
+        self.counters = dict()
+        self.total = 0.0
+
+    def as_dict(self):
+        """Returns trace as a json serializable dict (times in milliseconds)"""
+
+        return {
+            'name': self.name,
+            'total_ms': 1000*self.total,
+            'stages_ms': { stage: 1000*seconds for stage, seconds in self.stages.items() },
+            'counters': dict(self.counters),
+        }
+
+    def __str__(self):
+        lines = [f"trace of '{self.name}': {1000*self.total:.3f} ms"]
+        for stage, seconds in self.stages.items():
+            share = 100*seconds/self.total if self.total > 0 else 0.0
+            lines.append(f"  {stage:<14}{1000*seconds:10.3f} ms {share:6.1f}%")
+        for name, value in self.counters.items():
+            lines.append(f"  {name:<14}{value:10}")
+        return "\n".join(lines)
+
+
+class Stage:
+    """Context manager which records time taken by its block under a stage name"""
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        record(self.name, perf_counter() - self.start)
+
+
+class NullStage:
+    """Context manager which does nothing, used while instrumentation is disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+NULL_STAGE = NullStage()
+
+def stage(name):
+    """Returns context manager timing a stage (a no-op if instrumentation is disabled)
+
+    Parameters
+    ----------
+    name: str
+        name of stage
+
+    Returns
+    -------
+    Stage or NullStage
+        context manager
+    """
+
+    if not enabled and current.get() is None:
+        return NULL_STAGE
+    return Stage(name)
+
+def is_enabled():
+    """Returns True if stages run by the current thread or task are timed (instrumentation enabled or query traced)"""
+
+    return enabled or current.get() is not None
+
+def record(name, seconds):
+    """Add time taken by a stage to its histogram and to the current trace"""
+
+    histogram = histograms.get(name)
+    if histogram is None:
+        histogram = histograms[name] = Histogram()
+    histogram.add(seconds)
+    query_trace = current.get()
+    if query_trace is not None:
+        query_trace.stages[name] = query_trace.stages.get(name, 0.0) + seconds
+
+def count(name, n=1):
+    """Add n to a counter (does nothing if instrumentation is disabled)
+
+    Parameters
+    ----------
+    name: str
+        name of counter
+    n: int
+        value to add
+    """
+
+    query_trace = current.get()
+    if not enabled and query_trace is None:
+        return
+    counters[name] = counters.get(name, 0) + n
+    if query_trace is not None:
+        query_trace.counters[name] = query_trace.counters.get(name, 0) + n
+
+def enable():
+    global enabled
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+@contextmanager
+def trace(name=""):
+    """Context manager collecting times of all stages run in its block into a Trace
+
+    Instrumentation is enabled inside the block, for the thread (or asyncio
+    task) running it only. Total time of the block is also added to the
+    'query' histogram, unless the block is inside another trace.
+
+    Parameters
+    ----------
+    name: str
+        name of traced query
+
+    Yields
+    ------
+    Trace
+        trace which is filled when the block exits
+    """
+
+    outer = current.get()
+    query_trace = Trace(name)
+    token = current.set(query_trace)
+    start = perf_counter()
+    try:
+        yield query_trace
+    finally:
+        query_trace.total = perf_counter() - start
+        current.reset(token)
+        # nested traces are part of the outer query
+        if outer is None:
+            histograms.setdefault('query', Histogram()).add(query_trace.total)
+
+def run_traced(func, *args, **kwargs):
+    """Call func with given arguments inside trace
+
+    Returns
+    -------
+    tuple
+        (return value of func, Trace of the call)
+    """
+
+    with trace(getattr(func, '__name__', '')) as query_trace:
+        result = func(*args, **kwargs)
+    return result, query_trace
+
+def dump():
+    """Returns histograms of all stages and totals of all counters
+
+    Returns
+    -------
+    dict
+        {'stages': {stage: Histogram.as_dict()}, 'counters': {name: total}}
+    """
+
+    return {
+        'stages': { name: histogram.as_dict() for name, histogram in histograms.items() },
+        'counters': dict(counters),
+    }
+
+def reset():
+    """Clear all histograms and counters"""
+
+    histograms.clear()
+    counters.clear()
+
+def start_profiling(memory=False):
+    """Start cProfile (and tracemalloc if memory is True), until stop_profiling is called
+
+    Parameters
+    ----------
+    memory: bool
+        also trace memory allocations (slows down python code a lot more than cProfile)
+    """
+
+    global profiler
+    import cProfile, tracemalloc
+    if profiler is not None:
+        return
+    profile = cProfile.Profile()
+    if memory:
+        tracemalloc.start()
+    profile.enable()
+    profiler = (profile, memory)
+
+def stop_profiling(limit=20):
+    """Stop profiling started by start_profiling and return the report
+
+    Parameters
+    ----------
+    limit: int
+        number of functions (and allocation sites) listed
+
+    Returns
+    -------
+    str
+        functions sorted by cumulative time, followed by lines which
+        allocated most memory if memory was traced ("" if not profiling)
+    """
+
+    global profiler
+    import pstats, tracemalloc
+    if profiler is None:
+        return ""
+    profile, memory = profiler
+    profile.disable()
+    profiler = None
+    report = io.StringIO()
+    pstats.Stats(profile, stream=report).sort_stats('cumulative').print_stats(limit)
+    if memory:
+        snapshot = tracemalloc.take_snapshot()
+        current_size, peak_size = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report.write(f"memory: current {current_size/2**20:.2f} MiB, peak {peak_size/2**20:.2f} MiB\n")
+        for stat in snapshot.statistics('lineno')[:limit]:
+            report.write(f"{stat}\n")
+    return report.getvalue()
@@ -1,11 +1,109 @@
 from .document import Document
+from .compression import vbyte_encode, vbyte_decode, delta_encode, delta_decode
+from .termdict import TermDictionary, TermDictionaryWriter
+from array import array
+from bisect import bisect_left
+import numpy as np
+import mmap
+import shutil
+import struct
+import tempfile
+
+def gallop(postings, doc_id, lo=0):
+    """Returns position of the first posting (starting from lo) whose doc_id is atleast given doc_id
+
+    Galloping (exponential) search: jumps ahead 1, 2, 4, ... postings and then
+    does a binary search in the last jump. Costs O(log d) where d is the distance
+    moved, so it is cheap for the short jumps done while merging.
+
+    Parameters
+    ----------
+    postings: array
+        sorted posting list
+    doc_id: int
+        doc_id to search for
+    lo: int
+        position from which to start the search
+
+    Returns
+    -------
+    int
+        position of first posting >= doc_id, len(postings) if there is none
+    """
+
+    n = len(postings)
+    hi = lo
+    step = 1
+    while hi < n and postings[hi] < doc_id:
+        lo = hi + 1
+        hi += step
+        step *= 2
+    return bisect_left(postings, doc_id, lo, min(hi, n))
+
+def position_gaps(positions, term_freqs):
+    """Returns gaps between consecutive positions of each posting (first position of a posting is kept as is)
+
+    Parameters
+    ----------
+    positions: numpy.array
+        sorted positions of each posting, concatenated
+    term_freqs: numpy.array
+        number of positions of each posting
+
+    Returns
+    -------
+    numpy.array
+        array of gaps
+    """
+
+    positions = np.asarray(positions, dtype=np.int64)
+    term_freqs = np.asarray(term_freqs, dtype=np.int64)
+    gaps = np.diff(positions, prepend=0)
+    starts = np.cumsum(term_freqs) - term_freqs
+    gaps[starts] = positions[starts]
+    return gaps
+
+def positions_from_gaps(gaps, term_freqs):
+    """Inverse of position_gaps
+
+    Parameters
+    ----------
+    gaps: numpy.array
+        gaps given by position_gaps
+    term_freqs: numpy.array
+        number of positions of each posting
+
+    Returns
+    -------
+    numpy.array
+        positions of each posting, concatenated
+    """
+
+    term_freqs = np.asarray(term_freqs, dtype=np.int64)
+    sums = np.cumsum(gaps)
+    starts = np.cumsum(term_freqs) - term_freqs
+    # sum of gaps before first position of each posting
+    before = sums[starts] - gaps[starts]
+    return sums - np.repeat(before, term_freqs)
 
 # TODO: add this class to boolean_retrieval.py as it is only used there.
 class InvertedIndex(dict):
     """
     Class to generate and hold inverted index. This class extends the inbuilt dictionary data structure.
 
-    This object when created, generates inverted index.
+    This object when created, generates inverted index. Posting lists are
+    arrays of unsigned ints (array('I')) which are always sorted by doc_id.
+
+    Attributes
+    ----------
+    term_freqs: dict
+        words as keys and array of their frequency in each document, parallel to their posting list as values
+    impacts: dict
+        words as keys and array of impact scores (normalized tf-idf weights) parallel to their posting list as values
+    max_impact: dict
+        words as keys and upper bound of their impact scores as values
+    terms: TermDictionary
+        sorted words, used for wildcard lookups (built by match when it is first called)
     """
     
     def __init__(self, corpus, collection_freq=None):
@@ -19,9 +117,453 @@ class InvertedIndex(dict):
             dictionary of each word and its corpus frequency
         """
 
+        self.term_freqs = dict()
+        self.impacts = dict()
+        self.max_impact = dict()
+        self.terms = None
+        last_doc_id = -1
+        in_order = True
         for document in corpus:
-            for word in document.word_freq:
+            if document.doc_id < last_doc_id:
+                in_order = False
+            last_doc_id = document.doc_id
+            for word, freq in document.word_freq.items():
                 if word in self:
                     self[word].append(document.doc_id)
+                    self.term_freqs[word].append(freq)
                 else:
-                    self[word] = [document.doc_id]
\ No newline at end of file
+                    self[word] = array('I', [document.doc_id])
+                    self.term_freqs[word] = array('I', [freq])
+
+        # postings are sorted already if corpus is in order of doc_id
+        if not in_order:
+            for word in self:
+                pairs = sorted(zip(self[word], self.term_freqs[word]))
+                self[word] = array('I', [ doc_id for doc_id, freq in pairs ])
+                self.term_freqs[word] = array('I', [ freq for doc_id, freq in pairs ])
+
+    def set_impacts(self, vsmodel):
+        """Store impact score of each posting and upper bound of each word
+
+        impact(word, doc) = tf_idf(word, doc) / norm(doc), so that the cosine
+        score of a document is the dot product of the query weights with its
+        impacts (up to the query norm). Posting lists are replaced by the sorted
+        rows of the tf-idf matrix column so that they stay aligned with impacts.
+
+        Parameters
+        ----------
+        vsmodel: Tf_Idf
+            tf-idf model whose sparse matrix was built from the same corpus
+        """
+
+        csc = vsmodel.matrix_csc
+        norms = vsmodel.doc_norms
+        for word in self:
+            col = vsmodel.vocab[word]
+            start, end = csc.indptr[col], csc.indptr[col+1]
+            rows = csc.indices[start:end]
+            impacts = np.divide(csc.data[start:end], norms[rows], out=np.zeros(end-start), where=norms[rows]>0)
+            self[word] = array('I', rows.astype(np.uint32).tobytes())
+            self.impacts[word] = array('d', impacts)
+            self.max_impact[word] = float(impacts.max()) if len(impacts) > 0 else 0.0
+
+    def doc_freq(self, word):
+        """Returns the count of all the documents in which the word occurs (0 if word is not present)"""
+
+        return len(self[word]) if word in self else 0
+
+    def match(self, pattern, limit=None):
+        """Returns words matching a wildcard pattern (see termdict.SortedTerms.match)
+
+        Sorted words are front coded the first time this is called, words
+        added to the index after that are not matched.
+        """
+
+        if getattr(self, 'terms', None) is None:
+            self.terms = TermDictionary.from_terms(sorted(self))
+        return self.terms.match(pattern, limit)
+
+    def write(self, filepath):
+        """Write the inverted index to disk in the format read by DiskInvertedIndex
+
+        Words are stored in sorted order. Postings of each word are stored as
+        variable byte encoded (doc_id gap, term frequency) pairs. Impacts, if
+        set, are stored uncompressed so that WAND gives exact results.
+
+        Parameters
+        ----------
+        filepath: str
+            path of the file to write
+        """
+
+        has_impacts = len(self.impacts) > 0
+        with DiskIndexWriter(filepath, has_impacts) as writer:
+            for word in sorted(self):
+                impacts = self.impacts[word] if has_impacts else None
+                writer.add(word, self[word], self.term_freqs[word], impacts)
+
+
+class DiskIndexWriter:
+    """
+    Class to write an index file read by DiskInvertedIndex, one word at a time
+
+    Words must be added in sorted order. Postings (and impacts and positions)
+    are streamed to temporary files, only the word dictionary (front coded,
+    see termdict.TermDictionaryWriter) is kept in memory until close.
+
+    Methods
+    -------
+    add(self, word, doc_ids, term_freqs, impacts, positions)
+        Add posting list of next word
+    close(self)
+        Write the index file and remove temporary files
+    """
+
+    def __init__(self, filepath, has_impacts=False, has_positions=False):
+        """
+        Parameters
+        ----------
+        filepath: str
+            path of the file to write
+        has_impacts: bool
+            if True, impacts must be given for every word
+        has_positions: bool
+            if True, positions must be given for every word
+        """
+
+        self.filepath = filepath
+        self.has_impacts = has_impacts
+        self.has_positions = has_positions
+        self.terms = TermDictionaryWriter(DiskInvertedIndex.block_size)
+        self.doc_freqs = array('I')
+        self.postings_sizes = array('Q')
+        self.positions_sizes = array('Q')
+        self.max_impact = array('d')
+        self.postings_file = tempfile.TemporaryFile()
+        self.impacts_file = tempfile.TemporaryFile() if has_impacts else None
+        self.positions_file = tempfile.TemporaryFile() if has_positions else None
+        self.last_word = None
+
+    def add(self, word, doc_ids, term_freqs, impacts=None, positions=None):
+        """Add posting list of next word
+
+        Positions of each posting are stored as variable byte encoded gaps
+        between consecutive positions (first position of a posting as is).
+
+        Parameters
+        ----------
+        word: str
+            word, greater than all words added before
+        doc_ids: array
+            sorted doc_id's of documents containing the word
+        term_freqs: array
+            frequency of word in each document, parallel to doc_ids
+        impacts: array
+            impact score of each posting, parallel to doc_ids
+        positions: array
+            sorted positions of word in each document, concatenated in order
+            of doc_ids (term_freqs[i] positions for i'th posting)
+        """
+
+        if self.last_word is not None and word <= self.last_word:
+            raise Exception(f"words must be added in sorted order, got '{word}' after '{self.last_word}'")
+        self.last_word = word
+
+        pairs = np.empty(2*len(doc_ids), dtype=np.int64)
+        pairs[0::2] = delta_encode(doc_ids)
+        pairs[1::2] = term_freqs
+        blob = vbyte_encode(pairs)
+        self.postings_file.write(blob)
+        self.terms.add(word)
+        self.doc_freqs.append(len(doc_ids))
+        self.postings_sizes.append(len(blob))
+        if self.has_impacts:
+            impacts = np.asarray(impacts, dtype='<f8')
+            self.impacts_file.write(impacts.tobytes())
+            self.max_impact.append(float(impacts.max()) if len(impacts) > 0 else 0.0)
+        if self.has_positions:
+            blob = vbyte_encode(position_gaps(positions, term_freqs))
+            self.positions_file.write(blob)
+            self.positions_sizes.append(len(blob))
+
+    def close(self):
+        """Write the index file and remove temporary files"""
+
+        n_words = self.terms.n_terms
+        doc_freqs = np.array(self.doc_freqs, dtype='<u4')
+        words, block_offsets = self.terms.finish()
+        postings_offsets = np.zeros(n_words+1, dtype='<u8')
+        postings_offsets[1:] = np.cumsum(self.postings_sizes)
+        n_postings = int(doc_freqs.sum())
+        flags = int(self.has_impacts) | (2 if self.has_positions else 0)
+
+        with open(self.filepath, 'wb') as file:
+            file.write(struct.pack(DiskInvertedIndex.header_format, DiskInvertedIndex.magic,
+                                   DiskInvertedIndex.version, flags, n_words, n_postings, self.terms.block_size))
+            file.write(block_offsets.tobytes())
+            file.write(postings_offsets.tobytes())
+            if self.has_positions:
+                positions_offsets = np.zeros(n_words+1, dtype='<u8')
+                positions_offsets[1:] = np.cumsum(self.positions_sizes)
+                file.write(positions_offsets.tobytes())
+            if self.has_impacts:
+                file.write(np.array(self.max_impact, dtype='<f8').tobytes())
+                self.impacts_file.seek(0)
+                shutil.copyfileobj(self.impacts_file, file)
+            file.write(doc_freqs.tobytes())
+            file.write(words)
+            self.postings_file.seek(0)
+            shutil.copyfileobj(self.postings_file, file)
+            if self.has_positions:
+                self.positions_file.seek(0)
+                shutil.copyfileobj(self.positions_file, file)
+
+        self.postings_file.close()
+        if self.impacts_file is not None:
+            self.impacts_file.close()
+        if self.positions_file is not None:
+            self.positions_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class DiskInvertedIndex:
+    """
+    Class to read an inverted index written by InvertedIndex.write
+
+    The file is memory mapped, so opening it is cheap and only the postings of
+    words which are looked up are read from disk. Supports the same lookups
+    as InvertedIndex: index[word], word in index, len(index), iteration over
+    words and wildcard lookups (match). Words are front coded in blocks of
+    block_size words (see termdict.TermDictionary) and are searched without
+    decoding the whole dictionary.
+
+    Attributes
+    ----------
+    filepath: str
+        path to index file on disk
+    terms: TermDictionary
+        sorted words, viewing the memory map
+    doc_freqs: numpy.array
+        number of documents containing each word, in sorted order of words
+    impacts: DiskImpacts
+        words as keys and array of impact scores as values (None if impacts were not written)
+    max_impact: DiskImpacts
+        words as keys and upper bound of their impact scores as values (None if impacts were not written)
+    has_positions: bool
+        True if positions of words in documents were written (see positions)
+    """
+
+    magic = b'IRIX'
+    version = 2
+    # magic, version, flags (1 if impacts are stored, 2 if positions are stored), no. of words, no. of postings,
+    # no. of words in each front coded block
+    header_format = '<4sIIQQI'
+    block_size = 16
+
+    def __init__(self, filepath):
+        """Open and memory map an index file
+
+        Parameters
+        ----------
+        filepath: str
+            path to index file on disk
+        """
+
+        self.filepath = filepath
+        self.file = open(filepath, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, n_words, n_postings, block_size = struct.unpack_from(DiskInvertedIndex.header_format, self.mm, 0)
+        if magic != DiskInvertedIndex.magic or version != DiskInvertedIndex.version:
+            raise Exception(f"'{filepath}' is not a version {DiskInvertedIndex.version} index file")
+
+        offset = struct.calcsize(DiskInvertedIndex.header_format)
+        self.n_words = n_words
+        n_blocks = -(-n_words // block_size)
+        block_offsets = np.frombuffer(self.mm, dtype='<u8', count=n_blocks+1, offset=offset)
+        offset += 8*(n_blocks+1)
+        self.postings_offsets = np.frombuffer(self.mm, dtype='<u8', count=n_words+1, offset=offset)
+        offset += 8*(n_words+1)
+        self.has_positions = bool(flags & 2)
+        if self.has_positions:
+            self.positions_offsets = np.frombuffer(self.mm, dtype='<u8', count=n_words+1, offset=offset)
+            offset += 8*(n_words+1)
+        self.impacts = None
+        self.max_impact = None
+        if flags & 1:
+            max_impact = np.frombuffer(self.mm, dtype='<f8', count=n_words, offset=offset)
+            offset += 8*n_words
+            impacts = np.frombuffer(self.mm, dtype='<f8', count=n_postings, offset=offset)
+            offset += 8*n_postings
+        self.doc_freqs = np.frombuffer(self.mm, dtype='<u4', count=n_words, offset=offset)
+        offset += 4*n_words
+        if flags & 1:
+            impact_offsets = np.zeros(n_words+1, dtype=np.int64)
+            impact_offsets[1:] = np.cumsum(self.doc_freqs)
+            self.impacts = DiskImpacts(self, impacts, impact_offsets)
+            self.max_impact = DiskImpacts(self, max_impact)
+        self.terms = TermDictionary(self.mm, block_offsets, n_words, block_size, start=offset)
+        self.postings_start = offset + int(block_offsets[-1])
+        self.positions_start = self.postings_start + int(self.postings_offsets[-1])
+
+    def word_at(self, i):
+        """Returns i'th word in sorted order of words"""
+
+        return self.terms.word_at(i)
+
+    def find(self, word):
+        """Returns position of word in sorted order of words, -1 if not present
+
+        Parameters
+        ----------
+        word: str
+            word to search for
+
+        Returns
+        -------
+        int
+            position of word, -1 if word is not in index
+        """
+
+        return self.terms.find(word)
+
+    def match(self, pattern, limit=None):
+        """Returns words matching a wildcard pattern, in sorted order
+
+        Parameters
+        ----------
+        pattern: str
+            word where '*' matches any run of characters
+        limit: int
+            maximum number of words returned, all matching words if None
+
+        Returns
+        -------
+        list
+            matching words
+        """
+
+        return self.terms.match(pattern, limit)
+
+    def postings(self, word):
+        """Returns posting list of word along with term frequencies
+
+        Parameters
+        ----------
+        word: str
+            word whose postings are required
+
+        Returns
+        -------
+        tuple
+            (sorted numpy array of doc_id's, numpy array of term frequencies)
+        """
+
+        i = self.find(word)
+        if i < 0:
+            raise KeyError(word)
+        start = self.postings_start + int(self.postings_offsets[i])
+        end = self.postings_start + int(self.postings_offsets[i+1])
+        pairs = vbyte_decode(self.mm[start:end])
+        return delta_decode(pairs[0::2]), pairs[1::2]
+
+    def positions(self, word):
+        """Returns postings of word along with positions of word in each document
+
+        Parameters
+        ----------
+        word: str
+            word whose positions are required
+
+        Returns
+        -------
+        tuple
+            (sorted numpy array of doc_id's, numpy array of term frequencies, numpy array
+            of positions), positions of i'th posting are the next term_freqs[i] positions
+        """
+
+        if not self.has_positions:
+            raise Exception(f"'{self.filepath}' was written without positions")
+        i = self.find(word)
+        if i < 0:
+            raise KeyError(word)
+        doc_ids, term_freqs = self.postings(word)
+        start = self.positions_start + int(self.positions_offsets[i])
+        end = self.positions_start + int(self.positions_offsets[i+1])
+        return doc_ids, term_freqs, positions_from_gaps(vbyte_decode(self.mm[start:end]), term_freqs)
+
+    def doc_freq(self, word):
+        """Returns the count of all the documents in which the word occurs (0 if word is not present)"""
+
+        i = self.find(word)
+        return int(self.doc_freqs[i]) if i >= 0 else 0
+
+    def __getitem__(self, word):
+        doc_ids, freqs = self.postings(word)
+        return array('I', doc_ids.astype(np.uint32).tobytes())
+
+    def __contains__(self, word):
+        return self.find(word) >= 0
+
+    def __len__(self):
+        return self.n_words
+
+    def __iter__(self):
+        return iter(self.terms)
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        for word in self:
+            yield word, self[word]
+
+    def get(self, word, default=None):
+        return self[word] if word in self else default
+
+    def close(self):
+        """Close the memory map and the underlying file"""
+
+        # arrays viewing the memory map must be released before closing it
+        self.terms = self.postings_offsets = self.positions_offsets = self.doc_freqs = None
+        self.impacts = self.max_impact = None
+        self.mm.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class DiskImpacts:
+    """
+    Read only mapping of words to their impacts (or upper bound of impacts) stored in a DiskInvertedIndex
+
+    Lets models which use InvertedIndex.impacts and InvertedIndex.max_impact
+    (like WAND) run over the memory mapped index without any copy.
+    """
+
+    def __init__(self, index, values, offsets=None):
+        self.index = index
+        self.values = values
+        self.offsets = offsets
+
+    def __getitem__(self, word):
+        i = self.index.find(word)
+        if i < 0:
+            raise KeyError(word)
+        if self.offsets is None:
+            return float(self.values[i])
+        return self.values[self.offsets[i]:self.offsets[i+1]]
+
+    def __contains__(self, word):
+        return word in self.index
+
+    def __len__(self):
+        return len(self.index)
@@ -0,0 +1,401 @@
+"""
+This module implements the Okapi BM25 ranking model and its BM25+ and BM25L variants
+
+For a query q and document d of length |d| (no. of words after stop words
+are removed), with avgdl the average length of documents
+
+    score(q, d) = sum over words t of q:  qtf(t) * idf(t) * w(tf(t, d), |d|)
+
+    idf(t)  = ln(1 + (N - df(t) + 0.5) / (df(t) + 0.5))
+    norm(d) = 1 - b + b * |d| / avgdl
+
+    bm25    w = tf * (k1 + 1) / (tf + k1 * norm(d))
+    bm25+   w = tf * (k1 + 1) / (tf + k1 * norm(d)) + delta
+    bm25l   w = (k1 + 1) * (c + delta) / (k1 + c + delta),  c = tf / norm(d)
+
+idf, document lengths and w of every posting (which depends only on the
+document and the parameters of the model) are computed once, when the model
+is built, and kept as arrays. A query gathers the postings (rows and w) of
+the columns of its words from a column major matrix into flat arrays,
+multiplies them by qtf * idf and adds them up per document with np.bincount,
+so it does no more work than the sparse matrix-vector product of Tf_Idf.search.
+"""
+
+import numpy as np
+from scipy.sparse import csr_matrix, csc_matrix
+from ..docstore import DocumentStore
+from .vector_space import Tf_Idf, as_rows, query_document
+from .. import instrument
+import time
+
+class BM25():
+    """
+    Class used to represent BM25 model
+
+    Attributes
+    ----------
+    k1: float
+        saturation of term frequency
+    b: float
+        strength of document length normalization (0 to 1)
+    variant: str
+        one of BM25.variants
+    delta: float
+        lower bound added to weight of a word present in a document (bm25+ and bm25l)
+    name: str
+        variant and parameters of the model, used in cache keys
+    vocab: dict
+        dictionary with words as keys and their column in the matrix as values
+    idf_vec: numpy.array
+        idf of each word in vocab, indexed by column
+    doc_lengths: numpy.array
+        no. of words in each document, indexed by row
+    avg_length: float
+        average length of documents
+    matrix: scipy.sparse.csr_matrix
+        sparse matrix of term frequencies with one row per document and one column per word
+    weights_csc: scipy.sparse.csc_matrix
+        column major matrix of w of every posting, used to fetch the postings of query words
+
+    Methods
+    -------
+    get_matrix(self, corpus, doc_freq, n_docs, avg_length)
+        Builds term frequency matrix of corpus along with idf and document lengths
+    set_matrix(self, matrix, doc_freq, n_docs, avg_length)
+        Computes idf, document lengths and w of every posting of a term frequency matrix
+    query_vector(self, qdoc)
+        Returns the columns and weights (qtf * idf) of the query words
+    term_weights(self, tfs, doc_lengths)
+        Returns w of postings
+    score(self, cols, weights)
+        Returns BM25 score of every document
+    top_k(self, scores, rows, k)
+        Returns the k highest scoring rows in descending order
+    search(self, qdoc, corpus, vs_matrix, boolean_output, k)
+        find documents which match query and rank them
+    batch_search(self, queries, k, chunk_size)
+        Rank all documents for many queries
+    """
+
+    variants = ('bm25', 'bm25+', 'bm25l')
+    default_delta = {'bm25': 0.0, 'bm25+': 1.0, 'bm25l': 0.5}
+
+    def __init__(self, k1=1.2, b=0.75, variant='bm25', delta=None):
+        if variant not in BM25.variants:
+            raise ValueError(f"variant must be one of {BM25.variants}, not '{variant}'")
+        self.k1 = k1
+        self.b = b
+        self.variant = variant
+        self.delta = delta if delta is not None else BM25.default_delta[variant]
+        self.name = f"{variant}(k1={k1}, b={b}, delta={self.delta})"
+        self.vocab = dict()
+        self.idf_vec = None
+        self.doc_lengths = None
+        self.avg_length = 0.0
+        self.matrix = None
+        self.weights_csc = None
+
+    def get_matrix(self, corpus, doc_freq=None, n_docs=None, avg_length=None):
+        """Builds term frequency matrix of corpus along with idf and document lengths
+
+        Row i of the matrix holds the word frequencies of corpus[i].
+        If corpus is a DocumentStore its arrays are used directly.
+
+        Parameters
+        ----------
+        corpus: list or DocumentStore
+            list containing Document class objects
+        doc_freq: numpy.array
+            no. of documents of the collection containing each word of corpus.terms
+            (DocumentStore only, see set_matrix)
+        n_docs: int
+            no. of documents of the collection
+        avg_length: float
+            average length of documents of the collection
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            sparse matrix of shape (no. of documents, no. of words) containing term frequencies
+        """
+
+        start = time.time()
+        if isinstance(corpus, DocumentStore):
+            vocab = dict(corpus.term_ids)
+            indptr = corpus.offsets
+            indices = corpus.ids.astype(np.int32)
+            freqs = corpus.freqs
+        else:
+            vocab = dict()
+            indptr = [0]
+            indices = []
+            freqs = []
+            for document in corpus:
+                for word, freq in document.word_freq.items():
+                    indices.append(vocab.setdefault(word, len(vocab)))
+                    freqs.append(freq)
+                indptr.append(len(indices))
+            indices = np.array(indices, dtype=np.int32)
+            indptr = np.array(indptr, dtype=np.int64)
+
+        self.vocab = vocab
+        self.set_matrix(csr_matrix((np.asarray(freqs, dtype=np.float64), indices, indptr), shape=(len(corpus), len(vocab))),
+                        doc_freq, n_docs, avg_length)
+        end = time.time()
+        print("BM25 matrix made in ", end-start)
+        return self.matrix
+
+    def set_matrix(self, matrix, doc_freq=None, n_docs=None, avg_length=None):
+        """Computes idf, document lengths and w of every posting of a term frequency matrix
+
+        When matrix holds one shard of a larger collection, statistics of the
+        whole collection are given, so scores are the same as those of a model
+        of the whole collection. Statistics which are None are computed from matrix.
+
+        Parameters
+        ----------
+        matrix: scipy.sparse.csr_matrix
+            sparse matrix of shape (no. of documents, no. of words) containing term frequencies
+        doc_freq: numpy.array
+            no. of documents of the collection containing each word (column)
+        n_docs: int
+            no. of documents of the collection
+        avg_length: float
+            average length of documents of the collection
+        """
+
+        csc = matrix.tocsc()
+        if doc_freq is None:
+            doc_freq = np.diff(csc.indptr)
+        if n_docs is None:
+            n_docs = matrix.shape[0]
+        self.matrix = matrix
+        self.idf_vec = np.log1p((n_docs - np.asarray(doc_freq) + 0.5) / (np.asarray(doc_freq) + 0.5))
+        self.doc_lengths = np.asarray(matrix.sum(axis=1), dtype=np.float64).ravel()
+        if avg_length is None:
+            avg_length = float(self.doc_lengths.mean()) if matrix.shape[0] > 0 else 0.0
+        self.avg_length = avg_length
+        weights = self.term_weights(csc.data, self.doc_lengths[csc.indices])
+        self.weights_csc = csc_matrix((weights, csc.indices, csc.indptr), shape=csc.shape)
+
+    def query_vector(self, qdoc):
+        """Returns the columns and weights (qtf * idf) of the query words
+
+        Parameters
+        ----------
+        qdoc: Document
+            Document object which is generated corresponding to input query
+
+        Returns
+        -------
+        tuple
+            (columns, weights) numpy arrays, words which are not in vocab are dropped
+        """
+
+        cols = []
+        freqs = []
+        for word, freq in qdoc.word_freq.items():
+            if word in self.vocab:
+                cols.append(self.vocab[word])
+                freqs.append(freq)
+        cols = np.array(cols, dtype=np.int64)
+        return cols, np.array(freqs, dtype=np.float64) * self.idf_vec[cols]
+
+    def term_weights(self, tfs, doc_lengths):
+        """Returns w (see module docstring) of postings
+
+        Parameters
+        ----------
+        tfs: numpy.array
+            term frequency of each posting
+        doc_lengths: numpy.array
+            length of the document of each posting
+
+        Returns
+        -------
+        numpy.array
+            weight of each posting
+        """
+
+        tfs = np.asarray(tfs, dtype=np.float64)
+        if self.avg_length > 0:
+            norm = 1 - self.b + self.b * (doc_lengths / self.avg_length)
+        else:
+            norm = np.ones(len(tfs))
+        k1 = self.k1
+        if self.variant == 'bm25l':
+            c = tfs / norm + self.delta
+            return (k1 + 1) * c / (k1 + c)
+        weights = tfs * (k1 + 1) / (tfs + k1 * norm)
+        if self.delta != 0:
+            weights += self.delta
+        return weights
+
+    def score(self, cols, weights):
+        """Returns BM25 score of every document
+
+        Postings of all query words are gathered into flat arrays (one
+        slice of weights_csc per word) and their contributions are added up
+        per document with np.bincount.
+
+        Parameters
+        ----------
+        cols: numpy.array
+            columns of the query words
+        weights: numpy.array
+            qtf * idf of each query word
+
+        Returns
+        -------
+        numpy.array
+            score of each document, indexed by row (0 for documents without query words)
+        """
+
+        indptr = self.weights_csc.indptr
+        starts = indptr[cols]
+        lengths = indptr[cols+1] - starts
+        ends = np.cumsum(lengths)
+        # positions of postings of all words in weights_csc.indices / data
+        positions = np.arange(ends[-1] if len(ends) > 0 else 0) + np.repeat(starts - (ends - lengths), lengths)
+        contributions = np.repeat(weights, lengths) * self.weights_csc.data[positions]
+        return np.bincount(self.weights_csc.indices[positions], weights=contributions, minlength=self.weights_csc.shape[0])
+
+    top_k = Tf_Idf.top_k
+
+    def search(self, qdoc, corpus, vs_matrix, boolean_output, k=None):
+        """Find documents which match query and rank them
+
+        Parameters
+        ----------
+        qdoc: Document
+            Document object which is generated corresponding to input query
+        corpus: list
+            list containing Document class objects
+        vs_matrix: scipy.sparse.csr_matrix
+            sparse matrix of term frequencies (from get_matrix)
+        boolean_output: list
+            list of file_id's as given by boolean retrieval model
+        k: int
+            number of top results to return, all matching documents are returned if None
+
+        Returns
+        -------
+        list
+            Ranked document list sorted according to the BM25 score (descending order)
+        """
+
+        model = self
+        if vs_matrix is not self.matrix:
+            model = BM25(self.k1, self.b, self.variant, self.delta)
+            model.vocab = self.vocab
+            model.set_matrix(vs_matrix.tocsr())
+        with instrument.stage('query_vector'):
+            cols, weights = model.query_vector(qdoc)
+            rows = as_rows(boolean_output)
+        if len(cols) == 0 or len(rows) == 0:
+            return []
+        with instrument.stage('score'):
+            scores = model.score(cols, weights)[rows]
+            mask = scores > 0
+        instrument.count('scored', len(rows))
+        with instrument.stage('sort'):
+            return model.top_k(scores[mask], rows[mask], k)
+
+    def batch_search(self, queries, k=10, chunk_size=1000):
+        """Rank all documents for many queries at once
+
+        Queries are scored chunk_size at a time with a single sparse matrix
+        product of their (qtf * idf) vectors with the matrix of w of every
+        posting, so memory used is bounded by the size of a chunk.
+
+        Parameters
+        ----------
+        queries: list
+            list of query strings
+        k: int
+            number of top results to return for each query, all matching documents are returned if None
+        chunk_size: int
+            number of queries scored in one matrix product
+
+        Returns
+        -------
+        list
+            for each query, list of (score, row) tuples sorted according to score (descending order)
+        """
+
+        # transpose of the column major matrix is a row major (words x documents) matrix, no copy is made
+        postings = self.weights_csc.T
+        res = []
+        for start in range(0, len(queries), chunk_size):
+            chunk = queries[start:start+chunk_size]
+            indptr = np.zeros(len(chunk)+1, dtype=np.int64)
+            all_cols = []
+            all_weights = []
+            for i, query in enumerate(chunk):
+                cols, weights = self.query_vector(query_document(query, self.vocab))
+                all_cols.append(cols)
+                all_weights.append(weights)
+                indptr[i+1] = indptr[i] + len(cols)
+            q_matrix = csr_matrix((np.concatenate(all_weights), np.concatenate(all_cols), indptr),
+                                  shape=(len(chunk), self.weights_csc.shape[1]))
+            scores = (q_matrix @ postings).tocsr()
+            scores.sort_indices()
+            for i in range(len(chunk)):
+                rows = scores.indices[scores.indptr[i]:scores.indptr[i+1]].astype(np.int64)
+                data = scores.data[scores.indptr[i]:scores.indptr[i+1]]
+                mask = data > 0
+                res.append(self.top_k(data[mask], rows[mask], k))
+        return res
+
+def parse_query(query, corpus, model, matrix, boolean_output, k=None):
+    """This function parses the query and returns relavent files ranked by BM25
+
+    Parameters
+    ----------
+    query: str
+        input query string
+    corpus: list
+        list containing Document class objects
+    model: BM25
+        object containing BM25 model
+    matrix: scipy.sparse.csr_matrix
+        sparse matrix containing term frequencies of each word
+    boolean_output: list
+        list of file_id's as given by boolean retrieval model
+    k: int
+        number of top results to return, all matching documents are returned if None
+
+    Returns
+    -------
+    list
+        relavent documents ranked w.r.t their score
+    """
+
+    q = query_document(query, model.vocab)
+    res = model.search(q, corpus, matrix, boolean_output, k)
+    return [ (corpus[i].filepath, score) for score, i in res ]
+
+def parse_queries(queries, corpus, model, k=10, chunk_size=1000):
+    """This function ranks all documents for many queries by BM25
+
+    Parameters
+    ----------
+    queries: list
+        list of query strings
+    corpus: list
+        list containing Document class objects
+    model: BM25
+        object containing BM25 model (with matrix built using get_matrix)
+    k: int
+        number of top results to return for each query
+    chunk_size: int
+        passed to BM25.batch_search
+
+    Returns
+    -------
+    list
+        for each query, relavent documents ranked w.r.t their score
+    """
+
+    res = model.batch_search(queries, k, chunk_size)
+    return [ [ (corpus[i].filepath, score) for score, i in query_res ] for query_res in res ]
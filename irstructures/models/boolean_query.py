@@ -0,0 +1,433 @@
+"""
+This module implements the query language of the boolean retrieval model
+
+Queries are parsed into a tree of operators, which is then planned against
+an index before being run by boolean_retrieval.evaluate:
+
+    heart AND (attack OR failure) NOT "blood pressure"
+
+Operators are AND, OR and NOT (only in capitals, lowercase and/or/not are
+stop words of normal text), with NOT binding tightest and OR loosest.
+Words without an operator between them are OR'ed, as in free text queries,
+and NOT without an operator before it excludes from all of the preceding
+words (a b NOT c is (a OR b) AND NOT c).
+Text in double quotes is a phrase, "a b"~k matches a and b within k words
+of each other. Every word goes through the same
+analyzer as the documents (see Document.get_words), so stop words are
+dropped and a word which splits into several terms becomes a phrase.
+A word with '*' (comput*, *itis, hyper*ion) is a wildcard: it is only
+lowercased, not stemmed, and matches the words of the index (which are
+stemmed) that fit the pattern, at most MAX_EXPANSIONS of them. Ranking
+models use the same expansion (see query_word_freq), so a wildcard is ranked
+by the words it matched and not by its own text.
+Dangling operators and unbalanced parentheses are ignored.
+
+The planner (see plan)
+    - expands wildcards into an OR of the matching words of the index
+    - drops terms which are not in the index and short-circuits AND's
+      having such a term, so missing words never raise KeyError
+    - flattens nested AND's and OR's and orders operands of an AND by length
+      of their posting lists, shortest first
+    - pushes NOT down into the enclosing AND as a set difference, so
+      a AND NOT b never computes the complement of b
+"""
+
+import re
+from ..document import Document
+from ..termdict import wildcard_regex
+from .. import instrument
+
+# double quoted phrase (closing quote is optional) with optional ~k, parenthesis or a run of other characters
+QUERY_TOKEN = re.compile(r'"[^"]*(?:"(?:~\d+)?)?|[()]|[^\s()"]+')
+# maximum number of words a wildcard is expanded into
+MAX_EXPANSIONS = 1024
+
+class Term:
+    """Leaf of query tree matching documents containing a word"""
+
+    def __init__(self, word):
+        self.word = word
+        self.cost = 0
+
+    def __repr__(self):
+        return self.word
+
+
+class Wildcard:
+    """Leaf of query tree matching documents containing any word which fits a pattern ('*' is any run of characters)"""
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.cost = 0
+
+    def __repr__(self):
+        return self.pattern
+
+
+class Phrase:
+    """
+    Leaf of query tree matching documents containing words of a phrase
+
+    Positions are matched only if a positional index is given to
+    boolean_retrieval.evaluate, else documents having all words match.
+
+    Attributes
+    ----------
+    words: list
+        words in order of the phrase
+    offsets: list
+        position of each word relative to the first one (stop words in between are counted)
+    slop: int
+        None for an exact phrase, else words have to occur within slop words of each other
+    """
+
+    def __init__(self, words, offsets=None, slop=None):
+        self.words = words
+        self.offsets = offsets if offsets is not None else list(range(len(words)))
+        self.slop = slop
+        self.cost = 0
+
+    def __repr__(self):
+        text = ' '.join(self.words) if self.offsets == list(range(len(self.words))) else \
+               ' '.join(f"{word}@{offset}" for word, offset in zip(self.words, self.offsets))
+        return '"' + text + '"' + (f"~{self.slop}" if self.slop is not None else "")
+
+
+class And:
+    """Node of query tree matching documents matched by all children and none of excluded"""
+
+    def __init__(self, children, excluded=None):
+        self.children = children
+        self.excluded = excluded if excluded is not None else []
+        self.cost = 0
+
+    def __repr__(self):
+        return '(' + ' AND '.join([repr(child) for child in self.children]
+                                  + ['NOT ' + repr(node) for node in self.excluded]) + ')'
+
+
+class Or:
+    """Node of query tree matching documents matched by any child"""
+
+    def __init__(self, children):
+        self.children = children
+        self.cost = 0
+
+    def __repr__(self):
+        return '(' + ' OR '.join(repr(child) for child in self.children) + ')'
+
+
+class Not:
+    """Node of query tree matching documents not matched by child"""
+
+    def __init__(self, child):
+        self.child = child
+        self.cost = float('inf')
+
+    def __repr__(self):
+        return 'NOT ' + repr(self.child)
+
+
+class All:
+    """Node of query tree matching every document (result of planning NOT of a missing word)"""
+
+    cost = float('inf')
+
+    def __repr__(self):
+        return '*'
+
+ALL = All()
+
+def analyze(text, slop=None):
+    """Returns Term, Phrase or None (if text has only stop words) for a word or phrase of a query"""
+
+    words, positions = Document.get_positions(text)
+    if len(words) == 0:
+        return None
+    if len(words) == 1:
+        return Term(words[0])
+    return Phrase(words, [ position - positions[0] for position in positions ], slop)
+
+class Parser:
+    """
+    Recursive descent parser of boolean queries
+
+        or_expr  := and_expr (['OR'] and_expr)*     (implicit OR before NOT is AND)
+        and_expr := not_expr ('AND' not_expr)*
+        not_expr := 'NOT' not_expr | atom
+        atom     := '(' or_expr ')' | phrase | wildcard | word
+
+    Sub expressions which have no words (only stop words or operators) are None.
+
+    Attributes
+    ----------
+    tokens: list
+        tokens of the query
+    pos: int
+        position of next token
+    """
+
+    def __init__(self, query):
+        self.tokens = QUERY_TOKEN.findall(query)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def parse(self):
+        """Returns query tree of whole query (None if it has no words)"""
+
+        node = None
+        while self.pos < len(self.tokens):
+            node = join(Or, node, self.or_expr())
+            # closing parenthesis without an opening one
+            if self.peek() == ')':
+                self.pos += 1
+        return node
+
+    def or_expr(self):
+        node = self.and_expr()
+        while self.peek() not in (None, ')'):
+            explicit = self.peek() == 'OR'
+            if explicit:
+                self.pos += 1
+            right = self.and_expr()
+            # a b NOT c excludes c from what comes before it, a OR NOT c does not
+            if isinstance(right, Not) and not explicit:
+                node = join(And, node, right)
+            else:
+                node = join(Or, node, right)
+        return node
+
+    def and_expr(self):
+        node = self.not_expr()
+        while self.peek() == 'AND':
+            self.pos += 1
+            node = join(And, node, self.not_expr())
+        return node
+
+    def not_expr(self):
+        if self.peek() == 'NOT':
+            self.pos += 1
+            child = self.not_expr()
+            return Not(child) if child is not None else None
+        return self.atom()
+
+    def atom(self):
+        token = self.peek()
+        if token is None or token == ')':
+            return None
+        self.pos += 1
+        if token == '(':
+            node = self.or_expr()
+            if self.peek() == ')':
+                self.pos += 1
+            return node
+        if token in ('AND', 'OR'):
+            # operator without a left operand
+            return None
+        if token.startswith('"'):
+            text, quote, slop = token[1:].partition('"~')
+            if quote:
+                return analyze(text, int(slop))
+            return analyze(text.rstrip('"'))
+        if '*' in token:
+            pattern = token.lower()
+            return Wildcard(pattern) if pattern.strip('*') else None
+        return analyze(token)
+
+def join(cls, left, right):
+    """Returns cls([left, right]), or the one which is not None"""
+
+    if left is None:
+        return right
+    if right is None:
+        return left
+    return cls([left, right])
+
+def parse(query):
+    """Parse query into a tree of Term, Phrase, Wildcard, And, Or and Not nodes
+
+    Parameters
+    ----------
+    query: str
+        input query string
+
+    Returns
+    -------
+    object
+        root node of query tree, None if query has no words
+    """
+
+    with instrument.stage('parse'):
+        return Parser(query).parse()
+
+def doc_freq(index, word):
+    """Returns length of posting list of word in index (0 if word is not present)"""
+
+    if hasattr(index, 'doc_freq'):
+        return index.doc_freq(word)
+    return len(index[word]) if word in index else 0
+
+def expand(index, pattern):
+    """Returns words of index matching a wildcard pattern, at most MAX_EXPANSIONS of them
+
+    Indexes having a sorted term dictionary (see termdict.SortedTerms.match)
+    look up prefixes by binary search, words of other indexes are scanned.
+    """
+
+    if hasattr(index, 'match'):
+        return index.match(pattern, MAX_EXPANSIONS)
+    regex = wildcard_regex(pattern)
+    return sorted(word for word in index if regex.fullmatch(word))[:MAX_EXPANSIONS]
+
+def query_word_freq(query, index):
+    """Returns frequency of each word of a query, used by ranking models to build the query vector
+
+    Same as Document.get_word_freq(query), except that every wildcard is
+    replaced by the words of index it expands to (see expand), each counted once.
+
+    Parameters
+    ----------
+    query: str
+        input query string
+    index: dict
+        inverted index or vocabulary of a model (words as keys)
+
+    Returns
+    -------
+    dict
+        dictionary with each word and it's corresponding frequency
+    """
+
+    text = []
+    expanded = []
+    for token in QUERY_TOKEN.findall(query):
+        if '*' in token and not token.startswith('"'):
+            pattern = token.lower()
+            if pattern.strip('*'):
+                with instrument.stage('wildcard'):
+                    expanded.extend(expand(index, pattern))
+        else:
+            text.append(token)
+    word_freq = Document.get_word_freq(' '.join(text))
+    for word in expanded:
+        word_freq[word] = word_freq.get(word, 0) + 1
+    return word_freq
+
+def plan(node, index):
+    """Optimize query tree for running on index
+
+    Sets cost of every node to an estimate of the length of its result and
+    rewrites the tree (see module docstring). Nodes are planned bottom up.
+
+    Parameters
+    ----------
+    node: object
+        root node of query tree given by parse (or None)
+    index: dict
+        inverted index containing words as keys and list of documents os values
+
+    Returns
+    -------
+    object
+        root node of planned tree, ALL if it matches every document and
+        None if it matches no document
+    """
+
+    if node is None or node is ALL:
+        return node
+
+    if isinstance(node, Term):
+        node.cost = doc_freq(index, node.word)
+        return node if node.cost > 0 else None
+
+    if isinstance(node, Wildcard):
+        with instrument.stage('wildcard'):
+            words = expand(index, node.pattern)
+        return plan(Or([ Term(word) for word in words ]), index)
+
+    if isinstance(node, Phrase):
+        costs = [ doc_freq(index, word) for word in node.words ]
+        node.cost = min(costs)
+        return node if node.cost > 0 else None
+
+    if isinstance(node, Not):
+        child = plan(node.child, index)
+        if child is None:
+            return ALL
+        if child is ALL:
+            return None
+        if isinstance(child, Not):
+            return child.child
+        return Not(child)
+
+    if isinstance(node, Or):
+        children = []
+        for child in node.children:
+            child = plan(child, index)
+            if child is ALL:
+                return ALL
+            if isinstance(child, Or):
+                children.extend(child.children)
+            elif child is not None:
+                children.append(child)
+        if len(children) == 0:
+            return None
+        if len(children) == 1:
+            return children[0]
+        # smaller lists are merged first
+        children.sort(key=lambda child: child.cost)
+        node = Or(children)
+        node.cost = sum(child.cost for child in children)
+        return node
+
+    # And
+    children = []
+    excluded = []
+    for child in node.children + [ Not(child) for child in node.excluded ]:
+        child = plan(child, index)
+        if child is None:
+            # intersection with an empty list is empty
+            return None
+        if child is ALL:
+            continue
+        if isinstance(child, And):
+            children.extend(child.children)
+            excluded.extend(child.excluded)
+        elif isinstance(child, Not):
+            # a AND NOT (b OR c) is a minus b minus c
+            if isinstance(child.child, Or):
+                excluded.extend(child.child.children)
+            else:
+                excluded.append(child.child)
+        else:
+            children.append(child)
+    if len(children) == 0 and len(excluded) == 0:
+        return ALL
+    if len(children) == 1 and len(excluded) == 0:
+        return children[0]
+    children.sort(key=lambda child: child.cost)
+    # larger lists are subtracted first, so that later differences run on a shorter result
+    excluded.sort(key=lambda child: child.cost, reverse=True)
+    node = And(children, excluded)
+    node.cost = children[0].cost if len(children) > 0 else float('inf')
+    return node
+
+def compile_query(query, index):
+    """Parse and plan query
+
+    Parameters
+    ----------
+    query: str
+        input query string
+    index: dict
+        inverted index containing words as keys and list of documents os values
+
+    Returns
+    -------
+    object
+        root node of planned query tree, ALL or None (see plan)
+    """
+
+    return plan(parse(query), index)
@@ -2,23 +2,78 @@
 This module implements functions which are used in boolean retrieval model
 """
 
-from ..document import Document
-from ..invertedindex import InvertedIndex
+from array import array
+from ..invertedindex import InvertedIndex, gallop
+from .. import instrument
+from . import boolean_query
+from ..positional import match_phrase
+
+# use galloping search instead of linear merge when one list is this many times longer
+GALLOP_RATIO = 8
+
+def intersect(list1, list2):
+    """Intersection of two sorted posting lists
+
+    Walks the smaller list and finds each of its doc_id's in the larger list.
+    Uses a linear merge when both lists have similar length and galloping
+    search when the larger list is much longer.
+
+    Parameters
+    ----------
+    list1: array
+        first sorted list
+    list2: array
+        second sorted list
+
+    Returns
+    -------
+    array
+        sorted list of doc_id's present in both lists
+    """
+
+    if len(list1) > len(list2):
+        list1, list2 = list2, list1
+    res = array('I')
+    n1, n2 = len(list1), len(list2)
+    if n1 == 0:
+        return res
+
+    if n1 * GALLOP_RATIO < n2:
+        j = 0
+        for doc_id in list1:
+            j = gallop(list2, doc_id, j)
+            if j >= n2:
+                break
+            if list2[j] == doc_id:
+                res.append(doc_id)
+        return res
+
+    i = j = 0
+    while i < n1 and j < n2:
+        if list1[i] == list2[j]:
+            res.append(list1[i])
+            i += 1
+            j += 1
+        elif list1[i] < list2[j]:
+            i += 1
+        else:
+            j += 1
+    return res
 
 def AND(list1, list2):
     """Perform AND operation on lists
     
     Parameters
     ----------
-    list1: list
-        first list
-    list2: list
-        second list
+    list1: array
+        first sorted list
+    list2: array
+        second sorted list
     
     Returns
     -------
-    list
-        final list after performing AND operation
+    array
+        final sorted list after performing AND operation
     """
 
     # does not return empty unless both lists are empty
@@ -27,37 +82,217 @@ def AND(list1, list2):
         return list1
     elif len(list1) == 0:
         return list2
-    return [ i for i in list1 if i in list2 ]
+    return intersect(list1, list2)
 
 def OR(list1, list2):
     """Perform OR operation on lists
 
     Parameters
     ----------
-    list1: list
-        first list
-    list2: list
-        second list
+    list1: array
+        first sorted list
+    list2: array
+        second sorted list
     
     Returns
     -------
-    list
-        final list after performing OR operation
+    array
+        final sorted list after performing OR operation
     """
 
-    return list(set(list1).union(set(list2)))
+    if len(list1) == 0:
+        return array('I', list2)
+    if len(list2) == 0:
+        return array('I', list1)
+    res = array('I')
+    n1, n2 = len(list1), len(list2)
+    i = j = 0
+    while i < n1 and j < n2:
+        if list1[i] == list2[j]:
+            res.append(list1[i])
+            i += 1
+            j += 1
+        elif list1[i] < list2[j]:
+            res.append(list1[i])
+            i += 1
+        else:
+            res.append(list2[j])
+            j += 1
+    res.extend(list1[i:])
+    res.extend(list2[j:])
+    return res
+
+def NOT(list1, list2):
+    """Perform NOT operation on lists (list1 AND NOT list2)
+
+    Parameters
+    ----------
+    list1: array
+        sorted list to remove doc_id's from
+    list2: array
+        sorted list of doc_id's to be removed
+
+    Returns
+    -------
+    array
+        final sorted list with doc_id's in list1 but not in list2
+    """
 
-def parse_query(query, corpus, index):
+    res = array('I')
+    n1, n2 = len(list1), len(list2)
+    if n2 == 0 or n1 == 0:
+        return array('I', list1)
+
+    gallop_list2 = n1 * GALLOP_RATIO < n2
+    j = 0
+    for doc_id in list1:
+        if gallop_list2:
+            j = gallop(list2, doc_id, j)
+        else:
+            while j < n2 and list2[j] < doc_id:
+                j += 1
+        if j >= n2 or list2[j] != doc_id:
+            res.append(doc_id)
+    return res
+
+def fetch(index, word):
+    """Returns posting list of word, timed as the postings stage (see instrument)
+
+    Parameters
+    ----------
+    index: dict
+        inverted index containing words as keys and list of documents os values
+    word: str
+        word whose posting list is required
+
+    Returns
+    -------
+    array
+        posting list of word, empty if word is not in index
+    """
+
+    with instrument.stage('postings'):
+        postings = index[word] if word in index else array('I')
+    instrument.count('postings', len(postings))
+    return postings
+
+def all_documents(corpus, index):
+    """Returns sorted doc_id's of all documents, used by NOT without a positive operand
+
+    Parameters
+    ----------
+    corpus: list
+        list containing Document class objects (or None)
+    index: dict
+        inverted index containing words as keys and list of documents os values
+
+    Returns
+    -------
+    array
+        live doc_id's of an index which is updated in place (like SegmentedIndex),
+        doc_id's 0 to len(corpus)-1, or union of all posting lists if corpus is None
+    """
+
+    if hasattr(index, 'doc_paths'):
+        return array('I', sorted(index.doc_paths))
+    if corpus is not None:
+        return array('I', range(len(corpus)))
+    doc_ids = set()
+    for word in index.keys():
+        doc_ids.update(index[word])
+    return array('I', sorted(doc_ids))
+
+def evaluate(node, index, universe, positions=None):
+    """Run a planned query tree (see boolean_query.plan) on sorted posting lists
+
+    Operands of AND are intersected shortest first and evaluation stops as
+    soon as the intersection is empty, without fetching remaining lists.
+    Excluded operands are removed from the result with NOT (set difference).
+
+    Parameters
+    ----------
+    node: object
+        root node of planned query tree (not None)
+    index: dict
+        inverted index containing words as keys and list of documents os values
+    universe: callable
+        returns sorted doc_id's of all documents, called only if the query needs them
+    positions: DiskInvertedIndex
+        index with positions of the same corpus, used to match phrases (optional)
+
+    Returns
+    -------
+    array
+        sorted list of matching doc_id's
+    """
+
+    if isinstance(node, boolean_query.Term):
+        return fetch(index, node.word)
+
+    if isinstance(node, boolean_query.Phrase):
+        if positions is not None:
+            with instrument.stage('positions'):
+                return match_phrase(positions, node.words, node.offsets, node.slop)
+        # without positions a phrase matches documents having all its words
+        words = sorted(node.words, key=lambda word: boolean_query.doc_freq(index, word))
+        result = fetch(index, words[0])
+        for word in words[1:]:
+            if len(result) == 0:
+                break
+            postings = fetch(index, word)
+            with instrument.stage('merge'):
+                result = intersect(result, postings)
+        return result
+
+    if isinstance(node, boolean_query.And):
+        result = evaluate(node.children[0], index, universe, positions) if len(node.children) > 0 else universe()
+        for child in node.children[1:]:
+            if len(result) == 0:
+                return result
+            postings = evaluate(child, index, universe, positions)
+            with instrument.stage('merge'):
+                result = intersect(result, postings)
+        for child in node.excluded:
+            if len(result) == 0:
+                return result
+            postings = evaluate(child, index, universe, positions)
+            with instrument.stage('merge'):
+                result = NOT(result, postings)
+        return result
+
+    if isinstance(node, boolean_query.Or):
+        result = evaluate(node.children[0], index, universe, positions)
+        for child in node.children[1:]:
+            postings = evaluate(child, index, universe, positions)
+            with instrument.stage('merge'):
+                result = OR(result, postings)
+        return result
+
+    if isinstance(node, boolean_query.Not):
+        postings = evaluate(node.child, index, universe, positions)
+        with instrument.stage('merge'):
+            return NOT(universe(), postings)
+
+    # boolean_query.ALL
+    return universe()
+
+def parse_query(query, corpus, index, positions=None):
     """This function parses the query and returns relavent files
 
+    See boolean_query for the query language. Words which are not in the
+    index match no documents.
+
     Parameters
     ----------
     query: str
         input query string
     corpus: list
-        list containing Document class objects
+        list containing Document class objects (only its length is used, by queries with NOT)
     index: dict
         inverted index containing words as keys and list of documents os values
+    positions: DiskInvertedIndex
+        index with positions of the same corpus, phrases match documents having all
+        their words if not given (see positional)
 
     Returns
     -------
@@ -65,36 +300,20 @@ def parse_query(query, corpus, index):
         list of documents which are output of boolean retrieval
     """
 
-    # operators = ['AND', 'OR']
-    qdoc = Document(raw_data=query)
-    # stemmer = PorterStemmer()
-    # query_list = query.strip().split()
-    # query_list = [ stemmer.stem(word.lower()) if word not in operators else word for word in query_list  ]
-    # query_list = [ word for word in query_list if word in operators or word in index ]
-    query_list = list(qdoc.word_freq.keys())
-    if len(query_list) < 1:
+    node = boolean_query.compile_query(query, index)
+    if node is None:
         return []
-    temp = index[query_list[0]]
-    i = 1
-    while i< len(query_list):
-        if query_list[i] == "OR":
-            temp = OR(temp, index[query_list[i+1]])
-            i += 1
-        elif query_list[i] == "AND":
-            temp = AND(temp, index[query_list[i+1]])
-            i += 1
-        else: #default using AND
-            temp = OR(temp, index[query_list[i]])
-        i += 1
 
-    output = []
-    for i in temp:
-        output.append(i)
+    all_docs = []
+    def universe():
+        if len(all_docs) == 0:
+            all_docs.append(all_documents(corpus, index))
+        return all_docs[0]
 
-    return output
+    return list(evaluate(node, index, universe, positions))
 
 if __name__ == "__main__":
     print("For testing operators only")
-    list1 = input("enter list1: ").split()
-    list2 = input("enter list2: ").split()
+    list1 = array('I', sorted(map(int, input("enter list1: ").split())))
+    list2 = array('I', sorted(map(int, input("enter list2: ").split())))
     print(AND(list1, list2))
\ No newline at end of file
@@ -0,0 +1,311 @@
+"""
+This module implements approximate "more like this" search: documents most similar to a given document
+
+Similarity of two documents is the cosine of their tf-idf vectors. Finding
+the exact top k compares the document with every other one (see
+SimilarDocuments.exact), so instead
+
+    1. tf-idf vectors, scaled to unit length, are reduced to n_components
+       dimensions, with a truncated SVD (LSA) computed by randomized range
+       finding (Halko et al.) or with a gaussian random projection, and scaled
+       to unit length again so that a dot product is a cosine
+    2. reduced vectors are clustered by spherical k-means into n_lists lists
+       (an inverted file, IVF), each document is kept in the list of its
+       nearest centroid
+    3. a search visits only the n_probe lists whose centroids are nearest to
+       the document, ranks their documents by the cosine of reduced vectors
+       and re-scores the best rerank * k of them with the exact tf-idf cosine
+
+With n_lists ~ sqrt(no. of documents) a search scores about
+n_probe * sqrt(no. of documents) documents instead of all of them. n_probe
+(and rerank) trade latency for recall, see benchmarks/similar.py.
+"""
+
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+from .vector_space import Tf_Idf
+from .. import instrument
+import time
+
+def unit_rows(vectors):
+    """Returns rows of a dense matrix scaled to unit length (rows of zeros are kept as is)"""
+
+    norms = np.linalg.norm(vectors, axis=1)
+    return vectors / np.where(norms > 0, norms, 1)[:, None]
+
+def randomized_svd(matrix, n_components, n_oversamples=10, n_iter=2, seed=0):
+    """Returns truncated SVD of a sparse matrix using a randomized range finder
+
+    Parameters
+    ----------
+    matrix: scipy.sparse.csr_matrix
+        matrix of shape (m, n)
+    n_components: int
+        number of singular values and vectors
+    n_oversamples: int
+        extra dimensions of the random subspace, improve accuracy of the last components
+    n_iter: int
+        number of power iterations, needed when singular values decay slowly (as with tf-idf)
+    seed: int
+        seed of random number generator
+
+    Returns
+    -------
+    tuple
+        (U of shape (m, n_components), singular values, Vt of shape (n_components, n))
+    """
+
+    rng = np.random.default_rng(seed)
+    size = min(n_components + n_oversamples, min(matrix.shape))
+    Q = matrix @ rng.standard_normal((matrix.shape[1], size))
+    Q, _ = np.linalg.qr(Q)
+    for _ in range(n_iter):
+        Z, _ = np.linalg.qr(matrix.T @ Q)
+        Q, _ = np.linalg.qr(matrix @ Z)
+    # matrix ~ Q Q^T matrix, and the small matrix Q^T matrix is decomposed exactly
+    B = np.asarray(matrix.T @ Q).T
+    Ub, S, Vt = np.linalg.svd(B, full_matrices=False)
+    return Q @ Ub[:, :n_components], S[:n_components], Vt[:n_components]
+
+def nearest(vectors, centroids, chunk_size=10000):
+    """Returns index of the centroid having highest dot product with each vector (chunk_size vectors at a time)"""
+
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        labels[start:start+chunk_size] = np.argmax(vectors[start:start+chunk_size] @ centroids.T, axis=1)
+    return labels
+
+def spherical_kmeans(vectors, n_clusters, n_iter=10, seed=0):
+    """Cluster unit vectors by cosine similarity
+
+    Parameters
+    ----------
+    vectors: numpy.array
+        unit vectors, one per row
+    n_clusters: int
+        number of clusters
+    n_iter: int
+        number of iterations of Lloyd's algorithm
+    seed: int
+        seed used to pick initial centroids
+
+    Returns
+    -------
+    tuple
+        (unit centroids of shape (n_clusters, dimensions), cluster of each vector)
+    """
+
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = nearest(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        # empty clusters keep their centroid
+        filled = np.bincount(labels, minlength=n_clusters) > 0
+        centroids[filled] = unit_rows(sums[filled])
+    return centroids, nearest(vectors, centroids)
+
+class SimilarDocuments():
+    """
+    Class used to find documents similar to a given document
+
+    Attributes
+    ----------
+    n_components: int
+        dimensions of reduced vectors
+    method: str
+        'svd' (truncated SVD, LSA) or 'projection' (gaussian random projection)
+    n_lists: int
+        number of k-means lists, sqrt(no. of documents) if None
+    n_probe: int
+        number of lists visited by a search
+    rerank: int
+        best rerank * k documents in reduced space are re-scored with exact cosine (0 to return reduced scores)
+    seed: int
+        seed of random number generators
+    matrix: scipy.sparse.csr_matrix
+        tf-idf matrix with rows scaled to unit length, used to re-score candidates
+    vectors: numpy.array
+        reduced unit vector of each document, indexed by row
+    centroids: numpy.array
+        unit centroid of each list
+    list_offsets: numpy.array
+        documents of list i are list_docs[list_offsets[i]:list_offsets[i+1]]
+    list_docs: numpy.array
+        doc_id's grouped by list, in increasing order in each list
+
+    Methods
+    -------
+    fit(self, vsmodel)
+        Reduce tf-idf vectors of a model and cluster them
+    candidates(self, doc_id, n_probe)
+        Returns doc_id's of the lists nearest to a document
+    search(self, doc_id, k, n_probe, rerank)
+        Returns approximate top k documents most similar to a document
+    exact(self, doc_id, k)
+        Returns exact top k documents most similar to a document, comparing it with every document
+    top_k(self, scores, rows, k)
+        Returns the k highest scoring rows in descending order
+    """
+
+    methods = ('svd', 'projection')
+
+    def __init__(self, n_components=128, method='svd', n_lists=None, n_probe=8, rerank=30, seed=0):
+        if method not in SimilarDocuments.methods:
+            raise ValueError(f"method must be one of {SimilarDocuments.methods}, not '{method}'")
+        self.n_components = n_components
+        self.method = method
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.rerank = rerank
+        self.seed = seed
+        self.matrix = None
+        self.vectors = None
+        self.centroids = None
+        self.list_offsets = None
+        self.list_docs = None
+
+    def fit(self, vsmodel):
+        """Reduce tf-idf vectors of a model and cluster them
+
+        Parameters
+        ----------
+        vsmodel: Tf_Idf
+            tf-idf model with sparse matrix built using get_matrix (or opened from a snapshot)
+
+        Returns
+        -------
+        numpy.array
+            reduced vectors of documents
+        """
+
+        start = time.time()
+        norms = vsmodel.doc_norms
+        inverse = np.divide(1.0, norms, out=np.zeros(len(norms)), where=norms>0)
+        self.matrix = csr_matrix(diags(inverse) @ vsmodel.matrix)
+        n_docs, n_words = self.matrix.shape
+        n_components = max(1, min(self.n_components, n_docs, n_words))
+        if self.method == 'svd':
+            U, S, Vt = randomized_svd(self.matrix, n_components, seed=self.seed)
+            vectors = U * S
+        else:
+            rng = np.random.default_rng(self.seed)
+            vectors = self.matrix @ rng.standard_normal((n_words, n_components))
+        self.vectors = unit_rows(np.asarray(vectors)).astype(np.float32)
+
+        n_lists = self.n_lists if self.n_lists is not None else int(np.sqrt(n_docs))
+        n_lists = max(1, min(n_lists, n_docs))
+        self.centroids, labels = spherical_kmeans(self.vectors, n_lists, seed=self.seed)
+        self.list_docs = np.argsort(labels, kind='stable')
+        self.list_offsets = np.zeros(n_lists+1, dtype=np.int64)
+        self.list_offsets[1:] = np.cumsum(np.bincount(labels, minlength=n_lists))
+        end = time.time()
+        print("Similar documents index made in ", end-start)
+        return self.vectors
+
+    def candidates(self, doc_id, n_probe=None):
+        """Returns doc_id's of the n_probe lists whose centroids are nearest to a document
+
+        Parameters
+        ----------
+        doc_id: int
+            row of document in tf-idf matrix
+        n_probe: int
+            number of lists, self.n_probe if None
+
+        Returns
+        -------
+        numpy.array
+            doc_id's, including doc_id itself
+        """
+
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        sims = self.centroids @ self.vectors[doc_id]
+        lists = np.argpartition(-sims, n_probe-1)[:n_probe]
+        return np.concatenate([ self.list_docs[self.list_offsets[i]:self.list_offsets[i+1]] for i in lists ])
+
+    def search(self, doc_id, k=10, n_probe=None, rerank=None):
+        """Returns approximate top k documents most similar to a document
+
+        Parameters
+        ----------
+        doc_id: int
+            row of document in tf-idf matrix
+        k: int
+            number of documents to return
+        n_probe: int
+            number of lists visited, self.n_probe if None
+        rerank: int
+            best rerank * k candidates are re-scored with exact cosine, self.rerank if None
+
+        Returns
+        -------
+        list
+            list of (cosine, doc_id) tuples sorted according to cosine (descending order), without doc_id itself
+        """
+
+        rerank = self.rerank if rerank is None else rerank
+        with instrument.stage('candidates'):
+            rows = self.candidates(doc_id, n_probe)
+            rows = rows[rows != doc_id]
+        instrument.count('scored', len(rows))
+        with instrument.stage('score'):
+            scores = self.vectors[rows] @ self.vectors[doc_id]
+            if rerank > 0:
+                if rerank * k < len(rows):
+                    best = np.argpartition(-scores, rerank*k-1)[:rerank*k]
+                    best.sort()
+                    rows = rows[best]
+                scores = (self.matrix[rows] @ self.matrix[doc_id].T).toarray().ravel()
+            mask = scores > 0
+        with instrument.stage('sort'):
+            return self.top_k(scores[mask].astype(np.float64), rows[mask], k)
+
+    def exact(self, doc_id, k=10):
+        """Returns exact top k documents most similar to a document, comparing it with every document
+
+        Parameters
+        ----------
+        doc_id: int
+            row of document in tf-idf matrix
+        k: int
+            number of documents to return
+
+        Returns
+        -------
+        list
+            list of (cosine, doc_id) tuples sorted according to cosine (descending order), without doc_id itself
+        """
+
+        scores = (self.matrix @ self.matrix[doc_id].T).toarray().ravel()
+        scores[doc_id] = 0
+        rows = np.flatnonzero(scores > 0)
+        return self.top_k(scores[rows], rows, k)
+
+    top_k = Tf_Idf.top_k
+
+    def __len__(self):
+        return 0 if self.vectors is None else len(self.vectors)
+
+def more_like_this(doc_id, corpus, similar, k=10):
+    """This function finds documents similar to a document and returns their files
+
+    Parameters
+    ----------
+    doc_id: int
+        doc_id of document
+    corpus: list
+        list containing Document class objects
+    similar: SimilarDocuments
+        index of reduced document vectors, fitted on the tf-idf model of corpus
+    k: int
+        number of similar documents to return
+
+    Returns
+    -------
+    list
+        similar documents ranked w.r.t their cosine
+    """
+
+    return [ (corpus[i].filepath, score) for score, i in similar.search(doc_id, k) ]
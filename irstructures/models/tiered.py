@@ -0,0 +1,218 @@
+"""
+This module implements a tiered tf-idf index: champion lists answered first, the full index only when needed
+
+Frequent words have posting lists covering a large part of the corpus and
+Tf_Idf.search scores all of them. Postings are weighted by their impact
+(tf-idf weight / norm of document, so that the cosine of a document is the
+sum of query weight * impact over query words, see InvertedIndex.set_impacts)
+and split into two tiers:
+
+    tier 1    champion lists: the r postings of highest impact of every word
+    tier 2    every posting, or only those left by static pruning
+
+A query first scores the documents of the champion lists of its words, with
+their exact cosine (all their postings of query words are used, not only
+champions). If atleast k of them match the query, their top k is the answer.
+Otherwise every posting of the query words is scored from tier 2, as
+Tf_Idf.search does.
+
+Static pruning (prune > 0) drops postings whose impact is less than prune
+times the highest impact of their word, so tier 2 is smaller and faster but
+scores change slightly. r and prune trade index size and latency against
+fidelity to the exact ranking, see benchmarks/tiered.py.
+"""
+
+import numpy as np
+from scipy.sparse import csc_matrix
+from .vector_space import Tf_Idf, as_rows
+from .. import instrument
+import time
+
+def column_ranks(matrix_csc):
+    """Returns order of postings of a csc matrix sorted by column and then by decreasing value, and rank of each posting in its column
+
+    Parameters
+    ----------
+    matrix_csc: scipy.sparse.csc_matrix
+        matrix whose columns are posting lists
+
+    Returns
+    -------
+    tuple
+        (order, rank) numpy arrays, posting order[i] is the rank[i]'th largest of its column
+    """
+
+    cols = np.repeat(np.arange(matrix_csc.shape[1]), np.diff(matrix_csc.indptr))
+    order = np.lexsort((-matrix_csc.data, cols))
+    rank = np.arange(len(order)) - np.repeat(matrix_csc.indptr[:-1], np.diff(matrix_csc.indptr))
+    return order, rank
+
+def select_postings(matrix_csc, keep):
+    """Returns csc matrix having only the postings (in order of data) where keep is True"""
+
+    cols = np.repeat(np.arange(matrix_csc.shape[1]), np.diff(matrix_csc.indptr))
+    indptr = np.zeros(matrix_csc.shape[1]+1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(cols[keep], minlength=matrix_csc.shape[1]))
+    return csc_matrix((matrix_csc.data[keep], matrix_csc.indices[keep], indptr), shape=matrix_csc.shape)
+
+class TieredIndex():
+    """
+    Class used to rank documents from champion lists first and the full index only if needed
+
+    Attributes
+    ----------
+    r: int
+        no. of postings in the champion list of each word
+    prune: float
+        postings whose impact is less than prune * highest impact of the word are dropped (0 keeps all)
+    name: str
+        parameters of the model, used in cache keys
+    vsmodel: Tf_Idf
+        tf-idf model whose query vectors are used
+    vocab: dict
+        vocabulary of vsmodel, used to expand wildcards of queries
+    matrix: scipy.sparse.csc_matrix
+        column major matrix of impacts of every posting of tier 2, rows of each column are sorted
+    champions: scipy.sparse.csc_matrix
+        column major matrix of impacts of champion postings (tier 1)
+
+    Methods
+    -------
+    fit(self, vsmodel)
+        Builds both tiers from a tf-idf model
+    nbytes(self)
+        Returns size of the postings of each tier
+    search(self, qdoc, corpus, vs_matrix, boolean_output, k)
+        find documents which match query and rank them, from tier 1 if possible
+    top_k(self, scores, rows, k)
+        Returns the k highest scoring rows in descending order
+    """
+
+    def __init__(self, r=100, prune=0.0):
+        self.r = r
+        self.prune = prune
+        self.name = f"tiered(r={r}, prune={prune})"
+        self.vsmodel = None
+        self.vocab = None
+        self.matrix = None
+        self.champions = None
+
+    def fit(self, vsmodel):
+        """Builds both tiers from a tf-idf model
+
+        Parameters
+        ----------
+        vsmodel: Tf_Idf
+            tf-idf model with sparse matrix built using get_matrix (or opened from a snapshot)
+
+        Returns
+        -------
+        scipy.sparse.csc_matrix
+            sparse matrix of impacts of tier 2
+        """
+
+        start = time.time()
+        self.vsmodel = vsmodel
+        self.vocab = vsmodel.vocab
+        csc = vsmodel.matrix_csc
+        norms = vsmodel.doc_norms[csc.indices]
+        impacts = csc_matrix((np.divide(csc.data, norms, out=np.zeros(len(norms)), where=norms>0), csc.indices, csc.indptr), shape=csc.shape)
+        # rows of candidates are looked up in columns by binary search
+        impacts.sort_indices()
+
+        if self.prune > 0:
+            lengths = np.diff(impacts.indptr)
+            highest = np.zeros(impacts.shape[1])
+            nonempty = lengths > 0
+            highest[nonempty] = np.maximum.reduceat(impacts.data, impacts.indptr[:-1][nonempty])
+            impacts = select_postings(impacts, impacts.data >= self.prune * np.repeat(highest, lengths))
+        order, rank = column_ranks(impacts)
+        champion = np.zeros(len(order), dtype=bool)
+        champion[order[rank < self.r]] = True
+        self.champions = select_postings(impacts, champion)
+        self.matrix = impacts
+        end = time.time()
+        print("Tiered index made in ", end-start)
+        return self.matrix
+
+    def nbytes(self):
+        """Returns size of the postings (row and impact of each) of each tier, in bytes
+
+        Returns
+        -------
+        dict
+            tier1 and tier2 sizes along with no. of postings of each
+        """
+
+        def size(matrix):
+            return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+        return {'tier1_postings': int(self.champions.nnz), 'tier1_bytes': size(self.champions),
+                'tier2_postings': int(self.matrix.nnz), 'tier2_bytes': size(self.matrix)}
+
+    def search(self, qdoc, corpus, vs_matrix, boolean_output, k=None):
+        """Find documents which match query and rank them, from tier 1 if possible
+
+        Parameters
+        ----------
+        qdoc: Document
+            Document object which is generated corresponding to input query
+        corpus: list
+            list containing Document class objects
+        vs_matrix: scipy.sparse.csr_matrix
+            unused, tiers of this model are always used (kept so that it can be used in place of Tf_Idf)
+        boolean_output: list
+            list of file_id's as given by boolean retrieval model
+        k: int
+            number of top results to return, all matching documents (from tier 2) are returned if None
+
+        Returns
+        -------
+        list
+            Ranked document list sorted according to cosine (descending order)
+        """
+
+        with instrument.stage('query_vector'):
+            cols, weights = self.vsmodel.query_vector(qdoc)
+            rows = as_rows(boolean_output)
+        q_norm = np.sqrt(np.sum(weights**2))
+        if len(cols) == 0 or len(rows) == 0 or q_norm == 0:
+            return []
+        weights = weights / q_norm
+        indptr = self.matrix.indptr
+
+        if k is not None:
+            with instrument.stage('tier1'):
+                champions = self.champions
+                candidates = np.unique(np.concatenate([ champions.indices[champions.indptr[col]:champions.indptr[col+1]] for col in cols ]))
+                if isinstance(boolean_output, range) and boolean_output.step == 1:
+                    candidates = candidates[(candidates >= boolean_output.start) & (candidates < boolean_output.stop)]
+                else:
+                    candidates = candidates[np.isin(candidates, rows)]
+                # exact score of candidates, from their postings in tier 2
+                scores = np.zeros(len(candidates))
+                for col, weight in zip(cols.tolist(), weights):
+                    col_rows = self.matrix.indices[indptr[col]:indptr[col+1]]
+                    found = np.searchsorted(col_rows, candidates)
+                    hit = found < len(col_rows)
+                    hit[hit] = col_rows[found[hit]] == candidates[hit]
+                    scores[hit] += weight * self.matrix.data[indptr[col] + found[hit]]
+                mask = scores > 0
+            if np.count_nonzero(mask) >= k:
+                instrument.count('scored', len(candidates))
+                with instrument.stage('sort'):
+                    return self.top_k(scores[mask], candidates[mask], k)
+
+        instrument.count('fallback')
+        with instrument.stage('score'):
+            starts, ends = indptr[cols], indptr[cols+1]
+            lengths = ends - starts
+            positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            scores = np.bincount(self.matrix.indices[positions], weights=np.repeat(weights, lengths) * self.matrix.data[positions],
+                                 minlength=self.matrix.shape[0])[rows]
+            mask = scores > 0
+        instrument.count('scored', len(rows))
+        with instrument.stage('sort'):
+            return self.top_k(scores[mask], rows[mask], k)
+
+    top_k = Tf_Idf.top_k
@@ -1,8 +1,20 @@
 import numpy as np
-from pandas import DataFrame
+from scipy.sparse import csr_matrix, csc_matrix, issparse
 from ..document import Document
+from ..docstore import DocumentStore
+from . import boolean_query
+from .. import instrument
+import os
 import time
 
+def as_rows(boolean_output):
+    """Returns doc_id's given by boolean retrieval (list, array or range) as an int64 array"""
+
+    if isinstance(boolean_output, range):
+        # converting a range element by element is slower than scoring it
+        return np.arange(boolean_output.start, boolean_output.stop, boolean_output.step, dtype=np.int64)
+    return np.asarray(boolean_output, dtype=np.int64)
+
 class Tf_Idf():
     """
     Class used to represent Tf-Idf model
@@ -11,9 +23,25 @@ class Tf_Idf():
     ----------
     inv_index: dict
         inverted index containing words as keys and list of documents os values
+    vocab: dict
+        dictionary with words as keys and their column in the tf-idf matrix as values
+    idf_vec: numpy.array
+        idf of each word in vocab, indexed by column
+    matrix: scipy.sparse.csr_matrix
+        sparse tf-idf matrix with one row per document and one column per word
+    matrix_csc: scipy.sparse.csc_matrix
+        column major copy of matrix, used to fetch the columns of query words
+    doc_norms: numpy.array
+        euclidean norm of each document vector, indexed by row
     
     Methods
     -------
+    get_matrix(self, corpus, doc_freq, n_docs)
+        This method computes tf_idf scores and returns them as a sparse matrix
+    save_arrays(self, folderpath)
+        Saves sparse matrix, idf and norms as .npy files
+    load_arrays(cls, folderpath, mmap_mode)
+        Loads model saved with save_arrays, memory mapping the arrays
     get_dataframe(self, corpus, collection_freq)
         This method computes tf_idf scores and returns the dataframe
     term_freq(self, word, document)
@@ -26,13 +54,151 @@ class Tf_Idf():
         Returns the calculated tf-idf score
     cosine_sim(self, a, b)
         Returns the cosine or the dot product of two vectors
-    search(self, qdoc, corpus, df, boolean_output)
+    query_vector(self, qdoc)
+        Returns the columns and tf-idf scores of the query words
+    top_k(self, scores, rows, k)
+        Returns the k highest scoring rows in descending order
+    search(self, qdoc, corpus, vs_matrix, boolean_output, k)
         find documents which match query and rank them
+    query_matrix(self, queries)
+        Returns sparse tf-idf matrix of many queries
+    batch_search(self, queries, k, chunk_size)
+        Rank all documents for many queries at once
     """
 
+    # name of the model, used in cache keys (see also bm25.BM25)
+    name = 'tf-idf'
+
     def __init__(self, inv_index=list()):
         #default constructor
         self.inv_index=inv_index
+        self.vocab = dict()
+        self.idf_vec = None
+        self.matrix = None
+        self.matrix_csc = None
+        self.doc_norms = None
+
+    def get_matrix(self, corpus, doc_freq=None, n_docs=None):
+        """This method computes tf_idf scores and returns them as a sparse matrix
+
+        The matrix is built in a single pass over the word frequencies of each
+        document and idf is computed once for every word as a vector. Row i of
+        the matrix holds the tf-idf scores of corpus[i]. Norms of the document
+        vectors are precomputed here so that search does not recompute them.
+        If corpus is a DocumentStore its arrays are used directly.
+
+        When corpus is one shard of a larger collection, idf is computed from
+        doc_freq and n_docs of the whole collection, so scores are the same
+        as those of a model of the whole collection.
+
+        Parameters
+        ----------
+        corpus: list or DocumentStore
+            list containing Document class objects
+        doc_freq: numpy.array
+            no. of documents of the collection containing each word of corpus.terms
+            (DocumentStore only), counted from corpus if None
+        n_docs: int
+            no. of documents of the collection, len(corpus) if None
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            sparse matrix of shape (no. of documents, no. of words) containing tf-idf scores
+        """
+
+        start = time.time()
+        if isinstance(corpus, DocumentStore):
+            vocab = dict(corpus.term_ids)
+            indptr = corpus.offsets
+            indices = corpus.ids.astype(np.int32)
+            freqs = corpus.freqs
+        else:
+            vocab = dict()
+            indptr = [0]
+            indices = []
+            freqs = []
+            for document in corpus:
+                for word, freq in document.word_freq.items():
+                    indices.append(vocab.setdefault(word, len(vocab)))
+                    freqs.append(freq)
+                indptr.append(len(indices))
+            indices = np.array(indices, dtype=np.int32)
+            indptr = np.array(indptr, dtype=np.int64)
+
+        # every word in vocab occurs in atleast one document, so doc_freq > 0
+        if doc_freq is None:
+            doc_freq = np.bincount(indices, minlength=len(vocab))
+        idf_vec = np.log10((len(corpus) if n_docs is None else n_docs)/np.asarray(doc_freq))
+        data = (1+np.log10(np.array(freqs, dtype=np.float64))) * idf_vec[indices]
+
+        self.vocab = vocab
+        self.idf_vec = idf_vec
+        self.matrix = csr_matrix((data, indices, indptr), shape=(len(corpus), len(vocab)))
+        self.matrix_csc = self.matrix.tocsc()
+        self.doc_norms = np.sqrt(np.asarray(self.matrix.multiply(self.matrix).sum(axis=1)).ravel())
+        end = time.time()
+        print("Sparse matrix made in ", end-start)
+        return self.matrix
+
+    def save_arrays(self, folderpath):
+        """Saves sparse matrix, idf and norms as .npy files (and vocab as a text file)
+
+        Unlike a pickle, these files can be memory mapped by load_arrays, so many
+        processes can share one copy of the model through the page cache.
+
+        Parameters
+        ----------
+        folderpath: str
+            folder in which files are written
+        """
+
+        os.makedirs(folderpath, exist_ok=True)
+        arrays = {
+            'data': self.matrix.data, 'indices': self.matrix.indices, 'indptr': self.matrix.indptr,
+            'csc_data': self.matrix_csc.data, 'csc_indices': self.matrix_csc.indices, 'csc_indptr': self.matrix_csc.indptr,
+            'idf_vec': self.idf_vec, 'doc_norms': self.doc_norms,
+            'shape': np.array(self.matrix.shape, dtype=np.int64),
+        }
+        for name, arr in arrays.items():
+            np.save(os.path.join(folderpath, name + ".npy"), arr)
+        words = [None] * len(self.vocab)
+        for word, col in self.vocab.items():
+            words[col] = word
+        with open(os.path.join(folderpath, "vocab.txt"), "w", encoding="utf8") as vocab_file:
+            vocab_file.write("\n".join(words))
+
+    @classmethod
+    def load_arrays(cls, folderpath, mmap_mode='r'):
+        """Loads model saved with save_arrays, memory mapping the arrays
+
+        Parameters
+        ----------
+        folderpath: str
+            folder containing files written by save_arrays
+        mmap_mode: str
+            mmap_mode passed to numpy.load, None to read arrays into memory
+
+        Returns
+        -------
+        Tf_Idf
+            model which can be used for search (but not for building)
+        """
+
+        def load(name):
+            return np.load(os.path.join(folderpath, name + ".npy"), mmap_mode=mmap_mode)
+
+        model = cls()
+        with open(os.path.join(folderpath, "vocab.txt"), encoding="utf8") as vocab_file:
+            text = vocab_file.read()
+        words = text.split("\n") if len(text) > 0 else []
+        model.vocab = { word: col for col, word in enumerate(words) }
+        shape = tuple(load('shape').tolist())
+        model.matrix = csr_matrix((load('data'), load('indices'), load('indptr')), shape=shape, copy=False)
+        model.matrix_csc = csc_matrix((load('csc_data'), load('csc_indices'), load('csc_indptr')), shape=shape, copy=False)
+        model.idf_vec = load('idf_vec')
+        model.doc_norms = load('doc_norms')
+        return model
 
     def get_dataframe(self, corpus, collection_freq):
         """This method computes tf_idf scores and returns the dataframe
@@ -50,6 +216,9 @@ class Tf_Idf():
             dataframe containing tf-idf scores for each word in a document
         """
 
+        # pandas is only needed by this (slow) dense model, so it is imported here
+        from pandas import DataFrame
+
         start = time.time()
         df = DataFrame(index=list(collection_freq.keys()), columns=[ d.doc_id for d in corpus ])
         end = time.time()
@@ -171,7 +340,67 @@ class Tf_Idf():
         if denom==0: return 0
         return np.dot(a,b)/denom
 
-    def search(self, qdoc, corpus, vs_dataframe, boolean_output):
+    def query_vector(self, qdoc):
+        """Returns the columns and tf-idf scores of the query words
+
+        Only the words of the query are visited, words which are not in vocab
+        are dropped as they can not contribute to any score.
+
+        Parameters
+        ----------
+        qdoc: Document
+            Document object which is generated corresponding to input query
+
+        Returns
+        -------
+        tuple
+            (columns, weights) numpy arrays forming the sparse query vector
+        """
+
+        cols = []
+        freqs = []
+        for word, freq in qdoc.word_freq.items():
+            if word in self.vocab:
+                cols.append(self.vocab[word])
+                freqs.append(freq)
+        cols = np.array(cols, dtype=np.int64)
+        weights = (1+np.log10(np.array(freqs, dtype=np.float64))) * self.idf_vec[cols]
+        return cols, weights
+
+    def top_k(self, scores, rows, k=None):
+        """Returns the k highest scoring rows in descending order
+
+        np.partition is used to find the k'th highest score before sorting, so
+        only k scores are sorted. Ties keep the order in which rows were given
+        (also at the k'th score, where rows given first are kept).
+
+        Parameters
+        ----------
+        scores: numpy.array
+            score of each row
+        rows: numpy.array
+            row (doc_id) corresponding to each score
+        k: int
+            number of results to return, all rows are returned if None
+
+        Returns
+        -------
+        list
+            list of (score, row) tuples sorted according to score (descending order)
+        """
+
+        if k is not None and k < len(scores):
+            if k <= 0:
+                return []
+            kth = -np.partition(-scores, k-1)[k-1]
+            above = np.flatnonzero(scores > kth)
+            ties = np.flatnonzero(scores == kth)[:k-len(above)]
+            part = np.sort(np.concatenate([above, ties]))
+            scores, rows = scores[part], rows[part]
+        order = np.argsort(-scores, kind='stable')
+        return list(zip(scores[order].tolist(), rows[order].tolist()))
+
+    def search(self, qdoc, corpus, vs_matrix, boolean_output, k=None):
         """Find documents which match query and rank them
 
         Parameters
@@ -180,10 +409,12 @@ class Tf_Idf():
             Document object which is generated corresponding to input query
         corpus: list
             list containing Document class objects
-        vs_dataframe: pandas.DataFrame
-            dataframe containing all tf-idf scores for each word
+        vs_matrix: scipy.sparse.csr_matrix or pandas.DataFrame
+            sparse matrix from get_matrix (or dataframe from get_dataframe) containing all tf-idf scores
         boolean_output: list
             list of file_id's as given by boolean retrieval model
+        k: int
+            number of top results to return, all matching documents are returned if None
             
         Returns
         -------
@@ -191,20 +422,122 @@ class Tf_Idf():
             Ranked document list sorted according to the tf-idf value (descending order) 
         """
 
-        q_vec = np.ndarray((vs_dataframe.shape[0], ))
-        for i,word in enumerate(vs_dataframe.index):
+        res = []
+        if issparse(vs_matrix):
+            with instrument.stage('query_vector'):
+                cols, weights = self.query_vector(qdoc)
+                rows = as_rows(boolean_output)
+            if len(cols) == 0 or len(rows) == 0:
+                return res
+            with instrument.stage('score'):
+                if vs_matrix is self.matrix:
+                    matrix_csc, doc_norms = self.matrix_csc, self.doc_norms
+                else:
+                    matrix_csc = vs_matrix.tocsc()
+                    doc_norms = np.sqrt(np.asarray(vs_matrix.multiply(vs_matrix).sum(axis=1)).ravel())
+                # single sparse matrix-vector product over the columns of query words
+                dots = (matrix_csc[:, cols] @ weights)[rows]
+                denom = doc_norms[rows] * np.sqrt(np.sum(weights**2))
+                scores = np.divide(dots, denom, out=np.zeros_like(dots), where=denom>0)
+                mask = scores > 0
+            instrument.count('scored', len(rows))
+            with instrument.stage('sort'):
+                return self.top_k(scores[mask], rows[mask], k)
+
+        q_vec = np.ndarray((vs_matrix.shape[0], ))
+        for i,word in enumerate(vs_matrix.index):
             q_vec[i] = self.tf_idf(word, qdoc, corpus)
 
-        res = []
         for col in boolean_output:
-            temp = self.cosine_sim(q_vec, vs_dataframe[col])
+            temp = self.cosine_sim(q_vec, vs_matrix[col])
             if temp>0:
                 res.append((temp,col))
         
-        return sorted(res, key=lambda x: x[0], reverse=True)
+        return sorted(res, key=lambda x: x[0], reverse=True)[:k]
+
+    def query_matrix(self, queries):
+        """Returns sparse tf-idf matrix of many queries
+
+        Parameters
+        ----------
+        queries: list
+            list of query strings
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            matrix of shape (no. of queries, no. of words) containing tf-idf scores of query words
+        """
+
+        indptr = [0]
+        cols = []
+        freqs = []
+        for query in queries:
+            for word, freq in boolean_query.query_word_freq(query, self.vocab).items():
+                if word in self.vocab:
+                    cols.append(self.vocab[word])
+                    freqs.append(freq)
+            indptr.append(len(cols))
+        cols = np.array(cols, dtype=np.int32)
+        data = (1+np.log10(np.array(freqs, dtype=np.float64))) * self.idf_vec[cols]
+        return csr_matrix((data, cols, np.array(indptr, dtype=np.int64)), shape=(len(queries), len(self.vocab)))
+
+    def batch_search(self, queries, k=10, chunk_size=1000):
+        """Rank all documents for many queries at once
+
+        Queries are scored chunk_size at a time with a single sparse matrix
+        product, so memory used is bounded by the size of a chunk.
+
+        Parameters
+        ----------
+        queries: list
+            list of query strings
+        k: int
+            number of top results to return for each query, all matching documents are returned if None
+        chunk_size: int
+            number of queries scored in one matrix product
+
+        Returns
+        -------
+        list
+            for each query, list of (score, row) tuples sorted according to score (descending order)
+        """
+
+        q_matrix = self.query_matrix(queries)
+        q_norms = np.sqrt(np.asarray(q_matrix.multiply(q_matrix).sum(axis=1)).ravel())
+        res = []
+        for start in range(0, len(queries), chunk_size):
+            dots = (q_matrix[start:start+chunk_size] @ self.matrix.T).tocsr()
+            dots.sort_indices()
+            for i in range(dots.shape[0]):
+                rows = dots.indices[dots.indptr[i]:dots.indptr[i+1]].astype(np.int64)
+                denom = self.doc_norms[rows] * q_norms[start+i]
+                data = dots.data[dots.indptr[i]:dots.indptr[i+1]]
+                scores = np.divide(data, denom, out=np.zeros_like(data), where=denom>0)
+                mask = scores > 0
+                res.append(self.top_k(scores[mask], rows[mask], k))
+        return res
     
 
-def parse_query(query, corpus, vsmodel, vs_dataframe, boolean_output):
+def query_document(query, vocab):
+    """Returns Document of a query used for ranking, wildcards are replaced by the words of vocab they match
+
+    Parameters
+    ----------
+    query: str
+        input query string
+    vocab: dict
+        vocabulary of the ranking model (words as keys, see boolean_query.query_word_freq)
+
+    Returns
+    -------
+    Document
+        document having word frequencies of the query (raw_data is empty)
+    """
+
+    return Document.from_word_freq(None, boolean_query.query_word_freq(query, vocab))
+
+def parse_query(query, corpus, vsmodel, vs_matrix, boolean_output, k=None):
     """This function parses the query and returns relavent files
 
     Parameters
@@ -215,10 +548,12 @@ def parse_query(query, corpus, vsmodel, vs_dataframe, boolean_output):
         list containing Document class objects
     vsmodel: Tf_Idf
         object containing vector space model 
-    vs_dataframe: pandas.Dataframe
-        dataframe containing Tf-Idf values for each word
+    vs_matrix: scipy.sparse.csr_matrix or pandas.DataFrame
+        sparse matrix (or dataframe) containing Tf-Idf values for each word
     boolean_output: list
         list of file_id's as given by boolean retrieval model
+    k: int
+        number of top results to return, all matching documents are returned if None
 
     Returns
     -------
@@ -226,7 +561,32 @@ def parse_query(query, corpus, vsmodel, vs_dataframe, boolean_output):
         relavent documents ranked w.r.t their score
     """
 
-    q = Document(raw_data=query)
-    res = vsmodel.search(q, corpus, vs_dataframe, boolean_output)
+    q = query_document(query, vsmodel.vocab)
+    res = vsmodel.search(q, corpus, vs_matrix, boolean_output, k)
     output = [ (corpus[i].filepath, score) for score, i in res ]
-    return output
\ No newline at end of file
+    return output
+
+def parse_queries(queries, corpus, vsmodel, k=10, chunk_size=1000):
+    """This function ranks all documents for many queries at once
+
+    Parameters
+    ----------
+    queries: list
+        list of query strings
+    corpus: list
+        list containing Document class objects
+    vsmodel: Tf_Idf
+        object containing vector space model (with sparse matrix built using get_matrix)
+    k: int
+        number of top results to return for each query
+    chunk_size: int
+        number of queries scored in one matrix product
+
+    Returns
+    -------
+    list
+        for each query, relavent documents ranked w.r.t their score
+    """
+
+    res = vsmodel.batch_search(queries, k, chunk_size)
+    return [ [ (corpus[i].filepath, score) for score, i in query_res ] for query_res in res ]
@@ -0,0 +1,255 @@
+"""
+This module implements top-k retrieval over posting lists using the WAND (Weak AND) algorithm
+
+Documents are scored one at a time in increasing order of doc_id. Upper bounds
+of the query words are used to skip documents which can not enter the current
+top k, so only a part of the posting lists is actually scored.
+
+Wand ranks documents like Tf_Idf (same search method), so it can be used in
+place of it by main.py (WAND), the query cache and server.py (model=wand).
+"""
+
+import heapq
+import numpy as np
+from ..invertedindex import gallop
+from .vector_space import as_rows, query_document
+from .. import instrument
+
+# tolerance used when comparing sums of upper bounds with the threshold
+EPSILON = 1e-12
+
+def seek(cursor, doc_id):
+    """Move cursor to the first posting whose doc_id is atleast given doc_id
+
+    Parameters
+    ----------
+    cursor: list
+        [current doc_id, position, posting list, impacts, query weight, upper bound]
+    doc_id: int
+        doc_id to move to
+
+    Returns
+    -------
+    bool
+        False if the posting list got exhausted
+    """
+
+    postings = cursor[2]
+    cursor[1] = gallop(postings, doc_id, cursor[1])
+    if cursor[1] >= len(postings):
+        return False
+    cursor[0] = postings[cursor[1]]
+    return True
+
+def search(query_weights, index, k=10, candidates=None):
+    """Find the k documents with highest score using WAND
+
+    score(doc) = sum of query_weights[word] * impact(word, doc) for each query word.
+    Returns exactly the same documents as scoring every document, ties are
+    broken in favour of smaller doc_id.
+
+    Parameters
+    ----------
+    query_weights: dict
+        query words as keys and their tf-idf weights as values
+    index: InvertedIndex
+        inverted index with impacts set using InvertedIndex.set_impacts
+    k: int
+        number of top results to return, all matching documents are returned if None
+    candidates: set
+        if given, only these doc_id's are considered (eg: output of boolean retrieval)
+
+    Returns
+    -------
+    tuple
+        (list of (score, doc_id) sorted in descending order of score, dict of posting statistics)
+    """
+
+    if k is None:
+        k = float('inf')
+    cursors = []
+    total = 0
+    for word, weight in query_weights.items():
+        if word not in index or weight <= 0:
+            continue
+        postings = index[word]
+        total += len(postings)
+        cursors.append([postings[0], 0, postings, index.impacts[word], weight, weight*index.max_impact[word]])
+
+    heap = []
+    scored = 0
+    while cursors and k > 0:
+        cursors.sort(key=lambda cursor: cursor[0])
+        threshold = heap[0][0] if len(heap) >= k else 0.0
+
+        # pivot is the first cursor at which sum of upper bounds can beat the threshold
+        pivot = None
+        upper_bound = 0.0
+        for i, cursor in enumerate(cursors):
+            upper_bound += cursor[5]
+            if upper_bound + EPSILON > threshold:
+                pivot = i
+                break
+        if pivot is None:
+            break
+        pivot_doc = cursors[pivot][0]
+
+        if cursors[0][0] == pivot_doc:
+            # every cursor upto pivot is on pivot_doc, so score it fully
+            allowed = candidates is None or pivot_doc in candidates
+            score = 0.0
+            for cursor in cursors:
+                if cursor[0] != pivot_doc:
+                    break
+                if allowed:
+                    score += cursor[4] * cursor[3][cursor[1]]
+                    scored += 1
+                seek(cursor, pivot_doc+1)
+            if allowed and score > 0:
+                if len(heap) < k:
+                    heapq.heappush(heap, (score, -pivot_doc))
+                elif score > threshold:
+                    heapq.heapreplace(heap, (score, -pivot_doc))
+        else:
+            # documents before pivot_doc can not beat the threshold, skip them
+            for cursor in cursors[:pivot]:
+                seek(cursor, pivot_doc)
+
+        cursors = [ cursor for cursor in cursors if cursor[1] < len(cursor[2]) ]
+
+    res = sorted(((score, -neg_doc) for score, neg_doc in heap), key=lambda x: (-x[0], x[1]))
+    stats = {'postings': total, 'scored': scored, 'skipped': total-scored}
+    return res, stats
+
+class Wand():
+    """
+    Class used to rank documents with WAND over the impacts of an inverted index
+
+    Returns the same top k as Tf_Idf.search (cosine similarity), scoring
+    only the postings which can change the top k.
+
+    Attributes
+    ----------
+    name: str
+        name of the model, used in cache keys
+    vsmodel: Tf_Idf
+        tf-idf model whose query weights are used
+    vocab: dict
+        vocabulary of vsmodel, used to expand wildcards of queries
+    index: InvertedIndex or SnapshotIndex
+        inverted index with impacts (InvertedIndex.set_impacts, or any snapshot index)
+    matrix: scipy.sparse.csr_matrix
+        tf-idf matrix of vsmodel, unused while ranking (kept so that it can be used in place of Tf_Idf)
+    stats: dict
+        posting statistics of the last search (postings, scored and skipped)
+
+    Methods
+    -------
+    query_weights(self, qdoc)
+        Returns tf-idf weights of the query words and norm of the query vector
+    search(self, qdoc, corpus, vs_matrix, boolean_output, k)
+        find documents which match query and rank them using WAND
+    """
+
+    name = 'wand'
+
+    def __init__(self, vsmodel, index):
+        self.vsmodel = vsmodel
+        self.vocab = vsmodel.vocab
+        self.index = index
+        self.matrix = vsmodel.matrix
+        self.stats = None
+
+    def query_weights(self, qdoc):
+        """Returns tf-idf weights of the query words and norm of the query vector
+
+        Parameters
+        ----------
+        qdoc: Document
+            Document object which is generated corresponding to input query
+
+        Returns
+        -------
+        tuple
+            (dict of query words and their weights, norm of query vector)
+        """
+
+        vsmodel = self.vsmodel
+        query_weights = dict()
+        for word, freq in qdoc.word_freq.items():
+            if word in vsmodel.vocab:
+                query_weights[word] = (1+np.log10(freq)) * vsmodel.idf_vec[vsmodel.vocab[word]]
+        q_norm = np.sqrt(sum(weight**2 for weight in query_weights.values()))
+        return query_weights, q_norm
+
+    def search(self, qdoc, corpus, vs_matrix, boolean_output, k=None):
+        """Find documents which match query and rank them using WAND
+
+        Parameters
+        ----------
+        qdoc: Document
+            Document object which is generated corresponding to input query
+        corpus: list
+            list containing Document class objects
+        vs_matrix: scipy.sparse.csr_matrix
+            unused, impacts of the index are always used
+        boolean_output: list
+            list of file_id's as given by boolean retrieval model
+        k: int
+            number of top results to return, all matching documents are returned if None
+
+        Returns
+        -------
+        list
+            Ranked document list sorted according to cosine (descending order)
+        """
+
+        with instrument.stage('query_vector'):
+            query_weights, q_norm = self.query_weights(qdoc)
+            if isinstance(boolean_output, range) and boolean_output.step == 1 and boolean_output.start <= 0 \
+                    and boolean_output.stop >= self.matrix.shape[0]:
+                # every document is a candidate, no need to check them
+                candidates = None
+            else:
+                candidates = set(as_rows(boolean_output).tolist())
+        if q_norm == 0 or (candidates is not None and len(candidates) == 0):
+            self.stats = {'postings': 0, 'scored': 0, 'skipped': 0}
+            return []
+        with instrument.stage('score'):
+            res, self.stats = search(query_weights, self.index, k, candidates)
+        instrument.count('postings', self.stats['postings'])
+        instrument.count('skipped', self.stats['skipped'])
+        return [ (score/q_norm, doc_id) for score, doc_id in res ]
+
+def parse_query(query, corpus, vsmodel, index, k=10, boolean_output=None):
+    """This function parses the query and returns top k relavent files using WAND
+
+    Gives the same ranking as vector_space.parse_query (cosine similarity)
+
+    Parameters
+    ----------
+    query: str
+        input query string
+    corpus: list
+        list containing Document class objects
+    vsmodel: Tf_Idf
+        object containing vector space model
+    index: InvertedIndex
+        inverted index with impacts set using InvertedIndex.set_impacts
+    k: int
+        number of top results to return
+    boolean_output: list
+        list of file_id's as given by boolean retrieval model, all documents are considered if None
+
+    Returns
+    -------
+    tuple
+        (relavent documents ranked w.r.t their score, dict of posting statistics)
+    """
+
+    model = Wand(vsmodel, index)
+    if boolean_output is None:
+        boolean_output = range(len(corpus))
+    res = model.search(query_document(query, model.vocab), corpus, model.matrix, boolean_output, k)
+    output = [ (corpus[i].filepath, score) for score, i in res ]
+    return output, model.stats
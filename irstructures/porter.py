@@ -0,0 +1,258 @@
+"""
+This module implements the Porter stemming algorithm
+
+It gives the same stems as nltk's PorterStemmer in its default
+(NLTK_EXTENSIONS) mode, so indexes built with either stemmer are
+interchangeable, without importing nltk. Words are expected in lowercase.
+
+M. F. Porter, An algorithm for suffix stripping, Program 14(3), 1980
+"""
+
+VOWELS = frozenset('aeiou')
+
+# words which are not stemmed by the rules
+IRREGULAR_FORMS = {
+    'sky': ['sky', 'skies'],
+    'die': ['dying'],
+    'lie': ['lying'],
+    'tie': ['tying'],
+    'news': ['news'],
+    'inning': ['innings', 'inning'],
+    'outing': ['outings', 'outing'],
+    'canning': ['cannings', 'canning'],
+    'howe': ['howe'],
+    'proceed': ['proceed'],
+    'exceed': ['exceed'],
+    'succeed': ['succeed'],
+}
+
+def is_consonant(word, i):
+    """Returns True if word[i] is a consonant (y is a consonant when it follows a vowel or starts the word)"""
+
+    if word[i] in VOWELS:
+        return False
+    if word[i] == 'y':
+        return i == 0 or not is_consonant(word, i-1)
+    return True
+
+def measure(stem):
+    """Returns m of stem, the number of vowel-consonant sequences in [C](VC)^m[V]"""
+
+    m = 0
+    previous_vowel = False
+    for i in range(len(stem)):
+        consonant = is_consonant(stem, i)
+        if consonant and previous_vowel:
+            m += 1
+        previous_vowel = not consonant
+    return m
+
+def contains_vowel(stem):
+    return any(not is_consonant(stem, i) for i in range(len(stem)))
+
+def ends_double_consonant(word):
+    return len(word) >= 2 and word[-1] == word[-2] and is_consonant(word, len(word)-1)
+
+def ends_cvc(word):
+    """Returns True if word ends with consonant-vowel-consonant and last letter is not w, x or y
+
+    Two letter words which are vowel-consonant also match (nltk extension).
+    """
+
+    if len(word) >= 3:
+        return (is_consonant(word, len(word)-3) and not is_consonant(word, len(word)-2)
+                and is_consonant(word, len(word)-1) and word[-1] not in 'wxy')
+    return len(word) == 2 and not is_consonant(word, 0) and is_consonant(word, 1)
+
+def positive_measure(stem):
+    return measure(stem) > 0
+
+def measure_gt_1(stem):
+    return measure(stem) > 1
+
+def apply_rules(word, rules):
+    """Apply the first rule whose suffix matches word
+
+    Parameters
+    ----------
+    word: str
+        word to be stemmed
+    rules: list
+        (suffix, replacement, condition) tuples, condition is a function of the
+        stem (word without suffix) or None. Suffix '*d' matches a double consonant.
+
+    Returns
+    -------
+    str
+        word with suffix of matching rule replaced, if condition of that rule
+        holds. Rules after the first matching one are not tried.
+    """
+
+    for suffix, replacement, condition in rules:
+        if suffix == '*d':
+            if not ends_double_consonant(word):
+                continue
+            stem = word[:-2]
+        elif word.endswith(suffix):
+            stem = word[:len(word)-len(suffix)]
+        else:
+            continue
+        if condition is None or condition(stem):
+            return stem + replacement
+        return word
+    return word
+
+STEP1A_RULES = [('sses', 'ss', None), ('ies', 'i', None), ('ss', 'ss', None), ('s', '', None)]
+
+STEP2_RULES = [
+    ('ational', 'ate', positive_measure),
+    ('tional', 'tion', positive_measure),
+    ('enci', 'ence', positive_measure),
+    ('anci', 'ance', positive_measure),
+    ('izer', 'ize', positive_measure),
+    ('bli', 'ble', positive_measure),
+    ('alli', 'al', positive_measure),
+    ('entli', 'ent', positive_measure),
+    ('eli', 'e', positive_measure),
+    ('ousli', 'ous', positive_measure),
+    ('ization', 'ize', positive_measure),
+    ('ation', 'ate', positive_measure),
+    ('ator', 'ate', positive_measure),
+    ('alism', 'al', positive_measure),
+    ('iveness', 'ive', positive_measure),
+    ('fulness', 'ful', positive_measure),
+    ('ousness', 'ous', positive_measure),
+    ('aliti', 'al', positive_measure),
+    ('iviti', 'ive', positive_measure),
+    ('biliti', 'ble', positive_measure),
+    ('fulli', 'ful', positive_measure),
+]
+
+STEP3_RULES = [
+    ('icate', 'ic', positive_measure),
+    ('ative', '', positive_measure),
+    ('alize', 'al', positive_measure),
+    ('iciti', 'ic', positive_measure),
+    ('ical', 'ic', positive_measure),
+    ('ful', '', positive_measure),
+    ('ness', '', positive_measure),
+]
+
+STEP4_RULES = [
+    ('al', '', measure_gt_1),
+    ('ance', '', measure_gt_1),
+    ('ence', '', measure_gt_1),
+    ('er', '', measure_gt_1),
+    ('ic', '', measure_gt_1),
+    ('able', '', measure_gt_1),
+    ('ible', '', measure_gt_1),
+    ('ant', '', measure_gt_1),
+    ('ement', '', measure_gt_1),
+    ('ment', '', measure_gt_1),
+    ('ent', '', measure_gt_1),
+    ('ion', '', lambda stem: measure(stem) > 1 and stem[-1] in 'st'),
+    ('ou', '', measure_gt_1),
+    ('ism', '', measure_gt_1),
+    ('ate', '', measure_gt_1),
+    ('iti', '', measure_gt_1),
+    ('ous', '', measure_gt_1),
+    ('ive', '', measure_gt_1),
+    ('ize', '', measure_gt_1),
+]
+
+def step1a(word):
+    # 'dies' -> 'die' but 'flies' -> 'fli'
+    if word.endswith('ies') and len(word) == 4:
+        return word[:-3] + 'ie'
+    return apply_rules(word, STEP1A_RULES)
+
+def step1b(word):
+    # 'died' -> 'die' but 'spied' -> 'spi'
+    if word.endswith('ied'):
+        return word[:-3] + ('ie' if len(word) == 4 else 'i')
+    if word.endswith('eed'):
+        stem = word[:-3]
+        return stem + 'ee' if measure(stem) > 0 else word
+
+    for suffix in ('ed', 'ing'):
+        if word.endswith(suffix) and contains_vowel(word[:-len(suffix)]):
+            stem = word[:-len(suffix)]
+            break
+    else:
+        return word
+
+    return apply_rules(stem, [
+        ('at', 'ate', None),
+        ('bl', 'ble', None),
+        ('iz', 'ize', None),
+        # double consonant other than l, s or z is made single
+        ('*d', stem[-1], lambda s: stem[-1] not in 'lsz'),
+        ('', 'e', lambda s: measure(s) == 1 and ends_cvc(s)),
+    ])
+
+def step1c(word):
+    return apply_rules(word, [('y', 'i', lambda stem: len(stem) > 1 and is_consonant(stem, len(stem)-1))])
+
+def step2(word):
+    # 'alli' -> 'al' is applied first and the result goes through step 2 again
+    if word.endswith('alli') and positive_measure(word[:-4]):
+        return step2(word[:-4] + 'al')
+    # 'l' of 'logi' is kept with the stem, so that short stems like 'geo' work
+    return apply_rules(word, STEP2_RULES + [('logi', 'log', lambda stem: positive_measure(word[:-3]))])
+
+def step3(word):
+    return apply_rules(word, STEP3_RULES)
+
+def step4(word):
+    return apply_rules(word, STEP4_RULES)
+
+def step5a(word):
+    if word.endswith('e'):
+        stem = word[:-1]
+        m = measure(stem)
+        if m > 1 or (m == 1 and not ends_cvc(stem)):
+            return stem
+    return word
+
+def step5b(word):
+    return apply_rules(word, [('ll', 'l', lambda stem: measure(word[:-1]) > 1)])
+
+
+class PorterStemmer:
+    """
+    Class used to stem words with the Porter algorithm (same stems as nltk's PorterStemmer)
+
+    Has the stem(word) method used by StemCache, which should be used to
+    memoize it as the algorithm is run in pure python.
+
+    Attributes
+    ----------
+    pool: dict
+        irregular words as keys and their stems as values
+    """
+
+    def __init__(self):
+        self.pool = { form: stem for stem, forms in IRREGULAR_FORMS.items() for form in forms }
+
+    def stem(self, word):
+        """Returns stem of a lowercase word
+
+        Parameters
+        ----------
+        word: str
+            word to be stemmed
+
+        Returns
+        -------
+        str
+            stem of the word
+        """
+
+        if word in self.pool:
+            return self.pool[word]
+        # words of 1 or 2 letters are not stemmed
+        if len(word) <= 2:
+            return word
+        for step in (step1a, step1b, step1c, step2, step3, step4, step5a, step5b):
+            word = step(word)
+        return word
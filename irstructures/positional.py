@@ -0,0 +1,150 @@
+"""
+This module implements the positional index used for phrase and proximity queries
+
+The positional index is a DiskInvertedIndex written with positions: along
+with the (doc_id gap, term frequency) pairs of each posting it stores the
+positions of the word in the document as variable byte encoded gaps.
+Positions are counted over all tokens of a document, including stop words
+(see Document.get_positions), and most gaps fit in one byte, so positions
+take about as much space as the postings themselves.
+
+Queries are matched in two steps, both starting from the rarest word (the
+one with the shortest posting list):
+
+    1. posting lists of all words are intersected, stopping early if the
+       intersection becomes empty
+    2. positions of the rarest word in the remaining documents are the
+       anchors, and each other word has to occur at the right distance
+       from an anchor (exactly its offset in the phrase, or within k words)
+
+Positions are compared as keys doc_id * 2^32 + position, so the positions of
+a word in all candidate documents are checked with one numpy searchsorted.
+"""
+
+from .document import Document
+from .invertedindex import DiskIndexWriter
+from array import array
+import numpy as np
+
+def write_positional_index(filepath, corpus, use_regex=False):
+    """Tokenize all documents of corpus again and write their postings with positions
+
+    Parameters
+    ----------
+    filepath: str
+        path of the index file to write
+    corpus: list
+        documents with a filepath (list of Document objects or DocumentStore),
+        doc_id's are positions in this list
+    use_regex: bool
+        passed to Document.get_positions, must be the same as used for reading the corpus
+
+    Returns
+    -------
+    dict
+        no. of words, postings and positions written
+    """
+
+    postings = dict()
+    for doc_id in range(len(corpus)):
+        with open(corpus[doc_id].filepath, encoding="utf8", errors="ignore") as file:
+            words, positions = Document.get_positions(file.read(), use_regex)
+        word_positions = dict()
+        for word, position in zip(words, positions):
+            if word in word_positions:
+                word_positions[word].append(position)
+            else:
+                word_positions[word] = [position]
+        for word, positions in word_positions.items():
+            if word not in postings:
+                postings[word] = (array('I'), array('I'), array('I'))
+            doc_ids, term_freqs, all_positions = postings[word]
+            doc_ids.append(doc_id)
+            term_freqs.append(len(positions))
+            all_positions.extend(positions)
+
+    n_positions = 0
+    with DiskIndexWriter(filepath, has_positions=True) as writer:
+        for word in sorted(postings):
+            doc_ids, term_freqs, positions = postings[word]
+            writer.add(word, doc_ids, term_freqs, positions=positions)
+            n_positions += len(positions)
+    return {'n_words': len(postings), 'n_postings': sum(len(item[0]) for item in postings.values()),
+            'n_positions': n_positions}
+
+def position_keys(index, word, doc_ids):
+    """Returns sorted keys doc_id * 2^32 + position of word in given documents
+
+    Parameters
+    ----------
+    index: DiskInvertedIndex
+        index with positions
+    word: str
+        word whose positions are required
+    doc_ids: numpy.array
+        sorted doc_id's of documents to keep
+
+    Returns
+    -------
+    numpy.array
+        int64 keys, sorted by doc_id and then position
+    """
+
+    word_doc_ids, term_freqs, positions = index.positions(word)
+    keep = np.repeat(np.isin(word_doc_ids, doc_ids, assume_unique=True), term_freqs)
+    return (np.repeat(word_doc_ids, term_freqs)[keep] << 32) | positions[keep]
+
+def match_phrase(index, words, offsets=None, slop=None):
+    """Find documents containing words of a phrase at the given distances
+
+    Parameters
+    ----------
+    index: DiskInvertedIndex
+        index with positions
+    words: list
+        words of the phrase
+    offsets: list
+        position of each word relative to the first word, consecutive if None
+    slop: int
+        if None, word i has to occur exactly offsets[i] after the first word,
+        else all words have to occur within slop words of the rarest word (in any order)
+
+    Returns
+    -------
+    array
+        sorted doc_id's of matching documents
+    """
+
+    if offsets is None:
+        offsets = list(range(len(words)))
+    if any(word not in index for word in words):
+        return array('I')
+
+    order = sorted(range(len(words)), key=lambda i: index.doc_freq(words[i]))
+    doc_ids = None
+    for i in order:
+        word_doc_ids = index.postings(words[i])[0]
+        doc_ids = word_doc_ids if doc_ids is None else np.intersect1d(doc_ids, word_doc_ids, assume_unique=True)
+        if len(doc_ids) == 0:
+            return array('I')
+
+    # keys where the phrase would start, if anchored on an occurence of the rarest word
+    anchor = order[0]
+    keys = position_keys(index, words[anchor], doc_ids)
+    if slop is None:
+        keys = keys - offsets[anchor]
+    for i in order[1:]:
+        targets = position_keys(index, words[i], doc_ids)
+        if slop is None:
+            wanted = keys + offsets[i]
+            found = np.searchsorted(targets, wanted)
+            found[found == len(targets)] = 0
+            keys = keys[targets[found] == wanted]
+        else:
+            lo = np.searchsorted(targets, keys - slop, side='left')
+            hi = np.searchsorted(targets, keys + slop, side='right')
+            # a repeated word can not be matched by the anchor itself
+            keys = keys[hi - lo > (1 if words[i] == words[anchor] else 0)]
+        if len(keys) == 0:
+            return array('I')
+    return array('I', np.unique(keys >> 32).astype(np.uint32).tobytes())
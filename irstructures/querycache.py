@@ -0,0 +1,226 @@
+"""
+This module implements caching of query results
+
+Results are cached at two levels: candidate lists given by boolean retrieval
+and ranked top k lists given by the vector space model. Keys are made from
+the parsed boolean query and the stemmed words of the query, so queries which
+differ only in case, stop words or word forms share cache entries. Both levels are bounded LRU caches
+and are cleared when generation of the index changes.
+"""
+
+from collections import OrderedDict
+from .document import Document
+from .models import boolean_query, boolean_retrieval, vector_space
+
+class LRUCache:
+    """
+    Class used to represent a bounded dictionary with least recently used (LRU) eviction
+
+    Attributes
+    ----------
+    max_size: int
+        maximum number of entries kept
+    hits: int
+        number of lookups which found their key
+    misses: int
+        number of lookups which did not find their key
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Returns value of key (default if not present) and marks it as recently used"""
+
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        """Add key with value, evicting least recently used entry if cache is full"""
+
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def info(self):
+        """Returns hit/miss statistics of the cache
+
+        Returns
+        -------
+        dict
+            hits, misses, hit_rate, size and max_size of cache
+        """
+
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits/total if total > 0 else 0.0,
+            'size': len(self.entries),
+            'max_size': self.max_size,
+        }
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class QueryCache:
+    """
+    Class used to cache boolean and ranked results of queries
+
+    Attributes
+    ----------
+    boolean_cache: LRUCache
+        stemmed query words as keys and boolean retrieval output as values
+    ranked_cache: LRUCache
+        (stemmed query, k, use_boolean, name of ranking model) as keys and ranked results as values
+    generation: int
+        generation of index for which cached results are valid
+
+    Methods
+    -------
+    key(self, query)
+        Returns normalized, stemmed form of query used in cache keys
+    boolean(self, query, corpus, index)
+        Returns (cached) output of boolean_retrieval.parse_query
+    ranked(self, query, corpus, vsmodel, vs_matrix, index, k, use_boolean)
+        Returns (cached) output of boolean retrieval followed by ranking with vsmodel
+    info(self)
+        Returns statistics of both levels of cache
+    """
+
+    def __init__(self, max_size=1024):
+        self.boolean_cache = LRUCache(max_size)
+        self.ranked_cache = LRUCache(max_size)
+        self.generation = None
+
+    def key(self, query):
+        """Returns normalized, stemmed form of query used in cache keys
+
+        Parameters
+        ----------
+        query: str
+            input query string
+
+        Returns
+        -------
+        tuple
+            (parsed boolean query, (word, frequency) pairs of stemmed words in order of their occurence)
+        """
+
+        return (repr(boolean_query.parse(query)), tuple(Document.get_word_freq(query).items()))
+
+    def check_generation(self, index):
+        """Clear cache if index changed since results were cached
+
+        Indexes which are updated in place (like SegmentedIndex) have a
+        generation attribute, others are treated as never changing.
+        """
+
+        generation = getattr(index, 'generation', 0)
+        if generation != self.generation:
+            self.invalidate()
+            self.generation = generation
+
+    def invalidate(self):
+        """Remove all cached results"""
+
+        self.boolean_cache.clear()
+        self.ranked_cache.clear()
+
+    def boolean(self, query, corpus, index, key=None, positions=None):
+        """Returns (cached) output of boolean_retrieval.parse_query
+
+        Parameters
+        ----------
+        query: str
+            input query string
+        corpus: list
+            list containing Document class objects
+        index: dict
+            inverted index containing words as keys and list of documents os values
+        key: tuple
+            key(query), computed if None
+        positions: DiskInvertedIndex
+            index with positions used to match phrases (optional)
+
+        Returns
+        -------
+        list
+            list of documents which are output of boolean retrieval
+        """
+
+        self.check_generation(index)
+        if key is None:
+            key = self.key(query)
+        output = self.boolean_cache.get(key)
+        if output is None:
+            output = boolean_retrieval.parse_query(query, corpus, index, positions)
+            self.boolean_cache.put(key, output)
+        return output
+
+    def ranked(self, query, corpus, vsmodel, vs_matrix, index, k=10, use_boolean=True, positions=None):
+        """Returns (cached) output of boolean retrieval followed by ranking with vsmodel
+
+        vsmodel can be any model with a search method and a name (Tf_Idf or
+        BM25), results of different models are cached separately.
+
+        Parameters
+        ----------
+        query: str
+            input query string
+        corpus: list
+            list containing Document class objects
+        vsmodel: Tf_Idf or BM25
+            object containing ranking model
+        vs_matrix: scipy.sparse.csr_matrix
+            sparse matrix of vsmodel (vsmodel.matrix)
+        index: dict
+            inverted index containing words as keys and list of documents os values
+        k: int
+            number of top results to return
+        use_boolean: bool
+            if False, all documents are ranked instead of boolean retrieval output
+        positions: DiskInvertedIndex
+            index with positions used to match phrases (optional)
+
+        Returns
+        -------
+        list
+            relavent documents ranked w.r.t their score
+        """
+
+        self.check_generation(index)
+        key = self.key(query)
+        ranked_key = (key, k, use_boolean, vsmodel.name)
+        output = self.ranked_cache.get(ranked_key)
+        if output is None:
+            if use_boolean:
+                boolean_output = self.boolean(query, corpus, index, key, positions)
+            else:
+                boolean_output = range(len(corpus))
+            output = vector_space.parse_query(query, corpus, vsmodel, vs_matrix, boolean_output, k)
+            self.ranked_cache.put(ranked_key, output)
+        return output
+
+    def info(self):
+        """Returns statistics of both levels of cache
+
+        Returns
+        -------
+        dict
+            LRUCache.info of boolean and ranked caches
+        """
+
+        return {'boolean': self.boolean_cache.info(), 'ranked': self.ranked_cache.info()}
@@ -0,0 +1,532 @@
+"""
+This module implements incremental maintenance of the on-disk inverted index
+
+The index is a folder of segments, each one a DiskInvertedIndex file. New and
+changed documents are indexed into a new (delta) segment, deleted documents are
+marked in a tombstone bitmap and filtered out while reading postings. Segments
+can be merged (in the background) into one, which also drops deleted postings.
+Document frequencies and document norms are recomputed lazily, only when they
+are asked for after the index has changed, so idf always reflects live documents.
+"""
+
+import contextlib
+import hashlib
+import heapq
+import os
+import pickle
+import threading
+from array import array
+from itertools import groupby
+import numpy as np
+from .document import Document, iter_files
+from .invertedindex import DiskInvertedIndex, DiskIndexWriter
+from .streaming import iter_file_documents, iter_postings, spimi_invert
+
+def file_digest(filepath):
+    """Returns md5 hex digest of contents of a file
+
+    Parameters
+    ----------
+    filepath: str
+        path to file on disk
+
+    Returns
+    -------
+    str
+        hex digest of file contents
+    """
+
+    md5 = hashlib.md5()
+    with open(filepath, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+def in_folder(filepath, folderpath):
+    """Returns True if filepath is inside folderpath
+
+    Paths are compared as absolute paths component by component, so
+    'corpus2/a.txt' is not inside 'corpus' and './corpus/a.txt' is.
+
+    Parameters
+    ----------
+    filepath: str
+        path to file on disk
+    folderpath: str
+        path to folder on disk
+
+    Returns
+    -------
+    bool
+        whether filepath is in folderpath or one of its sub folders
+    """
+
+    filepath = os.path.abspath(filepath)
+    folderpath = os.path.abspath(folderpath)
+    try:
+        return os.path.commonpath([filepath, folderpath]) == folderpath
+    except ValueError:
+        # paths on different drives (windows)
+        return False
+
+
+class SegmentedIndex:
+    """
+    Class used to represent an inverted index which can be updated without a full rebuild
+
+    Supports the same lookups as InvertedIndex (index[word], word in index), so
+    it can be used directly by boolean_retrieval.parse_query.
+
+    Attributes
+    ----------
+    folderpath: str
+        folder in which segments and manifest are stored
+    segments: list
+        list of (segment file name, DiskInvertedIndex) in increasing order of doc_id's
+    files: dict
+        path of each indexed file as keys and (doc_id, mtime, size, digest) as values
+    doc_paths: dict
+        doc_id of each live document as keys and its path as values
+    deleted: numpy.array
+        tombstone bitmap, deleted[doc_id] is True if document was deleted or changed
+    next_doc_id: int
+        doc_id given to next added document
+    generation: int
+        incremented every time the index changes (used to invalidate cached statistics)
+    analyzer: str
+        analyzer used to tokenize documents (see Document.set_analyzer)
+    readers: int
+        number of lookups currently reading segments (see reading)
+    retired: list
+        list of (segment file name, DiskInvertedIndex) replaced by a merge, closed and
+        removed once no lookup reads them
+
+    Methods
+    -------
+    refresh(self, corpus_path)
+        Index new and changed files of a folder and delete removed ones
+    reading(self)
+        Context manager giving segments which stay open until it exits
+    postings(self, word)
+        Returns live postings of word along with term frequencies
+    doc_freq(self, word)
+        Returns number of live documents containing the word
+    idf(self, word)
+        Returns idf of word computed from live documents
+    doc_norms(self)
+        Returns norms of tf-idf vectors of all documents
+    search(self, qdoc, k, boolean_output)
+        Rank live documents w.r.t cosine similarity with the query
+    merge(self)
+        Merge all segments into one, dropping deleted postings
+    merge_in_background(self)
+        Run merge in a background thread
+    close(self)
+        Close all segments
+    """
+
+    manifest_name = "manifest.pickle"
+
+    def __init__(self, folderpath):
+        """Open segmented index stored in folderpath (an empty index is created if folder has no manifest)
+
+        Parameters
+        ----------
+        folderpath: str
+            folder in which segments and manifest are stored
+        """
+
+        self.folderpath = folderpath
+        self.lock = threading.RLock()
+        self.segments = []
+        self.files = dict()
+        self.deleted = np.zeros(0, dtype=bool)
+        self.next_doc_id = 0
+        self.next_segment = 0
+        self.generation = 0
+        self.analyzer = Document.analyzer
+        self.readers = 0
+        self.retired = []
+        self.stats_generation = -1
+        self.doc_freqs = dict()
+        self.norms = None
+
+        os.makedirs(folderpath, exist_ok=True)
+        manifest_path = os.path.join(folderpath, SegmentedIndex.manifest_name)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'rb') as manifest_file:
+                manifest = pickle.load(manifest_file)
+            self.files = manifest['files']
+            self.next_doc_id = manifest['next_doc_id']
+            self.next_segment = manifest['next_segment']
+            self.generation = manifest['generation']
+            # documents added later must be tokenized like the ones already indexed
+            self.analyzer = manifest.get('analyzer', 'nltk')
+            Document.set_analyzer(self.analyzer)
+            self.deleted = np.unpackbits(manifest['deleted'], count=self.next_doc_id).astype(bool)
+            self.segments = [ (name, DiskInvertedIndex(os.path.join(folderpath, name))) for name in manifest['segments'] ]
+        self.doc_paths = { doc_id: path for path, (doc_id, mtime, size, digest) in self.files.items() }
+
+    def save(self):
+        """Write manifest of index to disk"""
+
+        manifest = {
+            'segments': [ name for name, segment in self.segments ],
+            'files': self.files,
+            'next_doc_id': self.next_doc_id,
+            'next_segment': self.next_segment,
+            'generation': self.generation,
+            'analyzer': self.analyzer,
+            'deleted': np.packbits(self.deleted),
+        }
+        manifest_path = os.path.join(self.folderpath, SegmentedIndex.manifest_name)
+        with open(manifest_path + ".tmp", 'wb') as manifest_file:
+            pickle.dump(manifest, manifest_file)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def new_segment_name(self):
+        name = f"segment_{self.next_segment}.bin"
+        self.next_segment += 1
+        return name
+
+    def delete(self, filepath):
+        """Mark document of given file as deleted
+
+        Parameters
+        ----------
+        filepath: str
+            path of an indexed file
+        """
+
+        doc_id = self.files.pop(filepath)[0]
+        del self.doc_paths[doc_id]
+        self.deleted[doc_id] = True
+
+    def refresh(self, corpus_path):
+        """Index new and changed files of a folder and delete removed ones
+
+        A file is considered changed if its mtime or size changed and the md5
+        digest of its contents is different. Changed files are deleted and
+        added again with a new doc_id. All new documents go to one new segment.
+
+        Parameters
+        ----------
+        corpus_path: str
+            path to corpus/folder containing documents on disk
+
+        Returns
+        -------
+        dict
+            number of added, changed and removed files
+        """
+
+        with self.lock:
+            seen = set()
+            to_add = []
+            changes = {'added': 0, 'changed': 0, 'removed': 0}
+            for filepath in iter_files(corpus_path):
+                seen.add(filepath)
+                stat = os.stat(filepath)
+                if filepath not in self.files:
+                    to_add.append((filepath, stat, file_digest(filepath)))
+                    changes['added'] += 1
+                    continue
+                doc_id, mtime, size, digest = self.files[filepath]
+                if stat.st_mtime == mtime and stat.st_size == size:
+                    continue
+                new_digest = file_digest(filepath)
+                if new_digest == digest:
+                    # only metadata changed, remember new mtime
+                    self.files[filepath] = (doc_id, stat.st_mtime, stat.st_size, digest)
+                    continue
+                self.delete(filepath)
+                to_add.append((filepath, stat, new_digest))
+                changes['changed'] += 1
+
+            for filepath in list(self.files):
+                if filepath not in seen and in_folder(filepath, corpus_path):
+                    self.delete(filepath)
+                    changes['removed'] += 1
+
+            if len(to_add) > 0:
+                start_doc_id = self.next_doc_id
+                name = self.new_segment_name()
+                documents = iter_file_documents([ filepath for filepath, stat, digest in to_add ], start_doc_id)
+                spimi_invert(iter_postings(documents), os.path.join(self.folderpath, name))
+                self.segments.append((name, DiskInvertedIndex(os.path.join(self.folderpath, name))))
+                for doc_id, (filepath, stat, digest) in enumerate(to_add, start_doc_id):
+                    self.files[filepath] = (doc_id, stat.st_mtime, stat.st_size, digest)
+                    self.doc_paths[doc_id] = filepath
+                self.next_doc_id += len(to_add)
+                self.deleted = np.concatenate([self.deleted, np.zeros(len(to_add), dtype=bool)])
+
+            if changes['added'] or changes['changed'] or changes['removed']:
+                self.generation += 1
+            self.save()
+            return changes
+
+    @contextlib.contextmanager
+    def reading(self):
+        """Context manager giving (segments, deleted) of the index, segments stay open until it exits
+
+        A merge replaces segments while lookups may still be reading the old
+        ones, so replaced segments are closed (and their files removed) only
+        when the last lookup reading them exits.
+
+        Yields
+        ------
+        tuple
+            (list of (segment file name, DiskInvertedIndex), tombstone bitmap)
+        """
+
+        with self.lock:
+            self.readers += 1
+            segments = list(self.segments)
+            deleted = self.deleted
+        try:
+            yield segments, deleted
+        finally:
+            with self.lock:
+                self.readers -= 1
+                if self.readers == 0:
+                    self.close_retired()
+
+    def close_retired(self):
+        # called with lock held and no readers
+        for name, segment in self.retired:
+            segment.close()
+            try:
+                os.remove(os.path.join(self.folderpath, name))
+            except OSError:
+                # file is not referred by manifest anymore
+                pass
+        self.retired = []
+
+    def postings(self, word):
+        """Returns live postings of word along with term frequencies
+
+        Parameters
+        ----------
+        word: str
+            word whose postings are required
+
+        Returns
+        -------
+        tuple
+            (sorted numpy array of doc_id's, numpy array of term frequencies), both empty if word is not present
+        """
+
+        all_doc_ids = []
+        all_freqs = []
+        with self.reading() as (segments, deleted):
+            for name, segment in segments:
+                if word in segment:
+                    doc_ids, freqs = segment.postings(word)
+                    live = ~deleted[doc_ids]
+                    all_doc_ids.append(doc_ids[live])
+                    all_freqs.append(freqs[live])
+        if len(all_doc_ids) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(all_doc_ids), np.concatenate(all_freqs)
+
+    def __getitem__(self, word):
+        doc_ids, freqs = self.postings(word)
+        if len(doc_ids) == 0:
+            raise KeyError(word)
+        return array('I', doc_ids.astype(np.uint32).tobytes())
+
+    def __contains__(self, word):
+        return self.doc_freq(word) > 0
+
+    def __len__(self):
+        return len(self.doc_paths)
+
+    def get(self, word, default=None):
+        return self[word] if word in self else default
+
+    def match(self, pattern, limit=None):
+        """Returns words of any segment matching a wildcard pattern, in sorted order
+
+        Words whose documents are all deleted may still be returned, their
+        posting lists are empty.
+
+        Parameters
+        ----------
+        pattern: str
+            word where '*' matches any run of characters
+        limit: int
+            maximum number of words returned, all matching words if None
+
+        Returns
+        -------
+        list
+            matching words
+        """
+
+        words = set()
+        with self.reading() as (segments, deleted):
+            for name, segment in segments:
+                words.update(segment.match(pattern, limit))
+        words = sorted(words)
+        return words if limit is None else words[:limit]
+
+    def check_stats(self):
+        # drop cached statistics if index changed since they were computed
+        if self.stats_generation != self.generation:
+            self.doc_freqs = dict()
+            self.norms = None
+            self.stats_generation = self.generation
+
+    def doc_freq(self, word):
+        """Returns number of live documents containing the word (cached until index changes)"""
+
+        self.check_stats()
+        if word not in self.doc_freqs:
+            self.doc_freqs[word] = len(self.postings(word)[0])
+        return self.doc_freqs[word]
+
+    def idf(self, word):
+        """Returns idf of word computed from live documents (0 if word is not present)"""
+
+        df = self.doc_freq(word)
+        if df == 0:
+            return 0
+        return np.log10(len(self.doc_paths)/df)
+
+    def doc_norms(self):
+        """Returns norms of tf-idf vectors of all documents, indexed by doc_id
+
+        Computed in one pass over all postings the first time it is called
+        after the index changes.
+
+        Returns
+        -------
+        numpy.array
+            norm of each document (0 for deleted documents)
+        """
+
+        self.check_stats()
+        if self.norms is not None:
+            return self.norms
+        norms_sq = np.zeros(self.next_doc_id)
+        with self.reading() as (segments, deleted):
+            words = heapq.merge(*[ iter(segment) for name, segment in segments ])
+            for word, _ in groupby(words):
+                doc_ids, freqs = self.postings(word)
+                if len(doc_ids) == 0:
+                    continue
+                self.doc_freqs[word] = len(doc_ids)
+                weights = (1+np.log10(freqs)) * np.log10(len(self.doc_paths)/len(doc_ids))
+                np.add.at(norms_sq, doc_ids, weights**2)
+        self.norms = np.sqrt(norms_sq)
+        return self.norms
+
+    def search(self, qdoc, k=10, boolean_output=None):
+        """Rank live documents w.r.t cosine similarity of their tf-idf vectors with the query
+
+        Parameters
+        ----------
+        qdoc: Document
+            Document object which is generated corresponding to input query
+            (see vector_space.query_document, the index can be used as its vocab)
+        k: int
+            number of top results to return, all matching documents are returned if None
+        boolean_output: list
+            list of doc_id's as given by boolean retrieval model, all live documents are ranked if None
+
+        Returns
+        -------
+        list
+            list of (score, filepath) tuples sorted according to score (descending order)
+        """
+
+        norms = self.doc_norms()
+        scores = np.zeros(len(norms))
+        q_norm_sq = 0.0
+        for word, freq in qdoc.word_freq.items():
+            doc_ids, freqs = self.postings(word)
+            if len(doc_ids) == 0:
+                continue
+            idf = np.log10(len(self.doc_paths)/len(doc_ids))
+            weight = (1+np.log10(freq)) * idf
+            q_norm_sq += weight**2
+            scores[doc_ids] += weight * (1+np.log10(freqs)) * idf
+
+        denom = norms * np.sqrt(q_norm_sq)
+        scores = np.divide(scores, denom, out=np.zeros_like(scores), where=denom>0)
+        if boolean_output is not None:
+            candidates = np.zeros(len(scores), dtype=bool)
+            candidates[np.asarray(boolean_output, dtype=np.int64)] = True
+            scores[~candidates] = 0
+        doc_ids = np.flatnonzero(scores > 0)
+        order = np.argsort(-scores[doc_ids], kind='stable')[:k]
+        return [ (float(scores[doc_id]), self.doc_paths[doc_id]) for doc_id in doc_ids[order] ]
+
+    def merge(self):
+        """Merge all current segments into one, dropping deleted postings
+
+        Segments added while merging are kept as they are. doc_id's do not
+        change, so the tombstone bitmap stays valid. Merged segments are
+        closed and their files removed once no lookup reads them.
+        """
+
+        with self.reading() as (segments, deleted):
+            if len(segments) < 2 and not deleted.any():
+                return
+            deleted = deleted.copy()
+            with self.lock:
+                name = self.new_segment_name()
+
+            path = os.path.join(self.folderpath, name)
+            words = heapq.merge(*[ iter(segment) for _, segment in segments ])
+            with DiskIndexWriter(path) as writer:
+                for word, _ in groupby(words):
+                    all_doc_ids = []
+                    all_freqs = []
+                    for _, segment in segments:
+                        if word in segment:
+                            doc_ids, freqs = segment.postings(word)
+                            live = ~deleted[doc_ids]
+                            all_doc_ids.append(doc_ids[live])
+                            all_freqs.append(freqs[live])
+                    doc_ids = np.concatenate(all_doc_ids)
+                    if len(doc_ids) > 0:
+                        writer.add(word, doc_ids, np.concatenate(all_freqs))
+
+            merged = DiskInvertedIndex(path)
+            with self.lock:
+                merged_names = set(name for name, _ in segments)
+                self.segments = [(name, merged)] + [ segment for segment in self.segments if segment[0] not in merged_names ]
+                self.retired.extend(segments)
+                self.generation += 1
+                self.save()
+
+    def merge_in_background(self):
+        """Run merge in a background thread, searches keep using old segments until it finishes
+
+        Returns
+        -------
+        threading.Thread
+            thread running the merge
+        """
+
+        thread = threading.Thread(target=self.merge, daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        """Close all segments (wait for a running merge before calling it)"""
+
+        with self.lock:
+            self.retired.extend(self.segments)
+            self.segments = []
+            for name, segment in self.retired:
+                segment.close()
+            self.retired = []
+
+
+if __name__ == "__main__":
+    import sys
+    index = SegmentedIndex(sys.argv[2] if len(sys.argv) > 2 else "segments")
+    print(index.refresh(sys.argv[1] if len(sys.argv) > 1 else "corpus"))
+    print(len(index.segments), "segments,", len(index), "documents")
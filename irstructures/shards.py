@@ -0,0 +1,367 @@
+"""
+This module implements a sharded index served by one worker process per shard
+
+Documents are partitioned by doc_id into contiguous ranges and every range
+(shard) is written as its own snapshot (see irstructures.snapshot), along
+with an optional positional index. Idf and the average length of documents
+are computed from statistics of the whole collection (see collection_stats)
+and not from the shard. Every shard keeps the whole vocabulary, including
+words which do not occur in its documents, so the tf-idf vector of a query
+(and its norm) is the same on every shard and scores given by a shard are
+the same as those of an index of the whole collection.
+
+A query is sent to every shard (scatter), each worker process runs boolean
+retrieval and ranking on its own shard and returns its top k, and the sorted
+partial results are merged with a heap (gather). Shards are searched in
+parallel, so both the size of corpus and the CPU time of a query are split
+across processes. Only local processes (multiprocessing pipes) are used.
+
+    shards/
+        shards.json          manifest: no. of shards, first doc_id of each shard, analyzer
+        shard_0.snap         snapshot of documents bounds[0] to bounds[1]-1
+        shard_0.pos.idx      positional index of shard 0 (optional)
+        ...
+"""
+
+from .document import Document
+from .snapshot import Snapshot, write_snapshot
+from .invertedindex import DiskInvertedIndex
+from .positional import write_positional_index
+from .models import boolean_retrieval
+from .models.vector_space import query_document
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import multiprocessing
+import numpy as np
+import bisect
+import heapq
+import json
+import os
+
+def collection_stats(corpus):
+    """Returns statistics of a collection used to score documents of its shards
+
+    Parameters
+    ----------
+    corpus: DocumentStore
+        all documents of the collection
+
+    Returns
+    -------
+    dict
+        n_docs, avg_length (no. of words in a document, on average) and
+        doc_freq (no. of documents containing each word of corpus.terms)
+    """
+
+    n_docs = len(corpus)
+    return {
+        'n_docs': n_docs,
+        'avg_length': float(corpus.freqs.sum()) / n_docs if n_docs > 0 else 0.0,
+        'doc_freq': np.bincount(corpus.ids, minlength=len(corpus.terms)),
+    }
+
+def shard_bounds(n_docs, n_shards):
+    """Returns first doc_id of each shard and n_docs, splitting documents into n_shards (nearly) equal ranges"""
+
+    return [ (n_docs * i) // n_shards for i in range(n_shards + 1) ]
+
+def build_shard(folderpath, shard_id, store, collection, positions=False):
+    """Write snapshot (and positional index) of one shard, returns statistics of the snapshot"""
+
+    stats = write_snapshot(os.path.join(folderpath, f"shard_{shard_id}.snap"), store, collection)
+    if positions:
+        write_positional_index(os.path.join(folderpath, f"shard_{shard_id}.pos.idx"), store)
+    return stats
+
+def write_shards(folderpath, corpus, n_shards, positions=False, n_jobs=None):
+    """Partition corpus by doc_id and write every shard in parallel
+
+    Parameters
+    ----------
+    folderpath: str
+        folder in which shards and manifest are written
+    corpus: DocumentStore
+        all documents, doc_id's of the sharded index are positions in corpus
+    n_shards: int
+        number of shards
+    positions: bool
+        also write a positional index of every shard (for phrase queries)
+    n_jobs: int
+        number of processes used to build shards, n_shards if None
+
+    Returns
+    -------
+    dict
+        manifest of the sharded index
+    """
+
+    os.makedirs(folderpath, exist_ok=True)
+    collection = collection_stats(corpus)
+    bounds = shard_bounds(len(corpus), n_shards)
+    futures = []
+    with ProcessPoolExecutor(max_workers=n_jobs or n_shards) as executor:
+        for shard_id in range(n_shards):
+            store = corpus.subset(bounds[shard_id], bounds[shard_id+1])
+            futures.append(executor.submit(build_shard, folderpath, shard_id, store, collection, positions))
+        shard_stats = [ future.result() for future in futures ]
+
+    manifest = {
+        'n_shards': n_shards,
+        'bounds': bounds,
+        'n_docs': len(corpus),
+        'n_postings': sum(stats['n_postings'] for stats in shard_stats),
+        'analyzer': Document.analyzer,
+    }
+    manifest_path = os.path.join(folderpath, ShardedIndex.manifest_name)
+    with open(manifest_path + ".tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return manifest
+
+def shard_worker(folderpath, shard_id, offset, conn):
+    """Main loop of the worker process serving one shard
+
+    Requests (method, args) are received on conn and answered with
+    ('ok', result) or ('error', message), doc_id's in results are global
+    (doc_id in shard + offset). A request of None stops the worker.
+    """
+
+    snapshot = Snapshot(os.path.join(folderpath, f"shard_{shard_id}.snap"))
+    Document.set_analyzer(snapshot.analyzer)
+    positions_path = os.path.join(folderpath, f"shard_{shard_id}.pos.idx")
+    positions = DiskInvertedIndex(positions_path) if os.path.exists(positions_path) else None
+    if Document.analyzer == 'nltk':
+        Document.load_nltk()
+    models = {'tf-idf': snapshot.vsmodel, 'bm25': snapshot.bm25}
+    conn.send(('ok', len(snapshot.corpus)))
+
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        method, args = request
+        try:
+            if method == 'boolean':
+                query, = args
+                output = boolean_retrieval.parse_query(query, snapshot.corpus, snapshot.index, positions)
+                result = [ doc_id + offset for doc_id in output ]
+            elif method == 'search':
+                query, k, model, use_boolean = args
+                if use_boolean:
+                    boolean_output = boolean_retrieval.parse_query(query, snapshot.corpus, snapshot.index, positions)
+                else:
+                    boolean_output = range(len(snapshot.corpus))
+                output = models[model].search(query_document(query, models[model].vocab), snapshot.corpus, models[model].matrix, boolean_output, k)
+                result = [ (score, doc_id + offset) for score, doc_id in output ]
+            else:
+                raise Exception(f"unknown method '{method}'")
+            conn.send(('ok', result))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+
+    # arrays of the models view the memory map of the snapshot
+    models.clear()
+    if positions is not None:
+        positions.close()
+    snapshot.close()
+    conn.close()
+
+
+class ShardedIndex:
+    """
+    Class used to search a sharded index written by write_shards
+
+    One worker process is started for every shard, each memory maps only
+    its own snapshot. Queries are sent to all workers before waiting for
+    any of them, so shards are searched in parallel.
+
+    Attributes
+    ----------
+    folderpath: str
+        folder containing shards and manifest
+    manifest: dict
+        no. of shards, first doc_id of each shard (bounds), no. of documents and analyzer
+    snapshots: list
+        snapshot of every shard opened in this process, used to map doc_id's to file paths
+    workers: list
+        (process, connection) of every shard
+
+    Methods
+    -------
+    boolean(self, query)
+        Returns doc_id's given by boolean retrieval on all shards
+    search(self, query, k, model, use_boolean)
+        Returns top k (score, doc_id) over all shards
+    filepath(self, doc_id)
+        Returns path of document
+    close(self)
+        Stop worker processes
+    """
+
+    manifest_name = "shards.json"
+
+    def __init__(self, folderpath):
+        """Open sharded index and start a worker process for every shard
+
+        Parameters
+        ----------
+        folderpath: str
+            folder containing shards and manifest written by write_shards
+        """
+
+        self.folderpath = folderpath
+        with open(os.path.join(folderpath, ShardedIndex.manifest_name)) as manifest_file:
+            self.manifest = json.load(manifest_file)
+        Document.set_analyzer(self.manifest['analyzer'])
+        bounds = self.manifest['bounds']
+        self.snapshots = [ Snapshot(os.path.join(folderpath, f"shard_{shard_id}.snap"))
+                       for shard_id in range(self.manifest['n_shards']) ]
+        self.workers = []
+        for shard_id in range(self.manifest['n_shards']):
+            conn, worker_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=shard_worker, args=(folderpath, shard_id, bounds[shard_id], worker_conn), daemon=True)
+            process.start()
+            worker_conn.close()
+            self.workers.append((process, conn))
+        # wait till every shard is opened
+        self.gather()
+
+    def scatter(self, method, *args):
+        """Send request to every worker"""
+
+        for process, conn in self.workers:
+            conn.send((method, args))
+
+    def gather(self):
+        """Returns result of every worker, in order of shards"""
+
+        results = []
+        errors = []
+        for process, conn in self.workers:
+            try:
+                status, result = conn.recv()
+            except EOFError:
+                status, result = 'error', f"worker {process.pid} exited with code {process.exitcode}"
+            if status == 'ok':
+                results.append(result)
+            else:
+                errors.append(result)
+        if len(errors) > 0:
+            raise Exception("shard failed: " + "; ".join(errors))
+        return results
+
+    def boolean(self, query):
+        """Returns doc_id's given by boolean retrieval on all shards
+
+        Parameters
+        ----------
+        query: str
+            input query string
+
+        Returns
+        -------
+        list
+            sorted list of doc_id's
+        """
+
+        self.scatter('boolean', query)
+        # shards hold increasing ranges of doc_id's, so joining sorted outputs keeps them sorted
+        return [ doc_id for output in self.gather() for doc_id in output ]
+
+    def search(self, query, k=10, model='tf-idf', use_boolean=True):
+        """Returns top k (score, doc_id) over all shards
+
+        Each shard returns its own top k, sorted, and these are merged with a
+        heap. Ties are broken by doc_id, as shards are merged in order.
+
+        Parameters
+        ----------
+        query: str
+            input query string
+        k: int
+            number of top results to return, all matching documents are returned if None
+        model: str
+            ranking model, 'tf-idf' or 'bm25'
+        use_boolean: bool
+            if False, all documents are ranked instead of boolean retrieval output
+
+        Returns
+        -------
+        list
+            list of (score, doc_id) tuples sorted according to score (descending order)
+        """
+
+        self.scatter('search', query, k, model, use_boolean)
+        merged = heapq.merge(*self.gather(), key=lambda item: -item[0])
+        return list(merged if k is None else islice(merged, k))
+
+    def filepath(self, doc_id):
+        """Returns path of document"""
+
+        shard_id = bisect.bisect_right(self.manifest['bounds'], doc_id) - 1
+        return self.snapshots[shard_id].corpus.paths[doc_id - self.manifest['bounds'][shard_id]]
+
+    def close(self):
+        """Stop worker processes and close snapshots"""
+
+        for process, conn in self.workers:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process, conn in self.workers:
+            process.join()
+            conn.close()
+        for snapshot in self.snapshots:
+            snapshot.close()
+        self.workers = []
+        self.snapshots = []
+
+    def __len__(self):
+        return self.manifest['n_docs']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def parse_query(query, sharded, k=10, model='tf-idf', use_boolean=True):
+    """This function ranks documents of a sharded index for a query and returns relavent files
+
+    Parameters
+    ----------
+    query: str
+        input query string
+    sharded: ShardedIndex
+        sharded index to search
+    k: int
+        number of top results to return
+    model: str
+        ranking model, 'tf-idf' or 'bm25'
+    use_boolean: bool
+        if False, all documents are ranked instead of boolean retrieval output
+
+    Returns
+    -------
+    list
+        relavent documents ranked w.r.t their score
+    """
+
+    return [ (sharded.filepath(doc_id), score) for score, doc_id in sharded.search(query, k, model, use_boolean) ]
+
+if __name__ == "__main__":
+    import sys
+    from .document import read_corpus
+    from .docstore import DocumentStore
+    corpus_path = sys.argv[1] if len(sys.argv) > 1 else "corpus"
+    folderpath = sys.argv[2] if len(sys.argv) > 2 else "shards"
+    n_shards = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+    if not os.path.exists(os.path.join(folderpath, ShardedIndex.manifest_name)):
+        Document.set_analyzer('builtin')
+        print(write_shards(folderpath, DocumentStore.from_corpus(read_corpus(corpus_path, n_jobs=os.cpu_count())), n_shards))
+    with ShardedIndex(folderpath) as sharded:
+        for query in sys.stdin:
+            for file, score in parse_query(query.strip(), sharded):
+                print(file, "\t", score)
+            print()
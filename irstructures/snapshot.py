@@ -0,0 +1,400 @@
+"""
+This module implements a single file snapshot of a built index, which opens in constant time
+
+Loading pickles costs time proportional to the size of the model: every
+object is rebuilt before the first query can run. A snapshot is one versioned
+file holding a small json header (statistics and a table of sections)
+followed by flat arrays: the tf-idf matrix in row and column major form,
+idf, document norms, term frequencies, the BM25 model (weights of
+postings in column major order, idf and document lengths) and the sorted vocabulary and paths as
+string tables. Opening it only parses the header and memory maps the arrays,
+pages are read from disk when a query touches them and are shared by every
+process which opens the same file.
+
+Columns of the matrix are in sorted order of words, so words are found by a
+binary search over the string table instead of building a dictionary. The
+posting list of a word is the list of rows of its matrix column, so no
+separate inverted index is stored.
+"""
+
+from .document import Document
+from .docstore import DocumentStore, encode_strings
+from .models.vector_space import Tf_Idf
+from .models.bm25 import BM25
+from .termdict import SortedTerms
+from array import array
+from scipy.sparse import csr_matrix, csc_matrix
+import numpy as np
+import json
+import mmap
+import os
+import struct
+import time
+
+class StringTable:
+    """
+    Read only list of strings stored as a utf8 blob and offsets (see docstore.encode_strings)
+
+    Strings are decoded when they are accessed, so creating a table is free.
+
+    Attributes
+    ----------
+    blob: numpy.array
+        bytes of all strings, one after another
+    offsets: numpy.array
+        offsets of each string in blob, length is no. of strings + 1
+    """
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def raw(self, i):
+        """Returns utf8 bytes of i'th string"""
+
+        return self.blob[self.offsets[i]:self.offsets[i+1]].tobytes()
+
+    def __getitem__(self, i):
+        if i < 0 or i >= len(self):
+            raise IndexError(i)
+        return self.raw(i).decode('utf8')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.raw(i).decode('utf8')
+
+
+class SortedVocab(SortedTerms):
+    """
+    Read only mapping of words to their position in a sorted StringTable
+
+    Supports the lookups done on Tf_Idf.vocab and DocumentStore.term_ids:
+    vocab[word], word in vocab, vocab.get(word), len(vocab), iteration over
+    words, along with prefix and wildcard lookups (see termdict.SortedTerms).
+
+    Attributes
+    ----------
+    words: StringTable
+        words in sorted order (utf8 byte order, which is the same as str order)
+    """
+
+    def __init__(self, words):
+        self.words = words
+
+    def lower_bound(self, key):
+        lo, hi = 0, len(self.words)
+        while lo < hi:
+            mid = (lo+hi)//2
+            if self.words.raw(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def raw(self, i):
+        return self.words.raw(i)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __iter__(self):
+        return iter(self.words)
+
+
+class SnapshotIndex:
+    """
+    Inverted index read from the column major tf-idf matrix of a snapshot
+
+    Posting list of a word is the (sorted) rows of its column. Supports the
+    same lookups as InvertedIndex, including impacts and max_impact used by WAND.
+
+    Attributes
+    ----------
+    vocab: SortedVocab
+        words as keys and their column as values
+    matrix_csc: scipy.sparse.csc_matrix
+        tf-idf matrix in column major form
+    doc_norms: numpy.array
+        euclidean norm of each document vector
+    impacts: SnapshotImpacts
+        words as keys and array of impact scores (tf-idf / norm of document) as values
+    max_impact: SnapshotImpacts
+        words as keys and upper bound of their impact scores as values
+    """
+
+    def __init__(self, vocab, matrix_csc, doc_norms, max_impact):
+        self.vocab = vocab
+        self.matrix_csc = matrix_csc
+        self.doc_norms = doc_norms
+        self.impacts = SnapshotImpacts(self)
+        self.max_impact = SnapshotImpacts(self, max_impact)
+
+    def column(self, word):
+        """Returns (start, end) of the column of word in csc indices and data"""
+
+        col = self.vocab[word]
+        indptr = self.matrix_csc.indptr
+        return int(indptr[col]), int(indptr[col+1])
+
+    def match(self, pattern, limit=None):
+        """Returns words matching a wildcard pattern (see termdict.SortedTerms.match)"""
+
+        return self.vocab.match(pattern, limit)
+
+    def doc_freq(self, word):
+        """Returns the count of all the documents in which the word occurs (0 if word is not present)"""
+
+        if word not in self.vocab:
+            return 0
+        start, end = self.column(word)
+        return end - start
+
+    def __getitem__(self, word):
+        start, end = self.column(word)
+        return array('I', self.matrix_csc.indices[start:end].astype(np.uint32).tobytes())
+
+    def __contains__(self, word):
+        return word in self.vocab
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def __iter__(self):
+        return iter(self.vocab)
+
+    def keys(self):
+        return iter(self.vocab)
+
+    def items(self):
+        for word in self:
+            yield word, self[word]
+
+    def get(self, word, default=None):
+        return self[word] if word in self else default
+
+
+class SnapshotImpacts:
+    """
+    Read only mapping of words to their impacts (or upper bound of impacts) in a SnapshotIndex
+
+    Impacts are computed from the column of the word when it is looked up,
+    upper bounds are stored in the snapshot.
+    """
+
+    def __init__(self, index, max_impact=None):
+        self.index = index
+        self.values = max_impact
+
+    def __getitem__(self, word):
+        if self.values is not None:
+            return float(self.values[self.index.vocab[word]])
+        start, end = self.index.column(word)
+        rows = self.index.matrix_csc.indices[start:end]
+        norms = self.index.doc_norms[rows]
+        return np.divide(self.index.matrix_csc.data[start:end], norms, out=np.zeros(end-start), where=norms>0)
+
+    def __contains__(self, word):
+        return word in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+
+def write_snapshot(filepath, corpus, collection=None):
+    """Build tf-idf model of corpus and write it as a snapshot file
+
+    Terms of corpus are sorted first (see DocumentStore.sort_terms). The file
+    is written next to filepath and then renamed, so a snapshot which is
+    being read (eg: by a server) is never seen half written.
+
+    Parameters
+    ----------
+    filepath: str
+        path of the file to write
+    corpus: DocumentStore
+        documents to be indexed, doc_id's in snapshot are positions in corpus
+    collection: dict
+        statistics of the whole collection when corpus is one shard of it
+        (see shards.collection_stats, doc_freq is aligned with corpus.terms),
+        idf and average length of documents are computed from them
+
+    Returns
+    -------
+    dict
+        statistics stored in header of the snapshot
+    """
+
+    store = corpus.sort_terms()
+    doc_freq = n_docs = avg_length = None
+    if collection is not None:
+        doc_freq = collection['doc_freq'][[ corpus.term_ids[term] for term in store.terms ]]
+        n_docs, avg_length = collection['n_docs'], collection['avg_length']
+    vsmodel = Tf_Idf()
+    matrix = vsmodel.get_matrix(store, doc_freq, n_docs)
+    csc = vsmodel.matrix_csc
+    # postings of BM25 have the same sparsity pattern (and order) as matrix_csc, only their weights are stored
+    bm25 = BM25()
+    bm25.set_matrix(csr_matrix((store.freqs, matrix.indices, matrix.indptr), shape=matrix.shape), doc_freq, n_docs, avg_length)
+    impacts = np.divide(csc.data, vsmodel.doc_norms[csc.indices], out=np.zeros(csc.nnz),
+                        where=vsmodel.doc_norms[csc.indices]>0)
+    max_impact = np.zeros(csc.shape[1])
+    # columns of words which do not occur in a shard (see shards) are empty
+    nonempty = np.diff(csc.indptr) > 0
+    if csc.nnz > 0:
+        max_impact[nonempty] = np.maximum.reduceat(impacts, csc.indptr[:-1][nonempty])
+    words_blob, words_offsets = encode_strings(store.terms)
+    paths_blob, paths_offsets = encode_strings(store.paths)
+
+    # indices and indptr of a scipy matrix must have the same dtype
+    index_dtype = '<i4' if matrix.nnz < 2**31 else '<i8'
+    sections = [
+        ('indptr', index_dtype, matrix.indptr), ('indices', index_dtype, matrix.indices),
+        ('data', '<f8', matrix.data), ('freqs', '<u4', store.freqs),
+        ('csc_indptr', index_dtype, csc.indptr), ('csc_indices', index_dtype, csc.indices),
+        ('csc_data', '<f8', csc.data), ('bm25_weights', '<f8', bm25.weights_csc.data),
+        ('idf_vec', '<f8', vsmodel.idf_vec), ('doc_norms', '<f8', vsmodel.doc_norms),
+        ('max_impact', '<f8', max_impact),
+        ('bm25_idf', '<f8', bm25.idf_vec), ('doc_lengths', '<f8', bm25.doc_lengths),
+        ('words_blob', '<u1', words_blob), ('words_offsets', '<i8', words_offsets),
+        ('paths_blob', '<u1', paths_blob), ('paths_offsets', '<i8', paths_offsets),
+    ]
+    stats = {
+        'n_docs': len(store),
+        'n_words': len(store.terms),
+        'n_postings': int(matrix.nnz),
+        'n_tokens': int(store.freqs.sum()),
+        'avg_length': bm25.avg_length,
+        # no. of documents from which idf was computed (more than n_docs for a shard)
+        'collection_docs': len(store) if n_docs is None else n_docs,
+        'created': time.time(),
+        # queries must be analyzed in the same way as the documents
+        'analyzer': Document.analyzer,
+    }
+
+    # offsets of sections are relative to the end of the header, aligned to Snapshot.alignment
+    table = dict()
+    offset = 0
+    for name, dtype, arr in sections:
+        table[name] = [offset, dtype, len(arr)]
+        offset += -(-len(arr)*np.dtype(dtype).itemsize // Snapshot.alignment) * Snapshot.alignment
+    header = json.dumps({'stats': stats, 'sections': table}).encode('utf8')
+    start = -(-(struct.calcsize(Snapshot.header_format) + len(header)) // Snapshot.alignment) * Snapshot.alignment
+
+    tmp_path = filepath + ".tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(struct.pack(Snapshot.header_format, Snapshot.magic, Snapshot.version, start, len(header)))
+        file.write(header)
+        for name, dtype, arr in sections:
+            file.seek(start + table[name][0])
+            file.write(np.ascontiguousarray(arr, dtype=dtype).tobytes())
+        file.truncate(start + offset)
+    os.replace(tmp_path, filepath)
+    return stats
+
+
+class Snapshot:
+    """
+    Class used to open a snapshot written by write_snapshot
+
+    The file is memory mapped and the header is parsed, nothing else is
+    read, so opening takes the same time for any size of corpus. Opening
+    does not change the analyzer, callers select the one used to build the
+    snapshot (Document.set_analyzer(snapshot.analyzer)) before parsing queries.
+
+    Attributes
+    ----------
+    filepath: str
+        path to snapshot file on disk
+    stats: dict
+        no. of documents, words, postings and tokens of the indexed corpus and the analyzer used
+    analyzer: str
+        analyzer used to build the snapshot (see Document.set_analyzer)
+    corpus: DocumentStore
+        word frequencies and paths of documents
+    vsmodel: Tf_Idf
+        tf-idf model (with sparse matrices, idf and norms) which can be used for search
+    bm25: BM25
+        BM25 model with default parameters sharing the vocabulary and sparsity
+        pattern of vsmodel (None for snapshots written before BM25 was added)
+    index: SnapshotIndex
+        inverted index which can be used for boolean retrieval and WAND
+
+    Methods
+    -------
+    close(self)
+        Close the memory map and the underlying file
+    """
+
+    magic = b'IRSNAP'
+    version = 1
+    # magic, version, offset of first section, length of json header
+    header_format = '<6sHQQ'
+    alignment = 64
+
+    def __init__(self, filepath):
+        """Open and memory map a snapshot file
+
+        Parameters
+        ----------
+        filepath: str
+            path to snapshot file on disk
+        """
+
+        self.filepath = filepath
+        self.file = open(filepath, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, start, header_len = struct.unpack_from(Snapshot.header_format, self.mm, 0)
+        if magic != Snapshot.magic or version != Snapshot.version:
+            raise Exception(f"'{filepath}' is not a version {Snapshot.version} snapshot file")
+        header_start = struct.calcsize(Snapshot.header_format)
+        header = json.loads(self.mm[header_start:header_start+header_len].decode('utf8'))
+        self.stats = header['stats']
+        # snapshots written before analyzers could be selected were built with nltk
+        self.analyzer = self.stats.get('analyzer', 'nltk')
+
+        def section(name):
+            offset, dtype, count = header['sections'][name]
+            return np.frombuffer(self.mm, dtype=dtype, count=count, offset=start+offset)
+
+        shape = (self.stats['n_docs'], self.stats['n_words'])
+        words = StringTable(section('words_blob'), section('words_offsets'))
+        vocab = SortedVocab(words)
+        paths = StringTable(section('paths_blob'), section('paths_offsets'))
+
+        self.vsmodel = Tf_Idf()
+        self.vsmodel.vocab = vocab
+        self.vsmodel.idf_vec = section('idf_vec')
+        self.vsmodel.doc_norms = section('doc_norms')
+        self.vsmodel.matrix = csr_matrix((section('data'), section('indices'), section('indptr')), shape=shape, copy=False)
+        self.vsmodel.matrix_csc = csc_matrix((section('csc_data'), section('csc_indices'), section('csc_indptr')), shape=shape, copy=False)
+        self.bm25 = None
+        if 'bm25_weights' in header['sections']:
+            self.bm25 = BM25()
+            self.bm25.vocab = vocab
+            self.bm25.idf_vec = section('bm25_idf')
+            self.bm25.matrix = csr_matrix((section('freqs'), section('indices'), section('indptr')), shape=shape, copy=False)
+            self.bm25.weights_csc = csc_matrix((section('bm25_weights'), section('csc_indices'), section('csc_indptr')), shape=shape, copy=False)
+            self.bm25.doc_lengths = section('doc_lengths')
+            self.bm25.avg_length = self.stats['avg_length']
+        self.corpus = DocumentStore(words, section('indptr'), section('indices'), section('freqs'), paths, term_ids=vocab)
+        self.index = SnapshotIndex(vocab, self.vsmodel.matrix_csc, self.vsmodel.doc_norms, section('max_impact'))
+
+    def close(self):
+        """Close the memory map and the underlying file"""
+
+        # arrays viewing the memory map must be released before closing it
+        # (impacts refer back to the index, so that cycle is broken first)
+        if self.index is not None:
+            self.index.impacts = self.index.max_impact = None
+        self.vsmodel = self.bm25 = self.corpus = self.index = None
+        self.mm.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
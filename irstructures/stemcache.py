@@ -0,0 +1,186 @@
+from collections import OrderedDict, deque
+from itertools import compress
+import pickle
+
+class StemCache:
+    """
+    Class used to memoize stemming of words with least recently used (LRU) eviction
+
+    Word frequencies follow zipf's law, so a small number of words make up most
+    of the tokens. Stemming each distinct word once saves most of the stemming time.
+
+    Attributes
+    ----------
+    stemmer: object
+        stemmer with a stem(word) method (eg: nltk PorterStemmer)
+    max_size: int
+        maximum number of words kept in cache
+    hits: int
+        number of words found in cache
+    misses: int
+        number of words which had to be stemmed
+    track_added: bool
+        if True, newly stemmed words are recorded in added
+    added: list
+        (word, stem) pairs stemmed since last call to pop_added
+
+    Methods
+    -------
+    stem(self, word)
+        Returns stem of the word, using cache if possible
+    stem_words(self, words)
+        Returns stems of all words, using cache if possible
+    pop_added(self)
+        Returns and clears (word, stem) pairs stemmed since its last call
+    info(self)
+        Returns hit/miss statistics of the cache
+    save(self, filepath)
+        Saves cached words and their stems to disk
+    load(self, filepath)
+        Loads cached words and their stems from disk
+    """
+
+    def __init__(self, stemmer, max_size=100000):
+        self.stemmer = stemmer
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.track_added = False
+        self.added = []
+
+    def stem(self, word):
+        """Returns stem of the word, using cache if possible
+
+        Parameters
+        ----------
+        word: str
+            word to be stemmed
+
+        Returns
+        -------
+        str
+            stem of the word
+        """
+
+        cache = self.cache
+        if word in cache:
+            self.hits += 1
+            cache.move_to_end(word)
+            return cache[word]
+
+        self.misses += 1
+        stem = self.stemmer.stem(word)
+        cache[word] = stem
+        if self.track_added:
+            self.added.append((word, stem))
+        if len(cache) > self.max_size:
+            cache.popitem(last=False)
+        return stem
+
+    def stem_words(self, words):
+        """Returns stems of all words, using cache if possible
+
+        Same as calling stem on each word, with lookups of cached words done
+        in bulk (stemming distinct words of a document is mostly cache hits).
+
+        Parameters
+        ----------
+        words: iterable
+            words to be stemmed
+
+        Returns
+        -------
+        list
+            stem of each word
+        """
+
+        words = list(words)
+        cache = self.cache
+        # lookups and moves of cached words to the end are run by map in C
+        stems = list(map(cache.get, words))
+        deque(map(cache.move_to_end, compress(words, stems)), maxlen=0)
+        missed = stems.count(None)
+        # words found by map are hits, the others are counted by stem (a word
+        # missed twice is stemmed once and found in cache the second time)
+        self.hits += len(stems) - missed
+        if missed:
+            for i, stem in enumerate(stems):
+                if stem is None:
+                    stems[i] = self.stem(words[i])
+        return stems
+
+    def update(self, items):
+        """Add (word, stem) pairs to the cache without counting them as hits or misses
+
+        Parameters
+        ----------
+        items: iterable
+            (word, stem) pairs, least recently used first
+        """
+
+        for word, stem in items:
+            self.cache[word] = stem
+            self.cache.move_to_end(word)
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    def pop_added(self):
+        """Returns and clears (word, stem) pairs stemmed since its last call
+
+        Used to send stems computed in worker processes back to the main process.
+
+        Returns
+        -------
+        list
+            list of (word, stem) pairs
+        """
+
+        added = self.added
+        self.added = []
+        return added
+
+    def info(self):
+        """Returns hit/miss statistics of the cache
+
+        Returns
+        -------
+        dict
+            hits, misses, hit_rate, size and max_size of cache
+        """
+
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits/total if total > 0 else 0.0,
+            'size': len(self.cache),
+            'max_size': self.max_size,
+        }
+
+    def save(self, filepath):
+        """Saves cached words and their stems to disk (in LRU order)
+
+        Parameters
+        ----------
+        filepath: str
+            path of the file to write
+        """
+
+        with open(filepath, 'wb') as file:
+            pickle.dump(list(self.cache.items()), file)
+
+    def load(self, filepath):
+        """Loads cached words and their stems from disk
+
+        Parameters
+        ----------
+        filepath: str
+            path of file written by save
+        """
+
+        with open(filepath, 'rb') as file:
+            self.update(pickle.load(file))
+
+    def __len__(self):
+        return len(self.cache)
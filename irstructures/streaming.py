@@ -0,0 +1,256 @@
+"""
+This module implements a streaming pipeline to build the on-disk inverted index (SPIMI)
+
+Documents are read lazily one at a time and only their word frequencies are
+kept while they are turned into (word, doc_id, term frequency) postings.
+Postings are collected in a run of bounded size which is written to disk, sorted
+by word, whenever it is full. At the end all runs are merged into a single
+index file read by DiskInvertedIndex. Paths of documents are written, in order
+of doc_id, to a file next to the index as they are read. Peak memory depends
+on run_size and not on the size of the corpus.
+"""
+
+import codecs
+import heapq
+import pickle
+import tempfile
+from array import array
+from itertools import groupby
+from .document import Document, iter_files
+from .invertedindex import DiskIndexWriter
+
+def iter_documents(folderpath, use_regex=False, stemming=True):
+    """Generator over documents of a folder, text of a document is dropped after tokenizing
+
+    Parameters
+    ----------
+    folderpath: str
+        path to corpus/folder containing documents on disk
+    use_regex: bool
+        use wordpunct_tokenize instead of word_tokenize
+    stemming: bool
+        run porter stemmer on words
+
+    Yields
+    ------
+    tuple
+        (doc_id, filepath, word_freq) where doc_id's are 0, 1, 2, ... in order of files
+    """
+
+    return iter_file_documents(iter_files(folderpath), 0, use_regex, stemming)
+
+def iter_file_documents(filepaths, start_doc_id=0, use_regex=False, stemming=True):
+    """Generator over documents of given files, text of a document is dropped after tokenizing
+
+    Parameters
+    ----------
+    filepaths: iterable
+        paths to files on disk
+    start_doc_id: int
+        doc_id of first file, following files get consecutive doc_id's
+    use_regex: bool
+        use wordpunct_tokenize instead of word_tokenize
+    stemming: bool
+        run porter stemmer on words
+
+    Yields
+    ------
+    tuple
+        (doc_id, filepath, word_freq)
+    """
+
+    for doc_id, filepath in enumerate(filepaths, start_doc_id):
+        with codecs.open(filepath, 'r', encoding="utf8",errors='ignore') as file:
+            word_freq = Document.get_word_freq(file.read(), use_regex, stemming)
+        yield doc_id, filepath, word_freq
+
+def docs_path(index_path):
+    """Returns path of the file containing path of each document of an index built by build_index"""
+
+    return index_path + ".docs"
+
+def read_doc_paths(index_path):
+    """Generator over paths of documents of an index built by build_index
+
+    Parameters
+    ----------
+    index_path: str
+        path of index file
+
+    Yields
+    ------
+    str
+        path of each document, in order of doc_id
+    """
+
+    with open(docs_path(index_path), encoding="utf8", errors="surrogateescape") as file:
+        for line in file:
+            yield line.rstrip("\n")
+
+def iter_postings(documents):
+    """Generator over postings of documents
+
+    Parameters
+    ----------
+    documents: iterable
+        (doc_id, filepath, word_freq) tuples as given by iter_documents
+
+    Yields
+    ------
+    tuple
+        (word, doc_id, term frequency)
+    """
+
+    for doc_id, filepath, word_freq in documents:
+        for word, freq in word_freq.items():
+            yield word, doc_id, freq
+
+def write_run(run, tmp_dir=None):
+    """Write a run to a temporary file in sorted order of words
+
+    Parameters
+    ----------
+    run: dict
+        words as keys and (doc_ids, term_freqs) arrays as values
+    tmp_dir: str
+        folder in which temporary file is created (default temporary folder if None)
+
+    Returns
+    -------
+    file
+        temporary file containing the run, positioned at its start
+    """
+
+    file = tempfile.TemporaryFile(dir=tmp_dir)
+    for word in sorted(run):
+        doc_ids, freqs = run[word]
+        pickle.dump((word, doc_ids, freqs), file)
+    file.seek(0)
+    return file
+
+def read_run(file, run_no):
+    """Generator over records of a run written by write_run
+
+    Parameters
+    ----------
+    file: file
+        temporary file containing the run
+    run_no: int
+        position of run, used to merge postings of a word in order of doc_id
+
+    Yields
+    ------
+    tuple
+        (word, run_no, doc_ids, term_freqs)
+    """
+
+    while True:
+        try:
+            word, doc_ids, freqs = pickle.load(file)
+        except EOFError:
+            file.close()
+            return
+        yield word, run_no, doc_ids, freqs
+
+def merge_runs(runs, index_path):
+    """Merge sorted runs into a single index file
+
+    Runs hold consecutive ranges of doc_id's, so postings of a word are merged
+    by simply concatenating them in order of runs.
+
+    Parameters
+    ----------
+    runs: list
+        temporary files written by write_run, in order of doc_id
+    index_path: str
+        path of index file to write
+    """
+
+    records = heapq.merge(*[ read_run(file, run_no) for run_no, file in enumerate(runs) ],
+                          key=lambda record: (record[0], record[1]))
+    with DiskIndexWriter(index_path) as writer:
+        for word, group in groupby(records, key=lambda record: record[0]):
+            doc_ids = array('I')
+            freqs = array('I')
+            for _, _, run_doc_ids, run_freqs in group:
+                doc_ids.extend(run_doc_ids)
+                freqs.extend(run_freqs)
+            writer.add(word, doc_ids, freqs)
+
+def spimi_invert(postings, index_path, run_size=1000000, tmp_dir=None):
+    """Build index file from a stream of postings using bounded memory
+
+    Parameters
+    ----------
+    postings: iterable
+        (word, doc_id, term frequency) tuples in increasing order of doc_id
+    index_path: str
+        path of index file to write
+    run_size: int
+        maximum number of postings held in memory before a run is written to disk
+    tmp_dir: str
+        folder in which runs are written (default temporary folder if None)
+
+    Returns
+    -------
+    int
+        number of runs written
+    """
+
+    runs = []
+    run = dict()
+    count = 0
+    for word, doc_id, freq in postings:
+        if word in run:
+            doc_ids, freqs = run[word]
+            doc_ids.append(doc_id)
+            freqs.append(freq)
+        else:
+            run[word] = (array('I', [doc_id]), array('I', [freq]))
+        count += 1
+        if count >= run_size:
+            runs.append(write_run(run, tmp_dir))
+            run = dict()
+            count = 0
+    if len(run) > 0 or len(runs) == 0:
+        runs.append(write_run(run, tmp_dir))
+
+    merge_runs(runs, index_path)
+    return len(runs)
+
+def build_index(folderpath, index_path, run_size=1000000, tmp_dir=None, use_regex=False, stemming=True):
+    """Build the on-disk inverted index of a folder without keeping documents in memory
+
+    Parameters
+    ----------
+    folderpath: str
+        path to corpus/folder containing documents on disk
+    index_path: str
+        path of index file to write
+    run_size: int
+        maximum number of postings held in memory before a run is written to disk
+    tmp_dir: str
+        folder in which runs are written (default temporary folder if None)
+    use_regex: bool
+        use wordpunct_tokenize instead of word_tokenize
+    stemming: bool
+        run porter stemmer on words
+
+    Returns
+    -------
+    int
+        number of documents, their paths are written one per line to docs_path(index_path) (see read_doc_paths)
+    """
+
+    n_docs = 0
+    with open(docs_path(index_path), "w", encoding="utf8", errors="surrogateescape") as docs_file:
+        def documents():
+            nonlocal n_docs
+            for doc_id, filepath, word_freq in iter_documents(folderpath, use_regex, stemming):
+                docs_file.write(filepath + "\n")
+                n_docs += 1
+                yield doc_id, filepath, word_freq
+
+        n_runs = spimi_invert(iter_postings(documents()), index_path, run_size, tmp_dir)
+    print(f"{n_docs} documents indexed using {n_runs} runs")
+    return n_docs
@@ -0,0 +1,471 @@
+"""
+This module implements the term dictionary of the on-disk index, with prefix and wildcard lookup
+
+Terms are kept in sorted (utf8 byte) order, so the term id of a word is its
+position in that order and all words starting with a prefix are a range of
+term ids. TermDictionary stores them front coded: terms are grouped in
+blocks of block_size, the first term of a block is stored whole and every
+other term as the length of the prefix it shares with the previous term and
+the rest of its bytes:
+
+    block      (0, 8, "computer") (7, 3, "ing") (4, 4, "uter") ...
+    offsets    position of each block in the blob
+
+lengths are variable byte encoded (see irstructures.compression). Sorted
+words share long prefixes, so the dictionary takes a few bytes per word
+instead of the ~100 bytes of a word in a python dict. A word is found with a
+binary search over the first terms of blocks, O(log V), followed by a scan
+of one block.
+
+Wildcard patterns use '*' for any run of characters:
+
+    comput*      prefix, one range of term ids
+    comp*er      prefix range, filtered by the pattern
+    *puter       k-gram index: term ids having all k-grams of the fixed parts
+                 of '$pattern$' are intersected and then filtered by the pattern
+
+The k-gram index (KGramIndex) is only built, in memory, the first time a
+pattern starting with '*' is looked up.
+"""
+
+from abc import ABC, abstractmethod
+from array import array
+import numpy as np
+import re
+
+def vbyte_bytes(number):
+    """Returns variable byte encoding of one non negative integer (same format as compression.vbyte_encode)"""
+
+    out = bytearray()
+    while number >= 128:
+        out.append(number & 127)
+        number >>= 7
+    out.append(number | 128)
+    return bytes(out)
+
+def read_vbyte(blob, pos):
+    """Decode one variable byte encoded integer starting at pos, returns (number, position after it)"""
+
+    number = 0
+    shift = 0
+    while True:
+        byte = blob[pos]
+        pos += 1
+        number |= (byte & 127) << shift
+        if byte & 128:
+            return number, pos
+        shift += 7
+
+def wildcard_regex(pattern):
+    """Returns compiled regex matching whole words which match a pattern with '*' wildcards"""
+
+    return re.compile('.*'.join(re.escape(part) for part in pattern.split('*')), re.DOTALL)
+
+
+class SortedTerms(ABC):
+    """
+    Abstract base class of read only dictionaries of words kept in sorted order
+
+    Subclasses give lower_bound, raw (bytes of a term) and len, this class
+    gives lookups done on a dict of words (vocab[word] is the term id,
+    word in vocab, vocab.get(word), iteration) along with prefix and wildcard lookups.
+
+    Methods
+    -------
+    find(self, word)
+        Returns term id of word, -1 if not present
+    prefix_range(self, prefix)
+        Returns range of term ids of words starting with prefix
+    match(self, pattern, limit)
+        Returns words matching a wildcard pattern
+    """
+
+    kgram_size = 3
+
+    @abstractmethod
+    def lower_bound(self, key):
+        """Returns term id of the first term which is not less than key (bytes)"""
+
+    @abstractmethod
+    def raw(self, i):
+        """Returns utf8 bytes of term i"""
+
+    @abstractmethod
+    def __len__(self):
+        """Returns no. of terms"""
+
+    def word_at(self, i):
+        """Returns term i as str"""
+
+        return self.raw(i).decode('utf8')
+
+    def iter_range(self, lo, hi):
+        """Yields utf8 bytes of terms lo to hi-1"""
+
+        for i in range(lo, hi):
+            yield self.raw(i)
+
+    def find(self, word):
+        """Returns term id (position in sorted order) of word, -1 if not present
+
+        Parameters
+        ----------
+        word: str
+            word to search for
+
+        Returns
+        -------
+        int
+            term id of word, -1 if word is not present
+        """
+
+        key = word.encode('utf8')
+        i = self.lower_bound(key)
+        if i < len(self) and self.raw(i) == key:
+            return i
+        return -1
+
+    def prefix_range(self, prefix):
+        """Returns range of term ids of words starting with prefix
+
+        Parameters
+        ----------
+        prefix: str
+            prefix of words
+
+        Returns
+        -------
+        tuple
+            (lo, hi), words lo to hi-1 start with prefix
+        """
+
+        key = prefix.encode('utf8')
+        # 0xff never occurs in utf8, so key + 0xff is greater than every word starting with key
+        return self.lower_bound(key), self.lower_bound(key + b'\xff')
+
+    def kgram_index(self):
+        """Returns KGramIndex of the words, building it the first time it is needed"""
+
+        if getattr(self, 'kgrams', None) is None:
+            self.kgrams = KGramIndex(self, self.kgram_size)
+        return self.kgrams
+
+    def match(self, pattern, limit=None):
+        """Returns words matching a wildcard pattern, in sorted order
+
+        Parameters
+        ----------
+        pattern: str
+            word where '*' matches any run of characters (a word without '*' matches itself)
+        limit: int
+            maximum number of words returned, all matching words if None
+
+        Returns
+        -------
+        list
+            matching words
+        """
+
+        prefix, star, rest = pattern.partition('*')
+        if not star:
+            return [pattern] if self.find(pattern) >= 0 else []
+        if prefix:
+            lo, hi = self.prefix_range(prefix)
+            if hi - lo > 0 and rest.strip('*') == "":
+                # prefix query, every word of the range matches
+                hi = hi if limit is None else min(hi, lo + limit)
+                return [ raw.decode('utf8') for raw in self.iter_range(lo, hi) ]
+            candidates = self.iter_range(lo, hi)
+        else:
+            term_ids = self.kgram_index().candidates(pattern)
+            candidates = self.iter_range(0, len(self)) if term_ids is None else self.iter_terms(term_ids)
+
+        regex = wildcard_regex(pattern)
+        words = []
+        for raw in candidates:
+            word = raw.decode('utf8')
+            if regex.fullmatch(word):
+                words.append(word)
+                if limit is not None and len(words) >= limit:
+                    break
+        return words
+
+    def iter_terms(self, term_ids):
+        """Yields utf8 bytes of each of the sorted term ids"""
+
+        for i in term_ids:
+            yield self.raw(int(i))
+
+    def __getitem__(self, word):
+        i = self.find(word)
+        if i < 0:
+            raise KeyError(word)
+        return i
+
+    def __contains__(self, word):
+        return self.find(word) >= 0
+
+    def get(self, word, default=None):
+        i = self.find(word)
+        return i if i >= 0 else default
+
+    def __iter__(self):
+        for raw in self.iter_range(0, len(self)):
+            yield raw.decode('utf8')
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        for i, word in enumerate(self):
+            yield word, i
+
+
+class TermDictionaryWriter:
+    """
+    Class used to front code sorted words one at a time (see TermDictionary)
+
+    Attributes
+    ----------
+    blob: bytearray
+        encoded blocks
+    block_offsets: array
+        position of each block in blob
+    n_terms: int
+        number of words added
+    """
+
+    def __init__(self, block_size=16):
+        self.block_size = block_size
+        self.blob = bytearray()
+        self.block_offsets = array('Q')
+        self.n_terms = 0
+        self.last = b''
+
+    def add(self, word):
+        """Add next word, greater than all words added before (str or utf8 bytes)"""
+
+        key = word.encode('utf8') if isinstance(word, str) else word
+        if self.n_terms % self.block_size == 0:
+            self.block_offsets.append(len(self.blob))
+            shared = 0
+        else:
+            last = self.last
+            shared = 0
+            n = min(len(key), len(last))
+            while shared < n and key[shared] == last[shared]:
+                shared += 1
+        self.blob += vbyte_bytes(shared)
+        self.blob += vbyte_bytes(len(key) - shared)
+        self.blob += key[shared:]
+        self.last = key
+        self.n_terms += 1
+
+    def finish(self):
+        """Returns (blob, block offsets with the end of blob appended)"""
+
+        offsets = np.zeros(len(self.block_offsets)+1, dtype='<u8')
+        offsets[:-1] = self.block_offsets
+        offsets[-1] = len(self.blob)
+        return bytes(self.blob), offsets
+
+
+class TermDictionary(SortedTerms):
+    """
+    Front coded dictionary of sorted words
+
+    The blob can be a memory map, so a dictionary stored in a file is used
+    without reading or copying it.
+
+    Attributes
+    ----------
+    blob: bytes
+        encoded blocks (or a buffer, eg: mmap, containing them at start)
+    start: int
+        position of the first block in blob
+    block_offsets: numpy.array
+        position of each block relative to start, and the end of the last block
+    n_terms: int
+        number of words
+    block_size: int
+        number of words in each block
+
+    Methods
+    -------
+    from_terms(cls, terms, block_size)
+        Front code sorted words
+    nbytes(self)
+        Returns memory used by blob and block offsets
+    """
+
+    def __init__(self, blob, block_offsets, n_terms, block_size=16, start=0):
+        self.blob = blob
+        self.start = start
+        self.block_offsets = block_offsets
+        self.n_terms = n_terms
+        self.block_size = block_size
+        self.kgrams = None
+
+    @classmethod
+    def from_terms(cls, terms, block_size=16):
+        """Front code sorted words
+
+        Parameters
+        ----------
+        terms: iterable
+            words (str or utf8 bytes) in sorted order
+        block_size: int
+            number of words in each block
+
+        Returns
+        -------
+        TermDictionary
+            dictionary of the words
+        """
+
+        writer = TermDictionaryWriter(block_size)
+        for term in terms:
+            writer.add(term)
+        blob, offsets = writer.finish()
+        return cls(blob, offsets, writer.n_terms, block_size)
+
+    def nbytes(self):
+        """Returns memory used by blob and block offsets (in bytes)"""
+
+        return int(self.block_offsets[-1]) + self.block_offsets.nbytes
+
+    def first_term(self, block):
+        """Returns utf8 bytes of the first term of a block"""
+
+        pos = self.start + int(self.block_offsets[block])
+        shared, pos = read_vbyte(self.blob, pos)
+        length, pos = read_vbyte(self.blob, pos)
+        return self.blob[pos:pos+length]
+
+    def iter_block(self, block, skip=0):
+        """Yields utf8 bytes of terms of a block, starting from its skip'th term"""
+
+        pos = self.start + int(self.block_offsets[block])
+        end = min(self.block_size, self.n_terms - block*self.block_size)
+        term = b''
+        blob = self.blob
+        for i in range(end):
+            shared, pos = read_vbyte(blob, pos)
+            length, pos = read_vbyte(blob, pos)
+            term = term[:shared] + blob[pos:pos+length]
+            pos += length
+            if i >= skip:
+                yield term
+
+    def lower_bound(self, key):
+        # last block whose first term is less than key
+        lo, hi = 0, len(self.block_offsets) - 1
+        while lo < hi:
+            mid = (lo+hi)//2
+            if self.first_term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return 0
+        block = lo - 1
+        for i, term in enumerate(self.iter_block(block)):
+            if term >= key:
+                return block*self.block_size + i
+        return min(lo*self.block_size, self.n_terms)
+
+    def raw(self, i):
+        if i < 0 or i >= self.n_terms:
+            raise IndexError(i)
+        return next(self.iter_block(i // self.block_size, i % self.block_size))
+
+    def iter_range(self, lo, hi):
+        if lo >= hi:
+            return
+        block, skip = divmod(lo, self.block_size)
+        remaining = hi - lo
+        while remaining > 0:
+            for term in self.iter_block(block, skip):
+                yield term
+                remaining -= 1
+                if remaining == 0:
+                    return
+            block += 1
+            skip = 0
+
+    def iter_terms(self, term_ids):
+        # every block is decoded once, however many of its terms are wanted
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        blocks = term_ids // self.block_size
+        for block in np.unique(blocks).tolist():
+            wanted = set((term_ids[blocks == block] % self.block_size).tolist())
+            for i, term in enumerate(self.iter_block(block)):
+                if i in wanted:
+                    yield term
+
+    def __len__(self):
+        return self.n_terms
+
+
+class KGramIndex:
+    """
+    Class used to find words matching patterns which start with a wildcard
+
+    Every word is padded as '$word$' and the term ids of words having each
+    k-gram are kept in sorted arrays. Words matching a pattern have all the
+    k-grams of its fixed parts.
+
+    Attributes
+    ----------
+    k: int
+        length of k-grams
+    postings: dict
+        k-grams as keys and array of term ids of words having them as values
+    """
+
+    def __init__(self, terms, k=3):
+        """
+        Parameters
+        ----------
+        terms: SortedTerms
+            dictionary of words
+        k: int
+            length of k-grams
+        """
+
+        self.k = k
+        self.postings = dict()
+        for i, raw in enumerate(terms.iter_range(0, len(terms))):
+            padded = '$' + raw.decode('utf8') + '$'
+            for gram in set(padded[j:j+k] for j in range(len(padded)-k+1)):
+                if gram not in self.postings:
+                    self.postings[gram] = array('I')
+                self.postings[gram].append(i)
+
+    def candidates(self, pattern):
+        """Returns sorted term ids of words having all k-grams of pattern, None if pattern has no k-gram
+
+        Parameters
+        ----------
+        pattern: str
+            word with '*' wildcards
+
+        Returns
+        -------
+        numpy.array
+            term ids (a superset of the words matching pattern) or None
+        """
+
+        k = self.k
+        grams = set()
+        for part in ('$' + pattern + '$').split('*'):
+            grams.update(part[j:j+k] for j in range(len(part)-k+1))
+        if len(grams) == 0:
+            return None
+        lists = sorted((self.postings.get(gram, array('I')) for gram in grams), key=len)
+        term_ids = np.frombuffer(lists[0], dtype=np.uint32)
+        for postings in lists[1:]:
+            if len(term_ids) == 0:
+                break
+            term_ids = np.intersect1d(term_ids, np.frombuffer(postings, dtype=np.uint32), assume_unique=True)
+        return term_ids
@@ -1,101 +1,244 @@
-from irstructures.document import Document, read_corpus, calc_collection_frequency
-from irstructures.invertedindex import InvertedIndex
+from irstructures.document import Document
+from irstructures.docstore import DocumentStore
+from irstructures.snapshot import Snapshot, write_snapshot
+from irstructures.invertedindex import DiskInvertedIndex
+from irstructures.positional import write_positional_index
+from irstructures.querycache import QueryCache
+from irstructures import instrument
 import irstructures.models.boolean_retrieval as boolean_retrieval
 import irstructures.models.vector_space as vector_space
-import os, time, pickle
-from pandas import read_pickle
+from irstructures.models.similar import SimilarDocuments, more_like_this
+from irstructures.models.tiered import TieredIndex
+from irstructures.models.wand import Wand
+from irstructures.segments import SegmentedIndex
+from irstructures.streaming import build_index, docs_path, read_doc_paths
+import argparse, os, time, threading
 
-def start_search(vsmodel, corpus, df, index):
+def start_search(vsmodel, corpus, matrix, index, positions=None, bm25=None):
     use_boolean = True
+    # ranking model, MODEL switches between tf-idf and BM25 (if the snapshot has it)
+    models = [vsmodel] if bm25 is None else [vsmodel, bm25]
+    model = vsmodel
+    # print time taken by each stage of a query (toggled by TRACE)
+    show_trace = False
+    # repeated queries are answered from cache
+    cache = QueryCache()
+    # index of reduced document vectors used by SIMILAR, built when it is first used
+    similar = None
+    # tf-idf ranking from champion lists first (toggled by TIERED, built when it is first used)
+    tiered = None
+    # exact tf-idf top k with WAND over the impacts of the index (toggled by WAND)
+    wand = Wand(vsmodel, index)
     while True:
         query = input("Enter query: ")
         if query == "EXIT":
             break
+        elif query == "CACHE":
+            print(cache.info())
+        elif query == "MODEL":
+            model = models[(models.index(model)+1) % len(models)] if model in models else vsmodel
+            print("ranking with", model.name)
+        elif query == "TIERED":
+            if tiered is None:
+                tiered = TieredIndex(r=100)
+                tiered.fit(vsmodel)
+            model = tiered if model is not tiered else vsmodel
+            print("ranking with", model.name)
+        elif query == "WAND":
+            model = wand if model is not wand else vsmodel
+            print("ranking with", model.name)
+        elif query == "TRACE":
+            show_trace = not show_trace
+            print("tracing", "on" if show_trace else "off")
+        elif query.startswith("SIMILAR "):
+            # documents like a given document (its path or doc_id)
+            target = query[len("SIMILAR "):].strip()
+            if target.isdigit():
+                doc_id = int(target)
+            else:
+                doc_id = next((i for i, path in enumerate(corpus.paths) if path == target), -1)
+            if doc_id < 0 or doc_id >= len(corpus):
+                print("no document", target)
+                continue
+            if similar is None:
+                similar = SimilarDocuments()
+                similar.fit(vsmodel)
+            start = time.time()
+            for file, score in more_like_this(doc_id, corpus, similar, 10):
+                print(file, "\t", score)
+            end = time.time()
+            print("returned in ", end-start, 's')
+            print()
+        elif query == "STATS":
+            print(instrument.dump())
+        elif query == "PROFILE":
+            # first PROFILE starts profiler, second one stops it and prints report
+            if instrument.profiler is None:
+                instrument.start_profiling(memory=True)
+                print("profiling started")
+            else:
+                print(instrument.stop_profiling())
         else:
+            if show_trace:
+                # results of traced queries are not taken from cache
+                with instrument.trace(query) as trace:
+                    output = boolean_retrieval.parse_query(query, corpus, index, positions) if use_boolean else range(len(corpus))
+                    output = vector_space.parse_query(query, corpus, model, model.matrix, output, 10)
+                for file, prob in output:
+                    print(file, "\t", prob)
+                print(trace)
+                print()
+                continue
+
             if use_boolean:
                 print("\nBoolean Retrieval results: ")
                 start = time.time()
-                output = boolean_retrieval.parse_query(query, corpus, index)
+                output = cache.boolean(query, corpus, index, positions=positions)
                 for fileid in output:
                     print(corpus[fileid].filepath)
                 end = time.time()
                 print(len(output),"files returned in", end-start, 's')
-            else:
-                output = [i.doc_id for i in corpus]
 
-            print("\nTf-Idf results: ")
+            print("\nTf-Idf results: " if model is vsmodel else "\nTiered Tf-Idf results: " if model is tiered else "\nWAND Tf-Idf results: " if model is wand else "\nBM25 results: ")
             start = time.time()
-            output = vector_space.parse_query(query, corpus, vsmodel, df, output)
-            for file, prob in output[:10]:
+            # stats stay None if output is taken from cache
+            wand.stats = None
+            output = cache.ranked(query, corpus, model, model.matrix, index, k=10, use_boolean=use_boolean, positions=positions)
+            for file, prob in output:
                 print(file, "\t", prob)
             end = time.time()
             print("returned in ", end-start, 's')
+            if model is wand and wand.stats is not None:
+                print(wand.stats['skipped'], "of", wand.stats['postings'], "postings skipped")
             
             print()
 
-if __name__=='__main__':
+def start_incremental_search(index, corpus_path):
+    # merge of segments running in background, started after every refresh which changed the index
+    merge = index.merge_in_background()
+    while True:
+        query = input("Enter query: ")
+        if query == "EXIT":
+            break
+        elif query == "REFRESH":
+            # index files added, changed or removed since the last refresh
+            merge.join()
+            start = time.time()
+            changes = index.refresh(corpus_path)
+            end = time.time()
+            print(changes, "in", end-start, 's')
+            if changes['added'] or changes['changed'] or changes['removed']:
+                merge = index.merge_in_background()
+        elif query == "STATS":
+            print(len(index), "documents in", len(index.segments), "segments")
+            print(instrument.dump())
+        else:
+            print("\nBoolean Retrieval results: ")
+            start = time.time()
+            output = boolean_retrieval.parse_query(query, None, index)
+            for fileid in output:
+                print(index.doc_paths[fileid])
+            end = time.time()
+            print(len(output),"files returned in", end-start, 's')
 
-    print("\n***Program started***\n")
+            print("\nTf-Idf results: ")
+            start = time.time()
+            for prob, file in index.search(vector_space.query_document(query, index), 10, output):
+                print(file, "\t", prob)
+            end = time.time()
+            print("returned in ", end-start, 's')
+            print()
+    merge.join()
 
-    if("df.pickle" in os.listdir("./pickle_files")) and ("corpus.pickle" in os.listdir("./pickle_files")) and ("inv_index.pickle" in os.listdir("./pickle_files")):
-        # folder name is corpus in this case
+if __name__=='__main__':
 
-        # loading corpus
-        start = time.time()
-        with open("./pickle_files/corpus.pickle", "rb") as corpus_file:
-            corpus = pickle.load(corpus_file)
-        end = time.time()
-        print("corpus loaded in: "+str(end - start))        
-        
-        # loading inverted index object
-        start = time.time()
-        with open("./pickle_files/inv_index.pickle", "rb") as inv_index_file:
-            index = pickle.load(inv_index_file)
-        end = time.time()
-        print("inverted index loaded in: "+str(end - start))        
+    parser = argparse.ArgumentParser(description="Search documents of the corpus folder")
+    parser.add_argument("--incremental", action="store_true",
+                        help="keep a segmented index which is updated with new, changed and removed files instead of a snapshot")
+    args = parser.parse_args()
 
-        # loading vectorspace object
-        vsmodel = vector_space.Tf_Idf(inv_index=index)
+    print("\n***Program started***\n")
+
+    if args.incremental:
+        segments_path = "./pickle_files/segments"
+        if not os.path.exists(os.path.join(segments_path, SegmentedIndex.manifest_name)):
+            # new indexes are built with the builtin analyzer (saved in the manifest)
+            Document.set_analyzer('builtin')
         start = time.time()
-        df = read_pickle('./pickle_files/df.pickle')
+        index = SegmentedIndex(segments_path)
+        changes = index.refresh('corpus')
         end = time.time()
-        print("dataframe pickle loaded in: "+str(end - start))        
+        print(changes, "in", end-start, 's')
+        if Document.analyzer == 'nltk':
+            threading.Thread(target=Document.load_nltk, daemon=True).start()
+        start_incremental_search(index, 'corpus')
+        index.close()
 
-    
     else:
-        print("reading files")
-        start = time.time()
-        corpus = read_corpus('corpus')
-        end = time.time()
-        print("corpus generated in: "+str(end - start))
+        # phrase and proximity queries need positions of words (index file is about 2x larger)
+        build_positions = True
 
-        # saving corpus object
-        with  open("./pickle_files/corpus.pickle", "wb") as corpus_file:
-            pickle.dump(corpus, corpus_file)
+        if "index.snap" in os.listdir("./pickle_files"):
+            # folder name is corpus in this case
 
-        collection_freq = calc_collection_frequency(corpus)
+            # opening memory mapped snapshot (corpus, inverted index and tf-idf model)
+            start = time.time()
+            snapshot = Snapshot("./pickle_files/index.snap")
+            # queries are tokenized like the documents of the snapshot
+            Document.set_analyzer(snapshot.analyzer)
+            end = time.time()
+            print("snapshot opened in: "+str(end - start))        
 
-        print("Building inverted index")
-        start = time.time()
-        index = InvertedIndex(corpus)
-        end = time.time()
-        print("inverted index generated in: "+str(end - start))
-        # saving inverted index object
-        with open("./pickle_files/inv_index.pickle", "wb") as inv_index_file:
-            pickle.dump(index, inv_index_file)
+            # warm up stemmer cache used while parsing queries
+            if "stem_cache.pickle" in os.listdir("./pickle_files"):
+                Document.stem_cache.load("./pickle_files/stem_cache.pickle")
 
-        print("Building vector space model")
-        start = time.time()
-        vsmodel = vector_space.Tf_Idf(inv_index=index)
-        # saving tf idf dataframe object
-        df = vsmodel.get_dataframe(corpus, collection_freq)
-        df.to_pickle('./pickle_files/df.pickle')
-        end = time.time()
+    
+        else:
+            # new indexes are built with the regex tokenizer and bundled stemmer,
+            # which do not need nltk (analyzer is saved in the snapshot)
+            Document.set_analyzer('builtin')
+            print("reading files")
+            start = time.time()
+            # documents are streamed into sorted runs merged on disk, so the corpus is never held in memory
+            build_index('corpus', "./pickle_files/corpus.idx", tmp_dir="./pickle_files")
+            end = time.time()
+            print("corpus indexed in: "+str(end - start))
+
+            # saving stemmer cache, so that restarts do not stem same words again
+            Document.stem_cache.save("./pickle_files/stem_cache.pickle")
 
+            # keeping only word frequencies and paths of documents in compact arrays
+            with DiskInvertedIndex("./pickle_files/corpus.idx") as streamed_index:
+                corpus = DocumentStore.from_index(streamed_index, read_doc_paths("./pickle_files/corpus.idx"))
+            # the snapshot has its own index
+            os.remove("./pickle_files/corpus.idx")
+            os.remove(docs_path("./pickle_files/corpus.idx"))
+
+            print("Building vector space model")
+            start = time.time()
+            # saving tf idf model, its inverted index and the corpus as a single snapshot
+            write_snapshot("./pickle_files/index.snap", corpus)
+            snapshot = Snapshot("./pickle_files/index.snap")
+            end = time.time()
+            print("vector space model built in: "+str(end - start))
+
+            if build_positions:
+                print("Building positional index")
+                start = time.time()
+                write_positional_index("./pickle_files/positions.idx", corpus)
+                end = time.time()
+                print("positional index built in: "+str(end - start))
 
-        print("vector space model built in: "+str(end - start))
+        corpus, vsmodel, index = snapshot.corpus, snapshot.vsmodel, snapshot.index
+        matrix = vsmodel.matrix
+        # without positions, phrases match documents having all their words
+        positions = DiskInvertedIndex("./pickle_files/positions.idx") if os.path.exists("./pickle_files/positions.idx") else None
+        # nltk is imported in background while waiting for the first query
+        if Document.analyzer == 'nltk':
+            threading.Thread(target=Document.load_nltk, daemon=True).start()
 
-    print('Size of dataframe: ', df.shape[0], 'tokens X', df.shape[1], 'docs')
-    start_search(vsmodel, corpus, df, index)
+        print('Size of matrix: ', matrix.shape[0], 'docs X', matrix.shape[1], 'tokens')
+        start_search(vsmodel, corpus, matrix, index, positions, snapshot.bm25)
     
     print("\n***End of program***\n")
\ No newline at end of file
@@ -0,0 +1,225 @@
+"""
+Asynchronous HTTP search server
+
+usage: python server.py [--host 127.0.0.1] [--port 8000] [--workers N]
+
+Endpoints (all return json):
+    GET /boolean?q=<query>          output of boolean retrieval
+    GET /search?q=<query>&k=10      boolean retrieval followed by tf-idf ranking
+                                    (add model=bm25 to rank with BM25, or model=wand
+                                    for the same tf-idf top k using WAND)
+    GET /health                     status of server
+
+Add trace=1 to /boolean or /search to get time taken by each stage of the
+query (see irstructures.instrument) along with the results.
+
+The model must be built first by running main.py. It is loaded once: the
+snapshot (see irstructures.snapshot) and the positional index, if it was
+built, are memory mapped by every worker process, so all workers share one
+read only copy through the page cache.
+An asyncio front end accepts connections and sends the CPU bound scoring
+to a pool of worker processes.
+"""
+
+from irstructures.document import Document
+from irstructures.snapshot import Snapshot
+from irstructures.invertedindex import DiskInvertedIndex
+from irstructures import instrument
+import irstructures.models.boolean_retrieval as boolean_retrieval
+from irstructures.models.vector_space import query_document
+from irstructures.models.wand import Wand
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+import argparse, asyncio, json, os, time
+
+# read only model of a worker process, set by init_worker
+worker_model = dict()
+
+def init_worker(pickle_dir):
+    """Initializer of worker processes, memory maps the snapshot and loads nltk (if the snapshot needs it)"""
+
+    snapshot = Snapshot(os.path.join(pickle_dir, "index.snap"))
+    Document.set_analyzer(snapshot.analyzer)
+    worker_model['corpus'] = snapshot.corpus
+    worker_model['index'] = snapshot.index
+    positions_path = os.path.join(pickle_dir, "positions.idx")
+    worker_model['positions'] = DiskInvertedIndex(positions_path) if os.path.exists(positions_path) else None
+    worker_model['vsmodel'] = snapshot.vsmodel
+    worker_model['bm25'] = snapshot.bm25
+    worker_model['wand'] = Wand(snapshot.vsmodel, snapshot.index)
+    stem_cache_path = os.path.join(pickle_dir, "stem_cache.pickle")
+    if os.path.exists(stem_cache_path):
+        Document.stem_cache.load(stem_cache_path)
+    # so that the first request does not wait for nltk to be imported
+    if Document.analyzer == 'nltk':
+        Document.load_nltk()
+
+def boolean_search(query):
+    """Returns doc_id's given by boolean retrieval (runs in a worker process)
+
+    Parameters
+    ----------
+    query: str
+        input query string
+
+    Returns
+    -------
+    list
+        list of doc_id's
+    """
+
+    return boolean_retrieval.parse_query(query, worker_model['corpus'], worker_model['index'], worker_model['positions'])
+
+def ranked_search(query, k, model='tf-idf'):
+    """Returns top k (score, doc_id) of boolean retrieval followed by ranking (runs in a worker process)
+
+    Parameters
+    ----------
+    query: str
+        input query string
+    k: int
+        number of top results to return
+    model: str
+        'tf-idf', 'bm25' or 'wand'
+
+    Returns
+    -------
+    list
+        list of (score, doc_id) tuples sorted according to score (descending order)
+    """
+
+    vsmodel = worker_model['bm25'] if model == 'bm25' else worker_model['wand'] if model == 'wand' else worker_model['vsmodel']
+    boolean_output = boolean_search(query)
+    return vsmodel.search(query_document(query, vsmodel.vocab), None, vsmodel.matrix, boolean_output, k)
+
+
+class SearchServer:
+    """
+    Class used to represent the asyncio front end of the search server
+
+    Attributes
+    ----------
+    corpus: DocumentStore
+        documents, used to map doc_id's to file paths
+    executor: ProcessPoolExecutor
+        pool of worker processes which run the searches
+    has_bm25: bool
+        whether the snapshot has a BM25 model
+    """
+
+    def __init__(self, corpus, executor, has_bm25=True):
+        self.corpus = corpus
+        self.executor = executor
+        self.has_bm25 = has_bm25
+
+    async def route(self, method, target):
+        """Run the request and return (status, json body)"""
+
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        if method != "GET":
+            return "405 Method Not Allowed", {'error': 'only GET is supported'}
+        if url.path == "/health":
+            return "200 OK", {'status': 'ok', 'documents': len(self.corpus)}
+        if url.path not in ("/boolean", "/search"):
+            return "404 Not Found", {'error': f'unknown path {url.path}'}
+        if 'q' not in params:
+            return "400 Bad Request", {'error': 'missing query parameter q'}
+
+        query = params['q'][0]
+        if url.path == "/boolean":
+            search, args = boolean_search, (query,)
+        else:
+            try:
+                k = int(params.get('k', ['10'])[0])
+            except ValueError:
+                return "400 Bad Request", {'error': 'k must be an integer'}
+            model = params.get('model', ['tf-idf'])[0]
+            if model not in ('tf-idf', 'bm25', 'wand'):
+                return "400 Bad Request", {'error': 'model must be tf-idf, bm25 or wand'}
+            if model == 'bm25' and not self.has_bm25:
+                return "400 Bad Request", {'error': 'snapshot has no BM25 model, rebuild it with main.py'}
+            search, args = ranked_search, (query, k, model)
+
+        loop = asyncio.get_running_loop()
+        start = time.time()
+        trace = None
+        if params.get('trace', ['0'])[0] not in ('0', ''):
+            # trace is made in the worker process and sent back with the output
+            output, trace = await loop.run_in_executor(self.executor, instrument.run_traced, search, *args)
+        else:
+            output = await loop.run_in_executor(self.executor, search, *args)
+        if url.path == "/boolean":
+            results = [ self.corpus.paths[doc_id] for doc_id in output ]
+        else:
+            results = [ {'file': self.corpus.paths[doc_id], 'score': score} for score, doc_id in output ]
+        body = {'query': query, 'count': len(results), 'time': time.time()-start, 'results': results}
+        if trace is not None:
+            body['trace'] = trace.as_dict()
+        return "200 OK", body
+
+    async def handle(self, reader, writer):
+        """Serve HTTP/1.1 requests of one connection (keep alive is supported)"""
+
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = dict()
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if int(headers.get("content-length", 0)) > 0:
+                    await reader.readexactly(int(headers["content-length"]))
+
+                parts = request_line.decode("latin1").split()
+                if len(parts) != 3:
+                    status, body = "400 Bad Request", {'error': 'malformed request line'}
+                    parts = ["GET", "/", "HTTP/1.0"]
+                else:
+                    try:
+                        status, body = await self.route(parts[0], parts[1])
+                    except Exception as error:
+                        # eg: BrokenProcessPool, sent as a response so the connection stays usable
+                        status, body = "500 Internal Server Error", {'error': f'{type(error).__name__}: {error}'}
+                keep_alive = parts[2] == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                payload = json.dumps(body).encode("utf8")
+                head = (f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                        f"Content-Length: {len(payload)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+                writer.write(head.encode("latin1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(host, port, workers, pickle_dir):
+    """Load the model once and serve requests until interrupted"""
+
+    start = time.time()
+    snapshot = Snapshot(os.path.join(pickle_dir, "index.snap"))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(pickle_dir,)) as executor:
+        search_server = SearchServer(snapshot.corpus, executor, snapshot.bm25 is not None)
+        server = await asyncio.start_server(search_server.handle, host, port)
+        print(f"model loaded in {time.time()-start} s, serving on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Asynchronous HTTP search server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--pickle-dir", default="./pickle_files", help="folder containing saved model")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.pickle_dir))
+    except KeyboardInterrupt:
+        pass
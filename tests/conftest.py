@@ -0,0 +1,109 @@
+"""
+Fixtures shared by the tests: a small corpus of english words and the models built from it
+
+The corpus is generated once per test session. Words share prefixes and
+stems (message, messages, messaging, ...) so that stemming, wildcards and
+phrases have something to match. Models are built with the builtin analyzer,
+which does not need nltk data.
+"""
+
+from irstructures.document import Document, read_corpus
+from irstructures.docstore import DocumentStore
+from irstructures.models.vector_space import Tf_Idf
+from irstructures.snapshot import Snapshot, write_snapshot
+import contextlib, io, os, random
+import pytest
+
+WORDS = """
+heart hearts heartbeat header headers heading headline health healthy attack attacks attacked
+failure failures failing blood pressure pressures message messages messaging messenger
+retrieval retrieve retrieving index indexes indexing indexed query queries querying search
+searches searching searched document documents rank ranking ranked score scores scoring
+vector vectors matrix matrices sparse dense cosine similarity similar model models term terms
+cardiac cardiology cardiologist arthritis bronchitis hypertension hyperion tension station
+running runner runs walked walking walker generous generously organize organization network
+""".split()
+
+def generate_documents(n_docs=60, seed=0):
+    """Returns (relative path, text) of n_docs documents, some of them in a sub folder"""
+
+    rand = random.Random(seed)
+    documents = []
+    for i in range(n_docs):
+        # a few words are frequent in each document, so scores differ
+        topic = rand.sample(WORDS, 4)
+        words = [ rand.choice(topic) if rand.random() < 0.4 else rand.choice(WORDS) for _ in range(rand.randint(20, 80)) ]
+        if i % 7 == 0:
+            words[3:5] = ["heart", "failure"]
+        folder = "sub" if i % 5 == 0 else ""
+        documents.append((os.path.join(folder, f"doc{i}.txt"), " ".join(words) + ".\n"))
+    return documents
+
+def write_corpus(folderpath, documents):
+    """Write (relative path, text) pairs as files of a corpus folder"""
+
+    for path, text in documents:
+        path = os.path.join(folderpath, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf8") as file:
+            file.write(text)
+
+def assert_same_postings(disk_index, index):
+    """Assert that an on-disk index has the words, postings and term frequencies of an InvertedIndex"""
+
+    assert list(disk_index) == sorted(index)
+    for word in index:
+        doc_ids, term_freqs = disk_index.postings(word)
+        assert doc_ids.tolist() == list(index[word])
+        assert term_freqs.tolist() == list(index.term_freqs[word])
+
+@pytest.fixture(scope="session", autouse=True)
+def builtin_analyzer():
+    analyzer = Document.analyzer
+    Document.set_analyzer('builtin')
+    yield
+    Document.set_analyzer(analyzer)
+
+@pytest.fixture(scope="session")
+def corpus_path(tmp_path_factory):
+    """Folder of the fixture corpus"""
+
+    folderpath = str(tmp_path_factory.mktemp("corpus"))
+    write_corpus(folderpath, generate_documents())
+    return folderpath
+
+@pytest.fixture(scope="session")
+def documents(corpus_path):
+    """Documents of the fixture corpus as read by read_corpus"""
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return read_corpus(corpus_path)
+
+@pytest.fixture(scope="session")
+def store(documents):
+    return DocumentStore.from_corpus(documents)
+
+@pytest.fixture(scope="session")
+def vsmodel(store):
+    model = Tf_Idf()
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.get_matrix(store)
+    return model
+
+@pytest.fixture(scope="session")
+def snapshot(store, tmp_path_factory):
+    """Snapshot (tf-idf, BM25 and index) of the fixture corpus"""
+
+    filepath = str(tmp_path_factory.mktemp("snapshot") / "index.snap")
+    with contextlib.redirect_stdout(io.StringIO()):
+        write_snapshot(filepath, store)
+    snapshot = Snapshot(filepath)
+    yield snapshot
+    snapshot.close()
+
+@pytest.fixture(scope="session")
+def queries():
+    """Queries of one to four words of the fixture corpus"""
+
+    rand = random.Random(1)
+    return [ " ".join(rand.sample(WORDS, rand.randint(1, 4))) for _ in range(40) ]
@@ -0,0 +1,53 @@
+from irstructures.document import Document
+from irstructures.porter import PorterStemmer
+from irstructures.stemcache import StemCache
+from .conftest import WORDS, generate_documents
+import pytest
+
+nltk = pytest.importorskip("nltk")
+
+TEXT = """The quick brown fox's jumps, over the lazy dogs!! Generalizations of
+conditional probabilities (e.g. relational, caresses, ponies) ... agreed; feed
+sky's controlling happily "hopping" rationalization 3.14 don't CAN'T isn't"""
+
+# words covering the rules of each step of the Porter algorithm
+STEMMED_WORDS = """caresses ponies ties caress cats feed agreed plastered bled motoring sing
+conflated troubled sized hopping tanned falling hissing fizzed failing filing happy sky
+relational conditional rational valenci hesitanci digitizer conformabli radicalli differentli
+vileli analogousli vietnamization predication operator feudalism decisiveness hopefulness
+callousness formaliti sensitiviti sensibiliti triplicate formative formalize electriciti
+electrical hopeful goodness revival allowance inference airliner gyroscopic adjustable
+defensible irritant replacement adjustment dependent adoption homologou communism activate
+angulariti homologous effective bowdlerize probate rate cease controll roll generous""".split()
+
+@pytest.fixture
+def analyzer_state(monkeypatch):
+    """Gives every test its own stemmer and stem cache, so analyzers do not share stems"""
+
+    monkeypatch.setattr(Document, "stem_cache", StemCache(None))
+    monkeypatch.setattr(Document, "stemmer", None)
+    monkeypatch.setattr(Document, "analyzer", Document.analyzer)
+
+def nltk_word_freq(text):
+    Document.stem_cache = StemCache(None)
+    Document.load_nltk()
+    Document.stem_cache.stemmer = Document.stemmer
+    Document.set_analyzer('nltk')
+    return Document.get_word_freq(text, use_regex=True)
+
+def builtin_word_freq(text):
+    Document.stem_cache = StemCache(None)
+    Document.set_analyzer('builtin')
+    Document.stem_cache.stemmer = PorterStemmer()
+    return Document.get_word_freq(text, use_regex=True)
+
+def test_porter_stemmer_equals_nltk():
+    from nltk.stem.porter import PorterStemmer as NltkPorterStemmer
+    stemmer, nltk_stemmer = PorterStemmer(), NltkPorterStemmer()
+    for word in STEMMED_WORDS + WORDS:
+        assert stemmer.stem(word) == nltk_stemmer.stem(word), word
+
+def test_builtin_analyzer_equals_nltk(analyzer_state):
+    texts = [TEXT] + [ text for path, text in generate_documents(20, seed=4) ]
+    for text in texts:
+        assert builtin_word_freq(text) == nltk_word_freq(text)
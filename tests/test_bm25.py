@@ -0,0 +1,22 @@
+from irstructures.models.bm25 import BM25
+from irstructures.models.vector_space import query_document
+import contextlib, io
+import numpy as np
+import pytest
+
+@pytest.mark.parametrize("variant", BM25.variants)
+def test_batch_search_equals_search(store, queries, variant):
+    model = BM25(variant=variant)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.get_matrix(store)
+    batch = model.batch_search(queries + ["", "unknownword"], k=5, chunk_size=7)
+    assert batch[-2:] == [[], []]
+    for query, res in zip(queries, batch):
+        single = model.search(query_document(query, model.vocab), store, model.matrix, range(len(store)), 5)
+        assert [ doc_id for score, doc_id in res ] == [ doc_id for score, doc_id in single ]
+        assert np.allclose([ score for score, doc_id in res ], [ score for score, doc_id in single ])
+
+def test_batch_search_on_snapshot(snapshot, queries):
+    model = snapshot.bm25
+    for res, expected in zip(model.batch_search(queries, k=None, chunk_size=1000), model.batch_search(queries, k=None, chunk_size=3)):
+        assert res == expected
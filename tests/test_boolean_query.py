@@ -0,0 +1,24 @@
+from irstructures.models import boolean_retrieval, bm25, vector_space
+from irstructures.models.boolean_query import query_word_freq
+from irstructures.models.wand import Wand
+from irstructures.document import Document
+
+def test_query_word_freq_expands_wildcards(snapshot):
+    word_freq = query_word_freq("heart messa* messag*", snapshot.vsmodel.vocab)
+    assert word_freq.pop(Document.get_word_freq("heart").popitem()[0]) == 1
+    assert word_freq and set(word_freq) <= set(snapshot.index.match("messa*", 1024))
+    assert all(freq == 2 for freq in word_freq.values())
+
+def test_wildcard_query_is_ranked(snapshot):
+    corpus, index = snapshot.corpus, snapshot.index
+    query = "messa*"
+    candidates = boolean_retrieval.parse_query(query, corpus, index)
+    assert len(candidates) > 0
+    expanded = " ".join(index.match(query, 1024))
+    for model in (snapshot.vsmodel, snapshot.bm25, Wand(snapshot.vsmodel, index)):
+        res = model.search(vector_space.query_document(query, model.vocab), corpus, model.matrix, candidates, None)
+        assert sorted(doc_id for score, doc_id in res) == sorted(candidates)
+        assert res == model.search(Document.from_word_freq(None, query_word_freq(expanded, model.vocab)), corpus, model.matrix, candidates, None)
+    assert vector_space.parse_query(query, corpus, snapshot.vsmodel, snapshot.vsmodel.matrix, candidates)
+    assert bm25.parse_query(query, corpus, snapshot.bm25, snapshot.bm25.matrix, candidates)
+    assert [ res[0][0] for res in snapshot.bm25.batch_search([query], k=1) ] == [ snapshot.bm25.search(vector_space.query_document(query, snapshot.bm25.vocab), corpus, snapshot.bm25.matrix, range(len(corpus)), 1)[0][0] ]
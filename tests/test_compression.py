@@ -0,0 +1,26 @@
+from irstructures.compression import vbyte_encode, vbyte_decode, delta_encode, delta_decode
+import numpy as np
+import pytest
+
+@pytest.mark.parametrize("bits", [7, 14, 32, 35, 36, 56, 63])
+def test_vbyte_round_trip(bits):
+    rand = np.random.default_rng(bits)
+    numbers = rand.integers(0, 1 << bits, 1000, dtype=np.uint64)
+    numbers[:3] = [0, (1 << bits) - 1, 1 << (bits - 1)]
+    assert np.array_equal(vbyte_decode(vbyte_encode(numbers)), numbers.astype(np.int64))
+
+def test_vbyte_sizes():
+    assert len(vbyte_encode([0, 127])) == 2
+    assert len(vbyte_encode([128])) == 2
+    assert len(vbyte_encode([1 << 35])) == 6
+    assert len(vbyte_decode(vbyte_encode([]))) == 0
+
+def test_vbyte_rejects_numbers_it_can_not_decode():
+    with pytest.raises(ValueError):
+        vbyte_encode(np.array([1, 1 << 63], dtype=np.uint64))
+    with pytest.raises(ValueError):
+        vbyte_encode(np.array([-1], dtype=np.int64))
+
+def test_delta_round_trip():
+    doc_ids = np.unique(np.random.default_rng(0).integers(0, 1 << 30, 500))
+    assert np.array_equal(delta_decode(vbyte_decode(vbyte_encode(delta_encode(doc_ids)))), doc_ids)
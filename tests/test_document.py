@@ -0,0 +1,18 @@
+from irstructures.document import read_corpus
+import contextlib, io
+
+def test_read_corpus_is_the_same_serially_and_in_parallel(corpus_path, documents):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        parallel = read_corpus(corpus_path, n_jobs=2, chunk_size=8)
+    assert [ d.filepath for d in parallel ] == [ d.filepath for d in documents ]
+    assert [ d.word_freq for d in parallel ] == [ d.word_freq for d in documents ]
+    assert all(d.raw_data == "" for d in documents + parallel)
+
+def test_read_corpus_prints_progress_not_every_file(corpus_path):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        documents = read_corpus(corpus_path, chunk_size=16)
+    lines = output.getvalue().splitlines()
+    assert len(lines) == (len(documents) + 15) // 16
+    assert lines[-1] == f"files read: {len(documents)}/{len(documents)}"
@@ -0,0 +1,44 @@
+from irstructures import instrument
+import threading
+
+def test_concurrent_traces_are_separate():
+    n_threads = 4
+    barrier = threading.Barrier(n_threads + 1)
+    traces = dict()
+    untraced = []
+
+    def traced(i):
+        with instrument.trace(f"query {i}") as trace:
+            barrier.wait()
+            with instrument.stage(f"stage {i}"):
+                instrument.count(f"counter {i}", i)
+            barrier.wait()
+        traces[i] = trace
+
+    def not_traced():
+        barrier.wait()
+        # other threads are tracing, this one is not timed
+        untraced.append(instrument.stage("other") is instrument.NULL_STAGE and not instrument.is_enabled())
+        barrier.wait()
+
+    threads = [ threading.Thread(target=traced, args=(i,)) for i in range(n_threads) ] + [ threading.Thread(target=not_traced) ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert untraced == [True]
+    for i, trace in traces.items():
+        assert list(trace.stages) == [f"stage {i}"]
+        assert trace.counters == {f"counter {i}": i}
+    assert instrument.current.get() is None and not instrument.is_enabled()
+
+def test_nested_trace():
+    with instrument.trace("outer") as outer:
+        with instrument.trace("inner") as inner:
+            with instrument.stage("a"):
+                pass
+        with instrument.stage("b"):
+            pass
+    assert list(inner.stages) == ["a"]
+    assert list(outer.stages) == ["b"]
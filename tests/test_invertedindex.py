@@ -0,0 +1,23 @@
+from irstructures.invertedindex import InvertedIndex, DiskInvertedIndex, gallop
+from .conftest import assert_same_postings
+import numpy as np
+
+def test_disk_index_round_trip(store, vsmodel, tmp_path):
+    index = InvertedIndex(store)
+    index.set_impacts(vsmodel)
+    index.write(str(tmp_path / "index.bin"))
+    with DiskInvertedIndex(str(tmp_path / "index.bin")) as disk_index:
+        assert_same_postings(disk_index, index)
+        for word in index:
+            assert disk_index.doc_freq(word) == len(index[word])
+            assert np.allclose(disk_index.impacts[word], index.impacts[word])
+            assert disk_index.max_impact[word] == index.max_impact[word]
+        assert "notaword" not in disk_index
+        assert disk_index.doc_freq("notaword") == 0
+
+def test_gallop():
+    postings = [1, 3, 5, 8, 13, 21, 34]
+    for doc_id in range(40):
+        for lo in range(len(postings)):
+            expected = next((i for i in range(lo, len(postings)) if postings[i] >= doc_id), len(postings))
+            assert gallop(postings, doc_id, lo) == expected
@@ -0,0 +1,33 @@
+from irstructures.querycache import LRUCache, QueryCache
+from irstructures.segments import SegmentedIndex
+from .conftest import generate_documents, write_corpus
+import os
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.info()['hits'] == 3 and cache.info()['misses'] == 1
+
+def test_cache_invalidates_on_generation_change(tmp_path):
+    corpus_path = str(tmp_path / "corpus")
+    write_corpus(corpus_path, generate_documents(10, seed=3))
+    index = SegmentedIndex(str(tmp_path / "segments"))
+    index.refresh(corpus_path)
+    cache = QueryCache()
+
+    before = cache.boolean("hyperion OR arthritis", None, index)
+    assert cache.boolean("Hyperion OR arthritis", None, index) == before
+    assert cache.info()['boolean']['hits'] == 1
+
+    write_corpus(corpus_path, [("new.txt", "hyperion arthritis\n")])
+    generation = index.generation
+    index.refresh(corpus_path)
+    assert index.generation != generation
+    after = cache.boolean("hyperion OR arthritis", None, index)
+    assert cache.info()['boolean']['hits'] == 1
+    assert [ index.doc_paths[doc_id] for doc_id in after if doc_id not in before ] == [os.path.join(corpus_path, "new.txt")]
+    index.close()
@@ -0,0 +1,64 @@
+from irstructures.segments import SegmentedIndex, in_folder
+from irstructures.models import boolean_retrieval
+from irstructures.models.vector_space import query_document
+from .conftest import generate_documents, write_corpus
+import os
+import numpy as np
+
+def all_postings(index):
+    words = sorted(set(word for name, segment in index.segments for word in segment))
+    return { word: [ a.tolist() for a in index.postings(word) ] for word in words if index.doc_freq(word) > 0 }
+
+def tf_idf_norms(postings, index):
+    norms_sq = np.zeros(index.next_doc_id)
+    for word, (doc_ids, freqs) in postings.items():
+        weights = (1+np.log10(freqs)) * np.log10(len(index)/len(doc_ids))
+        np.add.at(norms_sq, doc_ids, weights**2)
+    return np.sqrt(norms_sq)
+
+def test_in_folder(tmp_path):
+    assert in_folder(os.path.join(str(tmp_path), "corpus", "a.txt"), os.path.join(str(tmp_path), "corpus"))
+    assert in_folder(os.path.join(str(tmp_path), "corpus", "sub", "..", "a.txt"), os.path.join(str(tmp_path), "corpus", ""))
+    assert not in_folder(os.path.join(str(tmp_path), "corpus2", "a.txt"), os.path.join(str(tmp_path), "corpus"))
+
+def test_refresh_and_merge(tmp_path):
+    documents = generate_documents(30, seed=2)
+    corpus_path = str(tmp_path / "corpus")
+    write_corpus(corpus_path, documents[:20])
+    # files of a sibling folder whose name starts with the corpus name are kept
+    write_corpus(str(tmp_path / "corpus2"), documents[20:22])
+    index = SegmentedIndex(str(tmp_path / "segments"))
+    assert index.refresh(str(tmp_path / "corpus2")) == {'added': 2, 'changed': 0, 'removed': 0}
+    assert index.refresh(corpus_path) == {'added': 20, 'changed': 0, 'removed': 0}
+    assert index.refresh(corpus_path) == {'added': 0, 'changed': 0, 'removed': 0}
+
+    write_corpus(corpus_path, documents[22:25])
+    os.remove(os.path.join(corpus_path, documents[1][0]))
+    changed = os.path.join(corpus_path, documents[2][0])
+    with open(changed, "a", encoding="utf8") as file:
+        file.write("hyperion hyperion\n")
+    assert index.refresh(corpus_path) == {'added': 3, 'changed': 1, 'removed': 1}
+    assert len(index) == 24 and len(index.segments) == 3
+
+    output = boolean_retrieval.parse_query("hyperion", None, index)
+    assert changed in [ index.doc_paths[doc_id] for doc_id in output ]
+    res = index.search(query_document("hyperion", index), None, output)
+    assert { path for score, path in res } == { index.doc_paths[doc_id] for doc_id in output }
+
+    before = all_postings(index)
+    old_segments = list(index.segments)
+    with index.reading():
+        index.merge()
+        # segments read by a lookup stay open until it exits
+        assert all(not segment.mm.closed for name, segment in old_segments)
+    assert all(segment.mm.closed for name, segment in old_segments)
+    assert not any(os.path.exists(os.path.join(index.folderpath, name)) for name, segment in old_segments)
+    assert len(index.segments) == 1
+    assert all_postings(index) == before
+
+    index.merge_in_background().join()
+    index.close()
+    reopened = SegmentedIndex(str(tmp_path / "segments"))
+    assert all_postings(reopened) == before
+    assert np.allclose(reopened.doc_norms(), tf_idf_norms(before, reopened))
+    reopened.close()
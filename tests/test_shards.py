@@ -0,0 +1,31 @@
+from irstructures.shards import ShardedIndex, write_shards
+from irstructures.models import boolean_retrieval
+from irstructures.models.vector_space import query_document
+import numpy as np
+import pytest
+
+@pytest.fixture(scope="module")
+def sharded(store, tmp_path_factory):
+    folderpath = str(tmp_path_factory.mktemp("shards"))
+    write_shards(folderpath, store, 3, n_jobs=1)
+    with ShardedIndex(folderpath) as sharded:
+        yield sharded
+
+def test_boolean_equals_unsharded(sharded, snapshot, queries):
+    for query in queries + ["NOT heart", "head* AND NOT failure"]:
+        assert sharded.boolean(query) == boolean_retrieval.parse_query(query, snapshot.corpus, snapshot.index)
+
+@pytest.mark.parametrize("model", ["tf-idf", "bm25"])
+@pytest.mark.parametrize("use_boolean", [True, False])
+def test_shard_scores_equal_unsharded(sharded, snapshot, queries, model, use_boolean):
+    corpus, index = snapshot.corpus, snapshot.index
+    vsmodel = snapshot.bm25 if model == "bm25" else snapshot.vsmodel
+    for query in queries + ["messa*"]:
+        candidates = boolean_retrieval.parse_query(query, corpus, index) if use_boolean else range(len(corpus))
+        expected = vsmodel.search(query_document(query, vsmodel.vocab), corpus, vsmodel.matrix, candidates, None)
+        res = sharded.search(query, None, model, use_boolean)
+        assert sorted(doc_id for score, doc_id in res) == sorted(doc_id for score, doc_id in expected)
+        scores = dict((doc_id, score) for score, doc_id in expected)
+        assert np.allclose([ score for score, doc_id in res ], [ scores[doc_id] for score, doc_id in res ])
+        assert [ score for score, doc_id in res ] == sorted((score for score, doc_id in res), reverse=True)
+    assert [ sharded.filepath(doc_id) for doc_id in range(len(corpus)) ] == [ corpus.paths[doc_id] for doc_id in range(len(corpus)) ]
@@ -0,0 +1,13 @@
+from irstructures.document import Document
+from irstructures.snapshot import Snapshot
+
+def test_opening_snapshot_keeps_analyzer(snapshot):
+    assert snapshot.analyzer == 'builtin'
+    Document.set_analyzer('nltk')
+    try:
+        other = Snapshot(snapshot.filepath)
+        assert Document.analyzer == 'nltk'
+        assert other.analyzer == 'builtin'
+        other.close()
+    finally:
+        Document.set_analyzer('builtin')
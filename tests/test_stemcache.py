@@ -0,0 +1,25 @@
+from irstructures.porter import PorterStemmer
+from irstructures.stemcache import StemCache
+
+WORDS = ['running', 'running', 'cats', 'running', 'dogs', 'cats', 'dogs', 'generously']
+
+def test_stem_words_counts_like_stem():
+    stemmer = PorterStemmer()
+    bulk, single = StemCache(stemmer), StemCache(stemmer)
+    assert bulk.stem_words(['running', 'running', 'cats']) == ['run', 'run', 'cat']
+    assert (bulk.hits, bulk.misses) == (1, 2)
+    bulk.stem_words(WORDS[3:])
+    assert [ single.stem(word) for word in WORDS ] == [ stemmer.stem(word) for word in WORDS ]
+    assert (bulk.hits, bulk.misses) == (single.hits, single.misses)
+
+def test_lru_eviction_and_save(tmp_path):
+    cache = StemCache(PorterStemmer(), max_size=2)
+    cache.stem_words(['running', 'cats'])
+    cache.stem('running')
+    cache.stem('dogs')
+    assert list(cache.cache) == ['running', 'dogs']
+    cache.save(str(tmp_path / "stems.pickle"))
+    loaded = StemCache(PorterStemmer())
+    loaded.load(str(tmp_path / "stems.pickle"))
+    assert list(loaded.cache.items()) == [('running', 'run'), ('dogs', 'dog')]
+    assert (loaded.hits, loaded.misses) == (0, 0)
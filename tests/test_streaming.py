@@ -0,0 +1,27 @@
+from irstructures.docstore import DocumentStore
+from irstructures.invertedindex import DiskInvertedIndex, InvertedIndex
+from irstructures.streaming import build_index, read_doc_paths
+from .conftest import assert_same_postings
+import contextlib, io
+import numpy as np
+import pytest
+
+@pytest.mark.parametrize("run_size", [50, 1000000])
+def test_build_index_equals_inverted_index(corpus_path, store, tmp_path, run_size):
+    index_path = str(tmp_path / "corpus.idx")
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        n_docs = build_index(corpus_path, index_path, run_size, str(tmp_path))
+    assert n_docs == len(store)
+    assert ("1 runs" in output.getvalue()) == (run_size > 1000)
+    assert list(read_doc_paths(index_path)) == store.paths
+
+    with DiskInvertedIndex(index_path) as disk_index:
+        assert_same_postings(disk_index, InvertedIndex(store))
+
+        streamed = DocumentStore.from_index(disk_index, read_doc_paths(index_path))
+        expected = store.sort_terms()
+        assert streamed.terms == expected.terms and streamed.paths == expected.paths
+        assert np.array_equal(streamed.offsets, expected.offsets)
+        assert np.array_equal(streamed.ids, expected.ids)
+        assert np.array_equal(streamed.freqs, expected.freqs)
+        streamed = expected = None
@@ -0,0 +1,27 @@
+from irstructures.termdict import SortedTerms, TermDictionary, wildcard_regex
+from .conftest import WORDS
+import pytest
+
+TERMS = sorted({ word.encode('utf8') for word in WORDS } | { "café".encode('utf8'), b"a", b"ab", b"abc" })
+
+def matching(pattern):
+    regex = wildcard_regex(pattern)
+    return [ term.decode('utf8') for term in TERMS if regex.fullmatch(term.decode('utf8')) ]
+
+def test_sorted_terms_is_abstract():
+    with pytest.raises(TypeError):
+        SortedTerms()
+
+@pytest.mark.parametrize("block_size", [1, 4, 16])
+def test_term_dictionary_lookups(block_size):
+    terms = TermDictionary.from_terms(TERMS, block_size)
+    assert len(terms) == len(TERMS)
+    assert [ terms.raw(i) for i in range(len(terms)) ] == TERMS
+    for i, term in enumerate(TERMS):
+        assert terms.find(term.decode('utf8')) == i
+        assert terms.lower_bound(term) == i
+    assert terms.find("missing") == -1
+    assert "zzz" not in terms
+    for pattern in ["head*", "*ing", "h*t", "*ear*", "ca*", "a*"]:
+        assert sorted(terms.match(pattern)) == matching(pattern)
+    assert len(terms.match("*s", 3)) == 3
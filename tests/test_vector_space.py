@@ -0,0 +1,51 @@
+from irstructures.document import Document
+from irstructures.models import vector_space
+import numpy as np
+import pytest
+
+def dense_scores(vsmodel, documents, query):
+    """Cosine of the query with every document, computed word by word as by the dense model"""
+
+    words = list(vsmodel.vocab)
+    q = Document(raw_data=query)
+    q_vec = np.array([ vsmodel.tf_idf(word, q, documents) for word in words ])
+    scores = []
+    for document in documents:
+        d_vec = np.array([ vsmodel.tf_idf(word, document, documents) for word in words ])
+        scores.append(vsmodel.cosine_sim(q_vec, d_vec))
+    return np.array(scores)
+
+def test_sparse_cosine_equals_dense(vsmodel, documents, queries):
+    for query in queries[:10]:
+        expected = dense_scores(vsmodel, documents, query)
+        res = vsmodel.search(Document(raw_data=query), documents, vsmodel.matrix, range(len(documents)))
+        scores = np.zeros(len(documents))
+        for score, doc_id in res:
+            scores[doc_id] = score
+        assert np.allclose(scores, expected)
+
+def test_search_ranks_only_candidates(vsmodel, store, queries):
+    candidates = list(range(0, len(store), 3))
+    for query in queries:
+        res = vsmodel.search(Document(raw_data=query), store, vsmodel.matrix, candidates)
+        assert { doc_id for score, doc_id in res } <= set(candidates)
+        assert [ score for score, doc_id in res ] == sorted((score for score, doc_id in res), reverse=True)
+
+def test_batch_search_equals_search(vsmodel, store, queries):
+    batch = vsmodel.batch_search(queries, k=5, chunk_size=7)
+    for query, res in zip(queries, batch):
+        single = vsmodel.search(Document(raw_data=query), store, vsmodel.matrix, range(len(store)), 5)
+        assert [ doc_id for score, doc_id in res ] == [ doc_id for score, doc_id in single ]
+        assert np.allclose([ score for score, doc_id in res ], [ score for score, doc_id in single ])
+
+def test_top_k_keeps_order_of_ties(vsmodel):
+    scores = np.array([1.0, 2.0, 2.0, 2.0, 2.0, 3.0, 2.0, 0.5])
+    rows = np.arange(len(scores)) * 10
+    assert vsmodel.top_k(scores, rows, 3) == [(3.0, 50), (2.0, 10), (2.0, 20)]
+    assert vsmodel.top_k(scores, rows, 0) == []
+    rand = np.random.default_rng(0)
+    for _ in range(100):
+        scores = rand.integers(0, 4, 40).astype(np.float64)
+        k = int(rand.integers(1, 40))
+        expected = sorted(zip(scores.tolist(), range(40)), key=lambda x: (-x[0], x[1]))[:k]
+        assert vsmodel.top_k(scores, np.arange(40), k) == expected
@@ -0,0 +1,31 @@
+from irstructures.document import Document
+from irstructures.invertedindex import InvertedIndex
+from irstructures.models import boolean_retrieval
+from irstructures.models.wand import Wand
+import numpy as np
+import pytest
+
+def assert_same_ranking(res, expected):
+    assert [ doc_id for score, doc_id in res ] == [ doc_id for score, doc_id in expected ]
+    assert np.allclose([ score for score, doc_id in res ], [ score for score, doc_id in expected ])
+
+@pytest.mark.parametrize("k", [1, 5, None])
+def test_wand_top_k_is_exact(store, vsmodel, queries, k):
+    index = InvertedIndex(store)
+    index.set_impacts(vsmodel)
+    wand = Wand(vsmodel, index)
+    for query in queries:
+        res = wand.search(Document(raw_data=query), store, wand.matrix, range(len(store)), k)
+        assert_same_ranking(res, vsmodel.search(Document(raw_data=query), store, vsmodel.matrix, range(len(store)), k))
+        assert wand.stats['scored'] + wand.stats['skipped'] == wand.stats['postings']
+
+def test_wand_on_snapshot_with_boolean_candidates(snapshot, queries):
+    corpus, vsmodel, index = snapshot.corpus, snapshot.vsmodel, snapshot.index
+    wand = Wand(vsmodel, index)
+    skipped = 0
+    for query in queries:
+        candidates = boolean_retrieval.parse_query(query, corpus, index)
+        res = wand.search(Document(raw_data=query), corpus, wand.matrix, candidates, 3)
+        assert_same_ranking(res, vsmodel.search(Document(raw_data=query), corpus, vsmodel.matrix, candidates, 3))
+        skipped += wand.stats['skipped']
+    assert skipped > 0